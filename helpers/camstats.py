@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+import os
+import re
+import json
+import time
+import argparse
+from fractions import Fraction
+import numpy as np
+
+#########################################################################
+##  19.10.2026 Version 1 : camstats.py
+#########################################################################
+# Capture statistics as typed records (JSON Lines, camstats.jsonl in
+# the session directory) instead of free text lines in camstats.log.
+#
+#   {"type": "session", "camera_id": 2, "time": "2018-10-07T12:00:00", ...}
+#   {"type": "shot", "img": 1, "f_stop": -2, "ss": 1250, "exp": 1248, "ag": 1.0, ..., "t_tot": 1.8}
+#
+# picam.py and raw_2.py append one shot record per frame. The reader
+# loads the shots of any number of sessions into one numpy record array
+# (load_archive), cached per archive in camstats.npz so that only new or
+# changed sessions are read again.
+#
+# Historical camstats.log files are converted with
+#   python camstats.py convert /path/to/picam_data
+# and read_exposures / session_camera fall back to parsing the log if
+# a session has no camstats.jsonl.
+#
+# NEW:
+# -----
+# - 19.10.2026: first implemented
+#
+#########################################################################
+
+global RECORDS_NAME
+
+RECORDS_NAME = 'camstats.jsonl'
+LOG_NAME = 'camstats.log'
+CACHE_NAME = 'camstats.npz'
+SESSION_NAME = re.compile(r'^(\d{8})_(\d{6})$')
+
+# one row per shot, missing values are -1 / nan
+SHOT_DTYPE = np.dtype([
+    ('session', 'U15'), ('camera_id', 'i2'), ('img', 'i4'), ('f_stop', 'i2'), ('run', 'i2'),
+    ('ss', 'i4'), ('exp', 'i4'), ('iso', 'i2'), ('ag', 'f4'), ('dg', 'f4'), ('awb_r', 'f4'), ('awb_b', 'f4'),
+    ('br', 'i2'), ('ct', 'i2'), ('t_jpg', 'f4'), ('t_raw', 'f4'), ('t_tot', 'f4'),
+])
+MISSING = dict((name, -1 if SHOT_DTYPE[name].kind == 'i' else np.nan) for name in SHOT_DTYPE.names)
+
+# picam.py: '[img Nr:1, F Stop:-2, ss:1250, iso:100 exp:1248, ag:1, dg:1, awb:[(Fraction(..), ..)], br:50, ct:0]'
+# raw_2.py: '5 Run : [ss:600, iso:0 exp:598, ag:..., ...]', both followed by ' || timing: [t_jpg:.., ...]'
+SHOT_LINE = re.compile(r'^(?:(?P<run>\d+) Run : )?\[(?:img Nr:(?P<img>\d+), F Stop:(?P<f_stop>-?\d+), )?ss:\d+')
+SHOT_VALUE = re.compile(r'\b(ss|iso|exp|ag|dg|awb|br|ct|t_jpg|t_raw|t_tot):(\[[^\]]*\]|[^,\]\s|]+)')
+CAMERA_LINE = re.compile(r'camera(?: ID:\s*|_)(\d+)')
+NUMBER = re.compile(r'Fraction\((\d+), (\d+)\)|(-?\d+(?:\.\d*)?(?:/\d+)?)')
+
+
+def plain(value):
+    '''
+    Camera values as JSON types (Fraction -> float, tuples -> lists).
+    '''
+    if isinstance(value, Fraction):
+        return float(value)
+    if isinstance(value, (tuple, list)):
+        return [plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def numbers(text):
+    '''
+    All numbers of a logged value: '263/256', 'Fraction(387, 256)', '1.5'.
+    '''
+    result = []
+    for num, den, value in NUMBER.findall(text):
+        if num:
+            result.append(int(num) / float(den))
+        else:
+            result.append(float(Fraction(value)))
+    return result
+
+
+class Camstats:
+    """
+    Appends records to camstats.jsonl of a session.
+
+    EXAMPLE:
+      records = Camstats(SUBDIRPATH)
+      records.session(camera_id=2, script='picam')
+      records.shot(img=1, f_stop=0, ss=5000, exp=4990, t_tot=1.8)
+    """
+    def __init__(self, session_dir):
+        self.path = os.path.join(session_dir, RECORDS_NAME)
+
+    def write(self, kind, **fields):
+        record = dict(type=kind)
+        record.update((k, plain(v)) for k, v in fields.items())
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+    def session(self, **fields):
+        fields.setdefault('time', time.strftime('%Y-%m-%dT%H:%M:%S'))
+        self.write('session', **fields)
+
+    def shot(self, **fields):
+        self.write('shot', **fields)
+
+
+def read_records(session_dir):
+    '''
+    Records of a session from camstats.jsonl, or converted from camstats.log.
+    :return: list of dict
+    '''
+    path = os.path.join(session_dir, RECORDS_NAME)
+    if os.path.isfile(path):
+        records = []
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+        return records
+
+    path = os.path.join(session_dir, LOG_NAME)
+    if os.path.isfile(path):
+        return parse_log(path)
+    return []
+
+
+def parse_log(path):
+    '''
+    Records of a historical camstats.log.
+    '''
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            match = SHOT_LINE.search(line)
+            if match is not None:
+                record = dict(type='shot')
+                for key, value in match.groupdict().items():
+                    if value is not None:
+                        record[key] = int(value)
+                for key, value in SHOT_VALUE.findall(line):
+                    values = numbers(value)
+                    if key == 'awb':
+                        record[key] = values
+                    elif values:
+                        record[key] = int(values[0]) if key in ('ss', 'iso', 'exp', 'br', 'ct') else values[0]
+                records.append(record)
+                continue
+
+            camera = CAMERA_LINE.search(line)
+            if camera is not None and not any(r['type'] == 'session' for r in records):
+                records.append(dict(type='session', camera_id=int(camera.group(1)), text=line))
+            elif line:
+                records.append(dict(type='message', text=line))
+    return records
+
+
+def convert_log(session_dir, force=False):
+    '''
+    Writes camstats.jsonl from camstats.log.
+    :return: True if converted
+    '''
+    out = os.path.join(session_dir, RECORDS_NAME)
+    log = os.path.join(session_dir, LOG_NAME)
+    if not os.path.isfile(log) or (os.path.isfile(out) and not force):
+        return False
+
+    tmp = out + '.part'
+    with open(tmp, 'w') as f:
+        for record in parse_log(log):
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+    os.rename(tmp, out)
+    return True
+
+
+def session_camera(session_dir):
+    '''
+    Camera id of a session, None if unknown.
+    '''
+    for record in read_records(session_dir):
+        if record['type'] == 'session' and record.get('camera_id') is not None:
+            return int(record['camera_id'])
+    return None
+
+
+def read_exposures(session_dir):
+    '''
+    Exposure [us] per frame (exp, or ss if exp is 0).
+    :return: dict key (F stop or run number) -> exposure
+    '''
+    exposures = {}
+    for record in read_records(session_dir):
+        if record['type'] != 'shot':
+            continue
+        key = record.get('f_stop', record.get('run'))
+        if key is not None:
+            exposures[int(key)] = record['exp'] if record.get('exp', 0) > 0 else record['ss']
+    return exposures
+
+
+def shot_array(session_dir):
+    '''
+    Shots of one session as numpy record array (SHOT_DTYPE).
+    '''
+    records = read_records(session_dir)
+    camera_id = -1
+    rows = []
+    for record in records:
+        if record['type'] == 'session' and record.get('camera_id') is not None:
+            camera_id = int(record['camera_id'])
+        elif record['type'] == 'shot':
+            row = dict(MISSING)
+            row.update((k, v) for k, v in record.items() if k in MISSING and v is not None)
+            awb = record.get('awb') or []
+            if len(awb) == 2:
+                row['awb_r'], row['awb_b'] = awb
+            rows.append(row)
+
+    result = np.zeros(len(rows), dtype=SHOT_DTYPE)
+    for i, row in enumerate(rows):
+        row['session'] = os.path.basename(os.path.normpath(session_dir))
+        row['camera_id'] = camera_id
+        result[i] = tuple(row[name] for name in SHOT_DTYPE.names)
+    return result
+
+
+def find_sessions(root):
+    '''
+    Session directories below root with capture statistics.
+    '''
+    sessions = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if SESSION_NAME.match(os.path.basename(dirpath)) and (RECORDS_NAME in filenames or LOG_NAME in filenames):
+            sessions.append(dirpath)
+    return sessions
+
+
+def stats_mtime(session_dir):
+    for name in (RECORDS_NAME, LOG_NAME):
+        path = os.path.join(session_dir, name)
+        if os.path.isfile(path):
+            return os.path.getmtime(path)
+    return 0.0
+
+
+def load_archive(root, sessions=None, cache=True):
+    '''
+    Shots of all sessions below root as one record array, sorted by session.
+    :param sessions: session directories, default all below root
+    :param cache: keep the array in <root>/camstats.npz, later calls only
+           read sessions that are new or changed
+    '''
+    if sessions is None:
+        sessions = find_sessions(root)
+    cache_path = os.path.join(root, CACHE_NAME)
+
+    cached = {}
+    keep = None
+    if cache and os.path.isfile(cache_path):
+        with np.load(cache_path) as data:
+            shots, names, mtimes = data['shots'], data['sessions'], data['mtimes']
+        for name, mtime in zip(names, mtimes):
+            cached[name] = mtime
+        keep = shots
+
+    parts = []
+    seen = {}
+    for session_dir in sessions:
+        name = os.path.basename(os.path.normpath(session_dir))
+        mtime = stats_mtime(session_dir)
+        seen[name] = mtime
+        if cached.get(name) != mtime:
+            parts.append(shot_array(session_dir))
+
+    if cached:
+        unchanged = np.array([n for n in seen if cached.get(n) == seen[n]], dtype='U15')
+        parts.append(keep[np.isin(keep['session'], unchanged)])
+
+    shots = np.concatenate(parts) if parts else np.zeros(0, dtype=SHOT_DTYPE)
+    shots = shots[np.argsort(shots['session'], kind='mergesort')]
+
+    if cache:
+        tmp = cache_path + '.part.npz'
+        np.savez(tmp, shots=shots, sessions=np.array(list(seen), dtype='U15'),
+                 mtimes=np.array([seen[n] for n in seen], dtype=np.float64))
+        os.rename(tmp, cache_path)
+
+    return shots
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Structured capture statistics.')
+        parser.add_argument('command', choices=['convert', 'load'])
+        parser.add_argument('root', help='session, day or archive directory')
+        parser.add_argument('--force', action='store_true', help='convert logs already converted')
+        args = parser.parse_args()
+
+        t_start = time.time()
+        if args.command == 'convert':
+            converted = sum(1 for s in find_sessions(args.root) if convert_log(s, args.force))
+            print('{} camstats.log converted in {:.1f} s'.format(converted, time.time() - t_start))
+        else:
+            shots = load_archive(args.root)
+            print('{} shots of {} sessions in {:.1f} s'.format(len(shots), len(np.unique(shots['session'])),
+                                                               time.time() - t_start))
+            for key in ('t_jpg', 't_raw', 't_tot'):
+                values = shots[key][np.isfinite(shots[key])]
+                if values.size:
+                    print('{}: mean {:.2f} s, p95 {:.2f} s'.format(key, values.mean(), np.percentile(values, 95)))
+
+    except Exception as e:
+        print('MAIN: Error: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
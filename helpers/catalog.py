@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+import os
+import re
+import sys
+import time
+import zlib
+import sqlite3
+import argparse
+from camstats import session_camera, read_exposures
+
+#########################################################################
+##  19.10.2026 Version 1 : catalog.py
+#########################################################################
+# Catalog of the captured sessions (SQLite, catalog.db).
+#
+# The capture scripts (picam.py, raw_2.py) register every session right
+# after taking it: files, frame types, F stops / runs, exposures, file
+# sizes and crc32 checksums. zipitall.py and the exporters keep the zip
+# and upload state in the same rows. Instead of globbing the data
+# folders all tools query the catalog:
+#
+#   catalog = Catalog()
+#   for session_dir in catalog.sessions(root=ZIPDIRPATH, zipped=False): ...
+#   for zip_file in catalog.zips(root=ZIPDIRPATH, uploaded=False): ...
+#
+# Archives written before the catalog existed are imported once with
+#   python catalog.py scan /path/to/picam_data
+# or by the first run of a tool on a root without any session in the
+# catalog (scan_once). After that the tools only query the catalog.
+#
+# NEW:
+# -----
+# - 19.10.2026: first implemented
+# - 19.10.2026: camera and exposures from the structured records (camstats.py)
+# - 19.10.2026: scan_once, archives imported only while the catalog knows none of their sessions
+#
+#########################################################################
+
+if sys.platform == "linux":
+    import pwd
+    import grp
+
+global CATALOG_PATH
+
+CATALOG_NAME = 'catalog.db'
+if sys.platform == "linux":
+    CATALOG_PATH = os.path.join('/home', 'pi', 'python_scripts', 'helpers', CATALOG_NAME)
+else:
+    CATALOG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), CATALOG_NAME)
+
+CHUNK = 1 << 20         # bytes per checksum read
+SESSION_NAME = re.compile(r'^(\d{8})_(\d{6})$')
+# raw_img0.jpg, raw_img-2.jpg, data0.data, data-2.data, data5_.data
+FRAME_NAME = re.compile(r'^(?:raw_img|data)(-?\d+)_?\.(jpg|data)$')
+
+
+def setOwnerAndPermission(pathToFile):
+    try:
+        if sys.platform == "linux":
+            uid = pwd.getpwnam('pi').pw_uid
+            gid = grp.getgrnam('pi').gr_gid
+            os.chown(pathToFile, uid, gid)
+            os.chmod(pathToFile, 0o777)
+        else:
+            return
+    except (IOError, OSError, KeyError) as e:
+        print('PERM : Could not set permissions for file: ' + str(e))
+
+
+def checksum(path):
+    '''
+    crc32 of a file as 8 hex digits.
+    '''
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(CHUNK)
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+    return '{:08x}'.format(crc & 0xffffffff)
+
+
+def now():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class Catalog:
+    """
+    Sessions, frames and zip / upload state of all captures.
+    """
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        created = not os.path.isfile(path)
+        self.con = sqlite3.connect(path, timeout=30)
+        self.create_tables()
+        if created:
+            setOwnerAndPermission(path)
+
+    def create_tables(self):
+        curs = self.con.cursor()
+        curs.execute("""CREATE TABLE IF NOT EXISTS sessions
+             (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE,
+                name TEXT,
+                day TEXT,
+                taken TEXT,
+                camera_id INTEGER,
+                frames INTEGER,
+                bytes INTEGER,
+                created TEXT,
+                zip_path TEXT,
+                zip_bytes INTEGER,
+                zip_checksum TEXT,
+                zipped TEXT,
+                uploaded TEXT
+             )""")
+        curs.execute("""CREATE TABLE IF NOT EXISTS frames
+             (
+                session_id INTEGER,
+                name TEXT,
+                kind TEXT,
+                f_stop INTEGER,
+                exposure INTEGER,
+                bytes INTEGER,
+                checksum TEXT,
+                PRIMARY KEY (session_id, name)
+             )""")
+        curs.execute("CREATE INDEX IF NOT EXISTS sessions_day ON sessions (day)")
+        curs.execute("CREATE INDEX IF NOT EXISTS sessions_zip ON sessions (zip_path)")
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+    def session_id(self, session_dir, create=True):
+        '''
+        Row id of a session directory, a new row if unknown and `create`.
+        '''
+        path = os.path.normpath(os.path.abspath(session_dir))
+        row = self.con.execute("SELECT id FROM sessions WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            return row[0]
+        if not create:
+            return None
+
+        name = os.path.basename(path)
+        match = SESSION_NAME.match(name)
+        day, taken = None, None
+        if match is not None:
+            d, t = match.groups()
+            day = d
+            taken = '{}-{}-{}T{}:{}:{}'.format(d[0:4], d[4:6], d[6:8], t[0:2], t[2:4], t[4:6])
+        curs = self.con.execute("INSERT INTO sessions (path, name, day, taken, created) VALUES (?, ?, ?, ?, ?)",
+                                (path, name, day, taken, now()))
+        return curs.lastrowid
+
+    def add_session(self, session_dir, camera_id=None, exposures=None, checksums=True):
+        '''
+        Registers a session directory with all its files.
+        :param exposures: dict F stop / run -> exposure [us], default from the capture statistics
+        :param checksums: crc32 of every file
+        :return: session row id
+        '''
+        session_dir = os.path.normpath(os.path.abspath(session_dir))
+        if camera_id is None or exposures is None:
+            camera_id = session_camera(session_dir) if camera_id is None else camera_id
+            exposures = read_exposures(session_dir) if exposures is None else exposures
+
+        sid = self.session_id(session_dir)
+        rows = []
+        total = 0
+        for name in sorted(os.listdir(session_dir)):
+            path = os.path.join(session_dir, name)
+            if not os.path.isfile(path):
+                continue
+            match = FRAME_NAME.match(name)
+            if match is not None:
+                f_stop = int(match.group(1))
+                kind = 'raw' if match.group(2) == 'data' else 'jpg'
+            else:
+                f_stop = None
+                kind = os.path.splitext(name)[1].lstrip('.') or 'file'
+            size = os.path.getsize(path)
+            total += size
+            rows.append((sid, name, kind, f_stop, exposures.get(f_stop) if f_stop is not None else None,
+                         size, checksum(path) if checksums else None))
+
+        self.con.execute("DELETE FROM frames WHERE session_id = ?", (sid,))
+        self.con.executemany("INSERT INTO frames VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.con.execute("UPDATE sessions SET camera_id = ?, frames = ?, bytes = ? WHERE id = ?",
+                         (camera_id, sum(1 for r in rows if r[2] in ('jpg', 'raw')), total, sid))
+        self.con.commit()
+        return sid
+
+    def set_zipped(self, session_dir, zip_path):
+        '''
+        Records the zip file of a session (zipitall.py).
+        '''
+        sid = self.session_id(session_dir)
+        self.con.execute("UPDATE sessions SET zip_path = ?, zip_bytes = ?, zip_checksum = ?, zipped = ? WHERE id = ?",
+                         (os.path.normpath(os.path.abspath(zip_path)), os.path.getsize(zip_path),
+                          checksum(zip_path), now(), sid))
+        self.con.commit()
+
+    def set_uploaded(self, zip_files):
+        '''
+        Marks zip files as uploaded (exporters).
+        '''
+        stamp = now()
+        self.con.executemany("UPDATE sessions SET uploaded = ? WHERE zip_path = ?",
+                             [(stamp, os.path.normpath(os.path.abspath(z))) for z in zip_files])
+        self.con.commit()
+
+    def sessions(self, root=None, day=None, zipped=None, uploaded=None, existing=True):
+        '''
+        Session directories, sorted by name.
+        :param root: only sessions below this directory
+        :param day: 'YYYYMMDD'
+        :param zipped, uploaded: True / False to filter on the state, None for all
+        :param existing: skip directories removed since (e.g. zipped and deleted)
+        '''
+        query, args = self.where(root, 'path', day, zipped, uploaded)
+        rows = self.con.execute("SELECT path FROM sessions" + query + " ORDER BY name", args).fetchall()
+        return [p for (p,) in rows if not existing or os.path.isdir(p)]
+
+    def zips(self, root=None, uploaded=False, existing=True):
+        '''
+        Zip files of the sessions, sorted by name.
+        '''
+        query, args = self.where(root, 'zip_path', None, True, uploaded)
+        rows = self.con.execute("SELECT zip_path FROM sessions" + query + " ORDER BY name", args).fetchall()
+        return [p for (p,) in rows if not existing or os.path.isfile(p)]
+
+    def where(self, root, column, day, zipped, uploaded):
+        conditions = []
+        args = []
+        if root is not None:
+            root = os.path.join(os.path.normpath(os.path.abspath(root)), '')
+            conditions.append("substr({}, 1, ?) = ?".format(column))
+            args += [len(root), root]
+        if day is not None:
+            conditions.append("day = ?")
+            args.append(day)
+        if zipped is not None:
+            conditions.append("zipped IS NOT NULL" if zipped else "zipped IS NULL")
+        if uploaded is not None:
+            conditions.append("uploaded IS NOT NULL" if uploaded else "uploaded IS NULL")
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), args
+
+    def frames(self, session_dir):
+        '''
+        Files of a session as list of dict name, kind, f_stop, exposure, bytes, checksum.
+        '''
+        sid = self.session_id(session_dir, create=False)
+        if sid is None:
+            return []
+        keys = ('name', 'kind', 'f_stop', 'exposure', 'bytes', 'checksum')
+        rows = self.con.execute("SELECT {} FROM frames WHERE session_id = ? ORDER BY name".format(', '.join(keys)),
+                                (sid,)).fetchall()
+        return [dict(zip(keys, row)) for row in rows]
+
+    def has_sessions(self, root):
+        '''
+        True if the catalog knows any session below root.
+        '''
+        query, args = self.where(root, 'path', None, None, None)
+        return self.con.execute("SELECT 1 FROM sessions" + query + " LIMIT 1", args).fetchone() is not None
+
+    def scan_once(self, root, checksums=False):
+        '''
+        Imports root with scan() only if the catalog has no session below it
+        yet (first run on an archive from before the catalog). Later sessions
+        are registered by the capture scripts, a further import is an
+        explicit 'catalog.py scan'.
+        :return: number of sessions added
+        '''
+        if self.has_sessions(root):
+            return 0
+        return self.scan(root, checksums)
+
+    def scan(self, root, checksums=False):
+        '''
+        Imports session directories and zip files directly below root that
+        are not in the catalog yet (archives from before the catalog).
+        :return: number of sessions added
+        '''
+        root = os.path.normpath(os.path.abspath(root))
+        known = set(self.sessions(root, existing=False))
+        zipped = set(self.zips(root, uploaded=None, existing=False))
+        added = 0
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if os.path.isdir(path) and SESSION_NAME.match(name) and path not in known:
+                self.add_session(path, checksums=checksums)
+                added += 1
+            elif name.endswith('.zip') and SESSION_NAME.match(name[:-4]):
+                session_dir = path[:-4]
+                if path not in zipped:
+                    if session_dir not in known:
+                        added += 1
+                    self.set_zipped(session_dir, path)
+        return added
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Session catalog.')
+        parser.add_argument('command', choices=['scan', 'list'])
+        parser.add_argument('root', help='data directory, e.g. picam_data or raw_data')
+        parser.add_argument('--checksums', action='store_true', help='crc32 of imported files')
+        parser.add_argument('-c', '--catalog', default=CATALOG_PATH)
+        args = parser.parse_args()
+
+        catalog = Catalog(args.catalog)
+        try:
+            if args.command == 'scan':
+                print('{} sessions added to {}'.format(catalog.scan(args.root, args.checksums), args.catalog))
+            else:
+                for session_dir in catalog.sessions(args.root, existing=False):
+                    print(session_dir)
+        finally:
+            catalog.close()
+
+    except Exception as e:
+        print('MAIN: Error: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
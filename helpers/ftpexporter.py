@@ -5,7 +5,7 @@ import time
 import logging
 import logging.handlers
 from ftplib import FTP, error_perm
-from glob import glob
+from catalog import Catalog
 
 #########################################################################
 ##  06.04.2018 Version 1 : ftpexporter.py
@@ -20,7 +20,9 @@ from glob import glob
 #
 # NEW:
 # -----
-# -
+# - 19.10.2026: zip files from the catalog (catalog.py), uploads recorded there
+# - 19.10.2026: zip files not in the catalog are imported before uploading
+# - 19.10.2026: archive imported only on the first run (catalog.scan_once), unused glob import removed
 #
 #########################################################################
 
@@ -108,8 +110,14 @@ class Exporter:
 
             allzipfiles = []
 
-            for file in sorted(glob(ZIPDIRPATH + '/*.zip')):
-                allzipfiles.append(file)
+            catalog = Catalog()
+            try:
+                # archive from before the catalog, imported on the first run only
+                catalog.scan_once(ZIPDIRPATH)
+                for file in catalog.zips(root=ZIPDIRPATH, uploaded=False):
+                    allzipfiles.append(file)
+            finally:
+                catalog.close()
 
             return allzipfiles
 
@@ -157,6 +165,12 @@ class Exporter:
                 success = True
 
             ftp.close()
+
+            catalog = Catalog()
+            try:
+                catalog.set_uploaded(uploadedzip)
+            finally:
+                catalog.close()
             time_to_send_end = time.time()
             time_to_send = time_to_send_end-time_to_send_start
 
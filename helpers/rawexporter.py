@@ -4,7 +4,7 @@ import sys
 import logging
 import logging.handlers
 from ftplib import FTP, error_perm
-from glob import glob
+from catalog import Catalog
 
 #########################################################################
 ##  23.11.2017 Version 2 : rawexporter.py
@@ -18,6 +18,9 @@ from glob import glob
 # -----
 # - new directory for each day
 # - added variable to distinguish between cameras (must be set accordingly !)
+# - 19.10.2026: zip files from the catalog (catalog.py), uploads recorded there
+# - 19.10.2026: zip files not in the catalog are imported before uploading
+# - 19.10.2026: archive imported only on the first run (catalog.scan_once), unused glob import removed
 #
 #########################################################################
 
@@ -106,8 +109,14 @@ class Exporter:
 
             allzipfiles = []
 
-            for file in sorted(glob(ZIPDIRPATH + '/*.zip')):
-                allzipfiles.append(file)
+            catalog = Catalog()
+            try:
+                # archive from before the catalog, imported on the first run only
+                catalog.scan_once(ZIPDIRPATH)
+                for file in catalog.zips(root=ZIPDIRPATH, uploaded=False):
+                    allzipfiles.append(file)
+            finally:
+                catalog.close()
 
             return allzipfiles
 
@@ -159,6 +168,12 @@ class Exporter:
 
             ftp.close()
 
+            catalog = Catalog()
+            try:
+                catalog.set_uploaded(uploadedzip)
+            finally:
+                catalog.close()
+
             root_logger.info(' FTP : {} *.zip files uploaded to ftp.ihomelab.ch'.format(cnt))
             e.deleteUploadedZip(uploadedzip)
             return success
@@ -6,7 +6,7 @@ import zipfile
 import logging
 import logging.handlers
 import shutil
-from glob import glob
+from catalog import Catalog
 
 #########################################################################
 ##  26.04.2018 Version 1 : zipitall.py
@@ -17,6 +17,9 @@ from glob import glob
 # NEW:
 # -----
 # - 26.04.2018: first implemented
+# - 19.10.2026: sessions from the catalog instead of globbing, zips recorded in the catalog
+# - 19.10.2026: folders not in the catalog are imported before zipping
+# - 19.10.2026: archive imported only on the first run (catalog.scan_once), unused glob import removed
 #
 #########################################################################
 
@@ -88,9 +91,14 @@ def getDirs():
         root_logger = s.getLogger()
         allDirs = []
 
-        for dirs in sorted(glob(os.path.join(ZIPDIRPATH, "*", ""))):
-            if os.path.isdir(dirs):
-                allDirs.append(dirs)
+        catalog = Catalog()
+        try:
+            # archive from before the catalog, imported on the first run only
+            catalog.scan_once(ZIPDIRPATH)
+            for dirs in catalog.sessions(root=ZIPDIRPATH, zipped=False):
+                allDirs.append(os.path.join(dirs, ''))
+        finally:
+            catalog.close()
 
         return allDirs
 
@@ -105,6 +113,7 @@ def zipitall():
 
         allDirs = []
         allDirs = getDirs()
+        catalog = Catalog()
 
         for dirs in allDirs:
 
@@ -122,10 +131,13 @@ def zipitall():
                             zf.write(os.path.join(dirname, filename), filename, compress_type=zipfile.ZIP_DEFLATED)
 
                     zf.close()
+                    catalog.set_zipped(dirs, zipfilepath)
 
                     # delete zipped directory
                     shutil.rmtree(dirs, ignore_errors=True)
 
+        catalog.close()
+
     except IOError as e:
         root_logger.error('ZIPALL :Error: ' + str(e))
 
@@ -5,18 +5,20 @@ from __future__ import print_function
 import os
 import cv2
 import sys
-import time
 import shutil
 import exifread
 from shutil import copy2
-from glob import glob
 import subprocess
 import zipfile
-from matplotlib import pyplot as plt
 from os import listdir
 from os.path import isfile, join
 import numpy as np
 from fractions import Fraction
+from thumbnails import Images, THUMB_DIR
+from metrics import Metrics_index
+from slideshow import Slide_show
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'helpers'))
+from catalog import Catalog, CATALOG_PATH, CATALOG_NAME
 
 print('Version opencv: ' + cv2.__version__)
 
@@ -32,16 +34,26 @@ print('Version opencv: ' + cv2.__version__)
 #
 # 29.09.2018 : first implemented
 # 03.10.2018 : using a mask for histogram
+# 19.10.2026 : histograms computed once per image, slide show only updates the bars
+# 19.10.2026 : images loaded lazily at reduced size with thumbnail cache and prefetching
+# 19.10.2026 : brightness of a whole archive metered in a thread pool (scanner.py)
+# 19.10.2026 : brightness read from the metrics index, only new images are metered
+# 19.10.2026 : slide show with blitting, histograms from the metrics index
+# 19.10.2026 : session directories from the session catalog, works with any path separator
+# 19.10.2026 : archive always scanned for new session folders
+# 19.10.2026 : slide show starts at once, images missing in the metrics index measured while loading
+# 19.10.2026 : unused pyplot import removed (slide show in slideshow.py)
+# 19.10.2026 : uncalled calcAllHistograms / calcAllAvgBrightness removed (slide show and metrics.py do this)
+# 19.10.2026 : archive imported into the catalog only on the first run, unused glob import removed
 #
 ######################################################################
 global Path_to_sourceDir
 global Avoid_This_Directories
 global Path_to_copy_imgs
 global mask_images
-global listOfAvgBrightness
 global intervall # sets slide show speed
 
-Avoid_This_Directories = ['wellExp','hdr','img2analyze']
+Avoid_This_Directories = ['wellExp','hdr','img2analyze',THUMB_DIR]
 Path_to_sourceDir = r'I:\SkY_CAM_IMGS\picam\camera_3\20181007'  # test' picam_pictures
 Path_to_copy_imgs = os.path.join(Path_to_sourceDir, 'img2analyze')
 intervall = 0.5
@@ -134,16 +146,20 @@ class Helpers:
         try:
             global Avoid_This_Directories
             allDirs = []
-            img_cnt = 1
 
-            for dirs in sorted(glob(os.path.join(pathToDirectories, "*", ""))):
-                if os.path.isdir(dirs):
-                    if dirs.rstrip('\\').rpartition('\\')[-1] not in Avoid_This_Directories:
-                        allDirs.append(dirs)
-                        #print('{}'.format(str(dirs)))
-                        img_cnt +=1
+            # the camera's catalog, or one next to a copied archive
+            catalog = Catalog(CATALOG_PATH if os.path.isfile(CATALOG_PATH) else join(pathToDirectories, CATALOG_NAME))
+            try:
+                catalog.scan_once(pathToDirectories)    # archive from before the catalog
+                sessions = catalog.sessions(root=pathToDirectories)
+            finally:
+                catalog.close()
 
-            print('All images loaded! - Found {} images.'.format(img_cnt))
+            for dirs in sessions:
+                if os.path.basename(os.path.normpath(dirs)) not in Avoid_This_Directories:
+                    allDirs.append(dirs)
+
+            print('All images loaded! - Found {} images.'.format(len(allDirs)))
 
             return allDirs
 
@@ -152,15 +168,10 @@ class Helpers:
 
     def loadImages(self, mypath):
         try:
-            onlyfiles = [f for f in listdir(mypath) if isfile(join(mypath, f)) & f.endswith('.jpg')]
-            image_stack = np.empty(len(onlyfiles), dtype=object)
-            pos = 0
-            for n in range(0, len(onlyfiles)):
-                img = cv2.imread(join(mypath, onlyfiles[n]), 1)
-                image_stack[pos] = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) # convert to show in matplotlib
-                pos += 1
+            onlyfiles = sorted(f for f in listdir(mypath) if isfile(join(mypath, f)) & f.endswith('.jpg'))
+            image_stack = Images([join(mypath, f) for f in onlyfiles], cache_dir=join(Path_to_sourceDir, THUMB_DIR))
 
-            print('Found {} images'.format(str(pos)))
+            print('Found {} images'.format(len(image_stack)))
 
             return image_stack
 
@@ -168,105 +179,41 @@ class Helpers:
             print('Error in loadImages: ' + str(e))
 
     def readAllImages(self,allDirs):
+        '''
+        Images of all directories, decoded lazily when shown (see thumbnails.py).
+        '''
         try:
             global Path_to_sourceDir
             global mask_images
-            list_names = []
-            list_images = []
-            cnt = 1
-            print('Converting jpg to opencv, may take some time!')
-
-            t_start = time.time()
-            for next_dir in allDirs:
-                next_dir += 'raw_img0.jpg'
-                img = cv2.imread(next_dir, 1)
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) # convert to show in matplotlib
-
-                if mask_images:
-                    width,hight,color = img_rgb.shape
-                    masked_img = self.maske_image(np.uint8(img_rgb), [width, hight, color], (616, 824), 1000)
-                    img_rgb = masked_img
-
-                list_images.append(img_rgb)
-
-                '''
-                new_img = cv2.resize(img_rgb, None, fx=0.25, fy=0.25)
-                list_images.append(new_img)
-                '''
+            sky = ((616, 824), 1000) if mask_images else None
 
-                cnt += 1
-
-            t_end = time.time()
-            measurement = t_end-t_start
-            print('Total number of images: {}'.format(cnt))
-            print('Time to load and convert imgs: {}'.format(measurement))
+            list_images = Images([os.path.join(next_dir, 'raw_img0.jpg') for next_dir in allDirs],
+                                 cache_dir=os.path.join(Path_to_sourceDir, THUMB_DIR), sky=sky)
+            print('Total number of images: {}'.format(len(list_images)))
 
             return list_images
 
         except Exception as e:
-            print('Last directory to read: {}'.format(next_dir))
             print('readAllImages: Error: ' + str(e))
 
-    def plotHystogram(self,img,fig,avgb):
-
-        left, bottom, width, height = [0.645, 0.6, 0.35, 0.35]
-        ax2 = fig.add_axes([left, bottom, width, height])
-
-        text = ax2.text(80, 15000, r'avgbrg: ' + str(avgb), fontsize=12, color='black')
-
-        '''
-        # The same when bin - interval set to [1,255] ignoring zero values and extreme exposure
-        aa = img.copy()
-        mask = aa.copy()
-        mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-        mask[np.where((mask != [0]).all(axis=1))] = [255]
-        mask = mask.astype(np.uint8)
-        '''
-
-        color = ('b', 'g', 'r')
-        for i, col in enumerate(color):
-            histr = cv2.calcHist([img], [i], None, [254], [1, 255])
-            plt.plot(histr, color=col)
-            plt.xlim([0, 256])
-
-        return ax2,text
-
     def runSlideShow(self, image_list = None, run = True):
         if run:
 
-            font_outer = {'family': 'serif',
-                    'color': 'darkred',
-                    'weight': 'normal',
-                    'size': 12,
-                    }
-
-            counter = 0
-
-            fig_outer = plt.gcf() # get access to current figure
-            ax_outer = plt.gca()  # get access to current axes
-            ax_outer.set_xlabel('[pixel]')
-            ax_outer.set_ylabel('[pixel]')
-
-            if len(image_list) == 0:
+            if image_list is None or len(image_list) == 0:
                 print('Error in runSlideShow: Image list is empty !')
                 return
 
-            cur_window = ax_outer.imshow(image_list[0])
-
-            while counter < len(image_list):
-
-                next_img = image_list[counter]
-                avgb = listOfAvgBrightness[counter]
-                ax_outer.set_title('Image: {}'.format(counter))
-                #text = ax_outer.text(-10, -20, r'avgbrg: '+str(avgb), fontsize=12,color='black')
-                cur_window.set_data(next_img)
-                ax2,text = self.plotHystogram(next_img,fig_outer,avgb)
+            # brightness and histograms of the images already in the metrics index,
+            # the others are computed while loading (Slide_show.process)
+            global Path_to_sourceDir
+            index = Metrics_index(Path_to_sourceDir, scale=image_list.scale, sky=image_list.sky)
+            try:
+                brightness = index.table(['brightness'], paths=image_list.paths)['brightness']
+                histograms = index.histograms(image_list.paths)
+            finally:
+                index.close()
 
-                plt.draw()
-                plt.pause(intervall)
-                text.remove()
-                counter += 1
-                ax2.clear()
+            Slide_show(image_list, brightness, histograms, intervall).run()
 
     def avgbrightness(self, im):
         """
@@ -300,24 +247,10 @@ class Helpers:
         mu0 = 1.0 * sum([i * h[i] for i in range(len(h))]) / pixels
         return round(mu0[0], 2)
 
-    def calcAllAvgBrightness(self, listOfAllImages):
-        try:
-            listOfAllAvgBrightness = []
-
-            for img in listOfAllImages:
-                listOfAllAvgBrightness.append(self.avgbrightness(img))
-
-            return listOfAllAvgBrightness
-
-        except Exception as e:
-            print('calcAllAvgBrightness: Error: ' + str(e))
-            return listOfAllAvgBrightness
-
 
 def main():
     try:
         global Path_to_sourceDir
-        global listOfAvgBrightness
         global intervall
         intervall = 0.3
         preprocess = False  # Collect images from subdirectories
@@ -336,7 +269,6 @@ def main():
             # All images are allready in one folder
             listOfImages = help.loadImages(join(Path_to_sourceDir,'hdr'))
 
-        listOfAvgBrightness = help.calcAllAvgBrightness(listOfImages)
         help.runSlideShow(listOfImages)
 
         print('Postprocess.py done')
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+from collections import OrderedDict
+from os.path import join
+import numpy as np
+from defects import load_defects, repair
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : calibration.py
+######################################################################
+# Store for the master calibration frames written by radiometric.py
+# (df_avg5ms.data, wf_avg50ms.data, ...).
+#
+# Masters are listed in an index (calibration.json) with their kind
+# (dark / white), exposure [us], iso and optionally sensor temperature.
+# They are memory-mapped once and kept for the lifetime of the process.
+# Darks for exposures in between two calibrated exposures are linearly
+# interpolated (dark current grows linear with exposure) and cached, so
+# correcting a frame is a single vectorized operation without file I/O.
+#
+# Darks can be captured per temperature bin (df_avg5ms_t20.data, see
+# dometemp.py). For a sensor temperature between two bins the masters of
+# both are interpolated as well. Of frames interpolated for an arbitrary
+# exposure or temperature only the last few are cached.
+#
+# Corrections work in place on uint16 or float32 frames.
+#
+# Sensor parameters derived from the masters (gain, read noise, ...) are
+# kept in the index as well.
+#
+# The defect pixel map (defects.npy, see defects.py) lives in the same
+# directory and is loaded once as well.
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : Defect pixel map
+# 19.10.2026 : Sensor parameters (photon transfer) in the index
+# 19.10.2026 : Masters per temperature bin, interpolation over temperature
+#
+######################################################################
+
+global INDEX_NAME
+global RAW_SHAPE
+
+INDEX_NAME = 'calibration.json'
+DEFECTS_NAME = 'defects.npy'
+INDEX_VERSION = 1
+TEMP_STEP = 0.5         # [degree C] resolution of temperature interpolated frames
+RECENT_FRAMES = 6       # exposure / temperature interpolated frames kept
+RAW_SHAPE = (2464, 3296)
+
+# df_avg5ms -> ('dark', 5000, None), df_avg5ms_t20 -> ('dark', 5000, 20)
+MASTER_NAME = re.compile(r'^(df|wf)_avg(\d+)ms(?:_t(-?\d+))?$')
+MASTER_KINDS = {'df': 'dark', 'wf': 'white'}
+
+
+def parse_master_name(name):
+    '''
+    Kind, exposure [us] and temperature bin [degree C] from a master frame
+    name like 'df_avg5ms' or 'df_avg5ms_t20'.
+    :return: tuple (kind, exposure, temperature or None) or None
+    '''
+    match = MASTER_NAME.match(name)
+    if match is None:
+        return None
+    temperature = int(match.group(3)) if match.group(3) is not None else None
+    return MASTER_KINDS[match.group(1)], int(match.group(2)) * 1000, temperature
+
+
+def master_name(kind, exposure, temperature=None):
+    '''
+    Inverse of parse_master_name: ('dark', 5000, 20) -> 'df_avg5ms_t20'
+    '''
+    prefix = [k for k, v in MASTER_KINDS.items() if v == kind][0]
+    name = '{}_avg{}ms'.format(prefix, int(exposure) // 1000)
+    if temperature is not None:
+        name += '_t{}'.format(int(temperature))
+    return name
+
+
+class Calibration_store:
+    """
+    Master darks and flats of one camera, keyed by kind, exposure, iso and
+    temperature.
+
+    EXAMPLE:
+      store = get_store(RADIOMETRICALIB)
+      store.subtract_dark(frame, exposure=20000, iso=100)
+      store.apply_flat(frame, exposure=20000, iso=100)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.params = {}        # derived sensor parameters, e.g. 'ptc'
+        self.maps = {}          # file -> memmap
+        self.cache = {}         # derived frames, e.g. interpolated darks
+        self.recent = OrderedDict()     # derived frames of arbitrary exposures / temperatures
+        self.load_index()
+
+    def load_index(self):
+        index = join(self.path, INDEX_NAME)
+        if os.path.isfile(index):
+            with open(index, 'r') as f:
+                content = json.load(f)
+            self.entries = content.get('masters', [])
+            self.params = content.get('parameters', {})
+        else:
+            self.entries = self.scan_masters()
+
+    def scan_masters(self):
+        '''
+        Index for a directory without calibration.json: masters are
+        recognized by their file name, iso 100 as used by radiometric.py.
+        '''
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for file in sorted(os.listdir(self.path)):
+            name, ext = os.path.splitext(file)
+            parsed = parse_master_name(name)
+            if ext == '.data' and parsed is not None:
+                entries.append(dict(kind=parsed[0], file=file, exposure=parsed[1], iso=100,
+                                    temperature=parsed[2], shape=list(RAW_SHAPE), dtype='uint16'))
+        return entries
+
+    def save_index(self):
+        index = join(self.path, INDEX_NAME)
+        with open(index + '.tmp', 'w') as f:
+            json.dump(dict(version=INDEX_VERSION, masters=self.entries, parameters=self.params), f, indent=1)
+        os.rename(index + '.tmp', index)
+
+    def register(self, kind, file, exposure, iso=100, temperature=None, shape=RAW_SHAPE, dtype='uint16'):
+        '''
+        Adds or replaces a master frame in the index and saves it.
+        '''
+        self.entries = [e for e in self.entries if e['file'] != file]
+        self.entries.append(dict(kind=kind, file=file, exposure=int(exposure), iso=iso,
+                                 temperature=temperature, shape=list(shape), dtype=np.dtype(dtype).name))
+        self.maps.pop(file, None)
+        self.cache.clear()
+        self.recent.clear()
+        self.save_index()
+
+    def set_parameters(self, name, values):
+        '''
+        Stores derived sensor parameters (json serializable), e.g. the
+        photon transfer results of ptc.py, in the index.
+        '''
+        self.params[name] = values
+        self.save_index()
+
+    def parameters(self, name, default=None):
+        return self.params.get(name, default)
+
+    def master(self, entry):
+        '''
+        Memory-mapped master frame of an index entry (read only).
+        '''
+        file = entry['file']
+        if file not in self.maps:
+            self.maps[file] = np.memmap(join(self.path, file), dtype=entry['dtype'], mode='r',
+                                        shape=tuple(entry['shape']))
+        return self.maps[file]
+
+    def temperatures(self, kind, iso):
+        '''
+        Sorted calibrated temperatures of one kind and iso.
+        '''
+        return sorted(set(e['temperature'] for e in self.entries
+                          if e['kind'] == kind and e['iso'] == iso and e.get('temperature') is not None))
+
+    def candidates(self, kind, iso, temperature=None):
+        '''
+        Index entries of one kind and iso. With a temperature only the
+        entries of the nearest calibrated temperature are returned. Without
+        one the masters without temperature are preferred, else those of the
+        calibrated temperature in the middle.
+        '''
+        found = [e for e in self.entries if e['kind'] == kind and e['iso'] == iso]
+        if not found:
+            raise KeyError('No {} calibration for iso {} in {}'.format(kind, iso, self.path))
+
+        with_temp = [e for e in found if e.get('temperature') is not None]
+        if with_temp:
+            if temperature is None and len(with_temp) < len(found):
+                found = [e for e in found if e.get('temperature') is None]
+            else:
+                if temperature is None:
+                    temps = self.temperatures(kind, iso)
+                    temperature = temps[len(temps) // 2]
+                nearest = min(with_temp, key=lambda e: abs(e['temperature'] - temperature))['temperature']
+                found = [e for e in with_temp if e['temperature'] == nearest]
+
+        return sorted(found, key=lambda e: e['exposure'])
+
+    def remember(self, key, frame, bounded):
+        '''
+        Caches a derived frame. Frames of arbitrary exposures / temperatures
+        (bounded) go to a small cache of the most recent ones.
+        '''
+        if not bounded:
+            self.cache[key] = frame
+        else:
+            self.recent[key] = frame
+            while len(self.recent) > RECENT_FRAMES:
+                self.recent.popitem(last=False)
+        return frame
+
+    def cached(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        return self.recent.get(key)
+
+    def interpolate(self, kind, exposure, iso=100, temperature=None):
+        '''
+        Master frame for any exposure and sensor temperature. Between two
+        calibrated temperatures the masters of both are interpolated
+        linearly (temperature rounded to TEMP_STEP), outside the calibrated
+        range the nearest temperature is used.
+        See interpolate_exposure for the exposure.
+        '''
+        temps = self.temperatures(kind, iso)
+        if temperature is None or not temps or np.isnan(temperature):
+            return self.interpolate_exposure(kind, exposure, iso, None)
+
+        temperature = round(float(temperature) / TEMP_STEP) * TEMP_STEP
+        if temperature <= temps[0] or temperature >= temps[-1] or temperature in temps:
+            return self.interpolate_exposure(kind, exposure, iso, temperature)
+
+        key = ('temperature', kind, exposure, iso, temperature)
+        frame = self.cached(key)
+        if frame is None:
+            hi = int(np.searchsorted(temps, temperature))
+            lo = hi - 1
+            w = (temperature - temps[lo]) / float(temps[hi] - temps[lo])
+            frame = np.multiply(self.interpolate_exposure(kind, exposure, iso, temps[lo]), 1 - w, dtype=np.float32)
+            frame += np.multiply(self.interpolate_exposure(kind, exposure, iso, temps[hi]), w, dtype=np.float32)
+            self.remember(key, frame, True)
+
+        return frame
+
+    def interpolate_exposure(self, kind, exposure, iso=100, temperature=None):
+        '''
+        Master frame for any exposure. Exact matches are returned as memmap,
+        otherwise the two neighbouring exposures are interpolated linearly
+        (float32, cached). Outside the calibrated range the nearest master
+        is used. With exposure None all masters are averaged.
+        '''
+        found = self.candidates(kind, iso, temperature)
+        key = (kind, exposure, iso, tuple(e['file'] for e in found))
+        frame = self.cached(key)
+        if frame is not None:
+            return frame
+
+        exposures = [e['exposure'] for e in found]
+        if exposure is None:
+            frame = np.zeros(found[0]['shape'], dtype=np.float32)
+            for e in found:
+                frame += self.master(e)
+            frame /= len(found)
+        elif exposure in exposures:
+            frame = self.master(found[exposures.index(exposure)])
+        elif exposure <= exposures[0]:
+            frame = self.master(found[0])
+        elif exposure >= exposures[-1]:
+            frame = self.master(found[-1])
+        else:
+            hi = int(np.searchsorted(exposures, exposure))
+            lo = hi - 1
+            w = (exposure - exposures[lo]) / float(exposures[hi] - exposures[lo])
+            frame = np.multiply(self.master(found[lo]), 1 - w, dtype=np.float32)
+            frame += np.multiply(self.master(found[hi]), w, dtype=np.float32)
+            # every capture has its own exposure, keep only the recent ones
+            return self.remember(key, frame, True)
+
+        self.cache[key] = frame
+        return frame
+
+    def dark(self, exposure, iso=100, temperature=None, dtype=np.float32):
+        '''
+        Master dark for an exposure and temperature in the requested dtype (cached).
+        '''
+        if temperature is not None:
+            temperature = round(float(temperature) / TEMP_STEP) * TEMP_STEP
+        frame = self.interpolate('dark', exposure, iso, temperature)
+        dtype = np.dtype(dtype)
+        if frame.dtype == dtype:
+            return frame
+
+        key = ('dark', exposure, iso, temperature, dtype.name)
+        converted = self.cached(key)
+        if converted is None:
+            if dtype.kind == 'u':
+                frame = np.rint(frame)
+            converted = self.remember(key, frame.astype(dtype), temperature is not None or not isinstance(frame, np.memmap))
+        return converted
+
+    def flat(self, exposure, iso=100, temperature=None):
+        '''
+        Normalized flat field (mean 1, float32) from the white master minus
+        the dark of the same exposure (cached).
+        '''
+        if temperature is not None:
+            temperature = round(float(temperature) / TEMP_STEP) * TEMP_STEP
+        key = ('flat', exposure, iso, temperature)
+        flat = self.cached(key)
+        if flat is None:
+            flat = np.subtract(self.interpolate('white', exposure, iso, temperature),
+                               self.dark(exposure, iso, temperature), dtype=np.float32)
+            np.maximum(flat, 1, out=flat)
+            flat /= flat.mean()
+            self.remember(key, flat, True)
+        return flat
+
+    def defects(self):
+        '''
+        Sorted flat indices of the defect pixels, empty without a map (cached).
+        '''
+        if 'defects' not in self.cache:
+            path = join(self.path, DEFECTS_NAME)
+            self.cache['defects'] = load_defects(path) if os.path.isfile(path) else np.zeros(0, dtype=np.intp)
+        return self.cache['defects']
+
+    def correct_defects(self, data):
+        '''
+        Repairs the defect pixels of a raw frame in place.
+        '''
+        return repair(data.reshape(RAW_SHAPE) if data.ndim == 1 else data, self.defects())
+
+    def subtract_dark(self, data, exposure=None, iso=100, temperature=None):
+        '''
+        Subtracts the matching master dark in place, clipped at 0.
+        :param data: raw frame, uint16 or float32
+        :return: data
+        '''
+        dark = self.dark(exposure, iso, temperature, data.dtype).reshape(data.shape)
+        if data.dtype.kind == 'u':
+            np.maximum(data, dark, out=data)       # no wrap around below 0
+            data -= dark
+        else:
+            data -= dark
+            np.maximum(data, 0, out=data)
+        return data
+
+    def apply_flat(self, data, exposure=None, iso=100, temperature=None):
+        '''
+        Divides by the normalized flat field in place.
+        :param data: dark subtracted raw frame, float32 (uint16 is truncated)
+        :return: data
+        '''
+        flat = self.flat(exposure, iso, temperature).reshape(data.shape)
+        np.divide(data, flat, out=data, casting='unsafe')
+        return data
+
+
+STORES = {}
+
+
+def get_store(path):
+    '''
+    One Calibration_store per calibration directory and process.
+    '''
+    if path not in STORES:
+        STORES[path] = Calibration_store(path)
+    return STORES[path]
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import numpy as np
+import cv2
+from histogram import sky_mask
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : defects.py
+######################################################################
+# Hot / dead pixel map of one camera and its per frame correction.
+#
+# The map is built from the master frames of radiometric.py:
+# - hot   : dark mean far above the other pixels of the same bayer site
+# - noisy : dark variance far above the other pixels (RTS / flicker)
+# - dead  : white response far below the local response (dust shadows
+#           are too wide to be caught, a 15x15 neighbourhood is used),
+#           only where the sky is lit: inside the sky circle and with a
+#           local response above min_response of the sky median
+# Outliers are judged by median and MAD per bayer site (robust to the
+# defects themselves).
+#
+# The map is stored as sorted int32 array of flat indices into the raw
+# mosaic (a few kB). Repairing a frame only touches these indices: each
+# defect is replaced by the mean of its same colour neighbours two pixels
+# up, down, left and right, skipping neighbours that are defects too.
+# The cost per frame is proportional to the number of defects.
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : dead pixels only tested in the lit sky circle (no dark corners)
+# 19.10.2026 : bayer sites without sky pixels are reported instead of a nan median
+#
+######################################################################
+
+global RAW_SHAPE
+RAW_SHAPE = (2464, 3296)
+
+BAYER_SITES = ((0, 0), (0, 1), (1, 0), (1, 1))
+
+
+def robust_outliers(plane, k, min_sigma):
+    '''
+    Pixels above median + k * sigma, sigma from the MAD.
+    '''
+    median = np.median(plane)
+    sigma = max(1.4826 * np.median(np.abs(plane - median)), min_sigma)
+    return plane > median + k * sigma
+
+
+def find_defects(dark_mean, dark_var=None, white_mean=None, k_hot=8.0, k_noisy=8.0,
+                 dead_fraction=0.5, min_sigma=0.5, min_response=0.2, sky=None):
+    '''
+    Flags defective pixels from master frames.
+    :param dark_mean: master dark (raw mosaic)
+    :param dark_var: per pixel variance of the dark stack, optional
+    :param white_mean: dark subtracted master white, optional
+    :param k_hot: threshold in robust sigmas for hot pixels
+    :param k_noisy: threshold in robust sigmas for noisy pixels
+    :param dead_fraction: pixels below this fraction of the local white response are dead
+    :param min_response: dead pixels are only searched where the local white response is
+           above this fraction of the median in the sky
+    :param sky: None, or (centre (row, col), radius) of the sky circle in mosaic pixels,
+           without it the sky are the pixels above half the 99th percentile
+    :return: sorted int32 array of flat indices into the mosaic
+    '''
+    shape = dark_mean.shape if dark_mean.ndim == 2 else RAW_SHAPE
+    dark_mean = np.asarray(dark_mean, dtype=np.float32).reshape(shape)
+    defect = np.zeros(shape, dtype=bool)
+
+    for y, x in BAYER_SITES:
+        site = defect[y::2, x::2]
+        site |= robust_outliers(dark_mean[y::2, x::2], k_hot, min_sigma)
+
+        if dark_var is not None:
+            var = np.asarray(dark_var, dtype=np.float32).reshape(shape)[y::2, x::2]
+            site |= robust_outliers(var, k_noisy, min_sigma)
+
+        if white_mean is not None:
+            white = np.ascontiguousarray(np.asarray(white_mean, dtype=np.float32).reshape(shape)[y::2, x::2])
+            local = cv2.blur(white, (15, 15))
+            if sky is not None:
+                (cy, cx), radius = sky
+                # shrunk by the blur window, the edge of the circle is not lit evenly
+                inside = sky_mask(local.shape, ((cy - y) // 2, (cx - x) // 2), radius // 2 - 8)
+            else:
+                inside = local >= 0.5 * np.percentile(local, 99)
+            if inside.any():
+                lit = inside & (local > min_response * np.median(local[inside]))
+                site |= lit & (white < dead_fraction * local)
+            else:
+                print('find_defects: no sky pixels at bayer site ({}, {}), dead pixels not searched'.format(y, x))
+
+    return np.flatnonzero(defect).astype(np.int32)
+
+
+def save_defects(indices, path):
+    np.save(path, np.asarray(indices, dtype=np.int32))
+
+
+def load_defects(path):
+    return np.load(path).astype(np.intp)
+
+
+def repair(mosaic, indices):
+    '''
+    Replaces the defective pixels of a raw mosaic in place by the mean of
+    their valid same colour neighbours (+-2 rows / columns).
+    :param mosaic: 2d C-contiguous raw frame (any dtype)
+    :param indices: sorted flat indices of defects
+    :return: mosaic
+    '''
+    if len(indices) == 0:
+        return mosaic
+    if not mosaic.flags.c_contiguous:
+        raise ValueError('repair needs a contiguous frame')
+
+    h, w = mosaic.shape
+    flat = mosaic.reshape(-1)
+    rows, cols = np.divmod(indices, w)
+
+    total = np.zeros(len(indices), dtype=np.float32)
+    count = np.zeros(len(indices), dtype=np.float32)
+    for dy, dx in ((-2, 0), (2, 0), (0, -2), (0, 2)):
+        r = rows + dy
+        c = cols + dx
+        inside = (r >= 0) & (r < h) & (c >= 0) & (c < w)
+        neighbour = np.where(inside, r * w + c, 0)
+        # neighbours that are defects themselves do not count
+        pos = np.searchsorted(indices, neighbour)
+        pos[pos == len(indices)] = 0
+        valid = inside & (indices[pos] != neighbour)
+        total += np.where(valid, flat[neighbour], 0)
+        count += valid
+
+    repaired = count > 0
+    value = total[repaired] / count[repaired]
+    if mosaic.dtype.kind in 'ui':
+        value = np.rint(value)
+    flat[indices[repaired]] = value
+
+    return mosaic
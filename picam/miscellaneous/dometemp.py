@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+import os
+import time
+import sqlite3
+import numpy as np
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : dometemp.py
+######################################################################
+# Camera dome temperature history from the sensor database written by
+# sensors/write-sensors-db.py (DS18B20 dome sensor, one row per minute).
+#
+# The readings are loaded once into two sorted arrays (time, degree C).
+# Capture times are joined to the nearest reading with one searchsorted
+# over all captures, later calls only load the rows added since.
+# Error readings of the DS18B20 (85000) are dropped.
+#
+# Used by radiometric.py to select / interpolate master darks by
+# sensor temperature.
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+#
+######################################################################
+
+global SENSOR_DB
+global TEMP_BIN
+
+SENSOR_DB = os.path.join('/home', 'pi', 'python_scripts', 'sensors', 'sensor_DB.db')
+TEMP_BIN = 5.0          # [degree C] width of the dark frame temperature bins
+MAX_GAP = 300           # [s] readings further away from a capture are not used
+DS18B_ERROR = '85000'
+
+# '2018 10 07 - 12:30:00' -> '2018-10-07T12:30:00' (numpy datetime64)
+ISO_TIMESTAMP = ("substr(Timestamp, 1, 4) || '-' || substr(Timestamp, 6, 2) || '-' || "
+                 "substr(Timestamp, 9, 2) || 'T' || substr(Timestamp, 14, 8)")
+
+
+def temperature_bin(temperature, width=TEMP_BIN):
+    '''
+    Centre of the temperature bin, e.g. 22.4 -> 20 with 5 degree bins.
+    '''
+    return int(round(temperature / width) * width)
+
+
+def session_time(name):
+    '''
+    Capture time of a picam session directory name, e.g. 20181007_123000.
+    :return: numpy datetime64[s]
+    '''
+    name = os.path.basename(os.path.normpath(name))
+    return np.datetime64('{}-{}-{}T{}:{}:{}'.format(name[0:4], name[4:6], name[6:8],
+                                                    name[9:11], name[11:13], name[13:15]), 's')
+
+
+class Dome_temperature:
+    """
+    Sorted dome temperature readings of one sensor database.
+
+    EXAMPLE:
+      dome = get_dome_temperature()
+      temps = dome.at([session_time(d) for d in session_dirs])
+    """
+    def __init__(self, path=SENSOR_DB, camera_id=None):
+        self.path = path
+        self.camera_id = camera_id
+        self.times = np.zeros(0, dtype='datetime64[s]')
+        self.temps = np.zeros(0, dtype=np.float32)
+        self.last = ''          # newest Timestamp string loaded
+        self.refresh()
+
+    def refresh(self):
+        '''
+        Loads the readings added since the last call.
+        :return: number of new readings
+        '''
+        if not os.path.isfile(self.path):
+            print('Error in Dome_temperature: No sensor database at {}'.format(self.path))
+            return 0
+
+        # the Timestamp format sorts like the time itself
+        query = ("SELECT {}, Timestamp, DS18B_Dome_Temp FROM sensor_data "
+                 "WHERE Timestamp > ? AND DS18B_Dome_Temp NOT IN (?, 'None', '')").format(ISO_TIMESTAMP)
+        args = [self.last, DS18B_ERROR]
+        if self.camera_id is not None:
+            query += " AND Camera_id = ?"
+            args.append(str(self.camera_id))
+
+        con = sqlite3.connect(self.path)
+        try:
+            rows = con.execute(query, args).fetchall()
+        finally:
+            con.close()
+
+        if not rows:
+            return 0
+
+        iso, stamps, temps = zip(*rows)
+        times = np.array(iso, dtype='datetime64[s]')
+        temps = np.array(temps, dtype=np.float32) / 1000.0
+
+        times = np.concatenate([self.times, times])
+        temps = np.concatenate([self.temps, temps])
+        order = np.argsort(times, kind='mergesort')
+        self.times = times[order]
+        self.temps = temps[order]
+        self.last = max(self.last, max(stamps))
+
+        return len(rows)
+
+    def at(self, times, max_gap=MAX_GAP):
+        '''
+        Dome temperature of the nearest reading for every capture time.
+        :param times: datetime64 or array of them
+        :param max_gap: [s] larger distances to the nearest reading give nan
+        :return: float32 array [degree C] (scalar for a single time)
+        '''
+        times = np.asarray(times, dtype='datetime64[s]')
+        scalar = times.ndim == 0
+        times = np.atleast_1d(times)
+
+        if self.times.size == 0:
+            result = np.full(times.shape, np.nan, dtype=np.float32)
+            return result[0] if scalar else result
+
+        right = np.clip(np.searchsorted(self.times, times), 1, self.times.size - 1)
+        left = right - 1
+        if self.times.size == 1:
+            left = right = np.zeros_like(right)
+        d_left = np.abs(times - self.times[left]).astype(np.int64)
+        d_right = np.abs(self.times[right] - times).astype(np.int64)
+        nearest = np.where(d_right < d_left, right, left)
+
+        result = self.temps[nearest].copy()
+        result[np.minimum(d_left, d_right) > max_gap] = np.nan
+
+        return result[0] if scalar else result
+
+    def now(self, max_gap=MAX_GAP):
+        '''
+        Current dome temperature from the newest reading, nan if outdated.
+        '''
+        self.refresh()
+        return self.at(np.datetime64('now') + local_offset(), max_gap)
+
+
+def local_offset():
+    '''
+    The sensor database is written in local time, datetime64('now') is UTC.
+    '''
+    offset = -time.altzone if time.localtime().tm_isdst > 0 else -time.timezone
+    return np.timedelta64(offset, 's')
+
+
+HISTORIES = {}
+
+
+def get_dome_temperature(path=SENSOR_DB):
+    '''
+    One Dome_temperature per database and process, refreshed on access.
+    '''
+    if path not in HISTORIES:
+        HISTORIES[path] = Dome_temperature(path)
+    else:
+        HISTORIES[path].refresh()
+    return HISTORIES[path]
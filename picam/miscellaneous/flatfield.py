@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : flatfield.py
+######################################################################
+# Flat field (vignetting) correction for radiometric.py.
+#
+# The fall off per colour channel is described by a 2nd order Fourier
+# series  f(x) = a0 + a1 cos(wx) + b1 sin(wx) + a2 cos(2wx) + b2 sin(2wx).
+# Instead of evaluating 5 cos/sin per pixel and channel for every frame,
+# f is tabulated once over its integer domain:
+#
+# - radial : x is the distance [pixel] from the sky circle centre. The
+#            table is gathered once into a per channel gain map
+#            f(0) / f(r), correcting a frame is one multiplication.
+# - value  : x is the raw value (10 bit -> 1024 entries). The correction
+#            f(0) / f(x) of every pixel is one indexed gather per channel
+#            and multiplied with the pixel, like the radial gain.
+#
+# Tables and gain maps are cached per model, shape and centre.
+#
+# The coefficients are fitted from the master white frames (fit_model):
+# the dark subtracted white frame is demosaiced, binned radially from the
+# sky circle centre (one bincount per channel) and the model is fitted
+# by least squares on the ~1000 bins instead of all 8 M pixels. The
+# result is written to a versioned flatfield.json which get_model loads.
+#
+# Use: python flatfield.py wf_avg50ms.data -d df_avg50ms.data -o flatfield.json
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : Fitting from master white frames, versioned calibration file
+# 19.10.2026 : Value mode reduces 16 bit input to the table range instead of clipping
+# 19.10.2026 : Value mode multiplies with the correction f(0) / f(value) instead of returning f
+# 19.10.2026 : Radial gain clamped to the fitted max_radius (no extrapolation outside the sky circle)
+#
+######################################################################
+
+global FOURIER_COEFS
+global FLATFIELD_FILE
+
+FLATFIELD_FILE = os.path.join('/home', 'pi', 'python_scripts', 'picam', 'radiometric', 'flatfield.json')
+FLATFIELD_VERSION = 1
+RAW_SHAPE = (2464, 3296)
+
+# Fitted offline, formerly hand typed in radiometric.create_flatfield / flatfielding
+#                a0      a1      b1      a2       b2        w
+FOURIER_COEFS = {
+    'r': (-1.234,  1.962,  -1.751,  0.2604,  0.07941, -0.0007905),
+    'g': ( 0.4900, 0.4123,  0.1851, 0.09083, -0.05701,  0.001312),
+    'b': ( 0.4935, 0.4216,  0.1736, 0.08101, -0.06155,  0.001284),
+}
+CHANNELS = ('r', 'g', 'b')      # channel order of demosaiced images
+
+
+def fourier2(x, coefs):
+    '''
+    2nd order Fourier series, evaluated in float64 (only used to fill tables).
+    '''
+    a0, a1, b1, a2, b2, w = coefs
+    x = np.asarray(x, dtype=np.float64)
+    return a0 + a1 * np.cos(w * x) + b1 * np.sin(w * x) + a2 * np.cos(2 * w * x) + b2 * np.sin(2 * w * x)
+
+
+def radius_map(shape, centre=None):
+    '''
+    Integer distance of every pixel from centre (y, x), default image centre.
+    '''
+    h, w = shape[:2]
+    if centre is None:
+        centre = (h / 2.0, w / 2.0)
+    y, x = np.ogrid[0:h, 0:w]
+    y = (y - centre[0]).astype(np.float32)
+    x = (x - centre[1]).astype(np.float32)
+    r = np.sqrt(y * y + x * x)
+    return np.rint(r, out=r).astype(np.int32)
+
+
+class Flatfield_model:
+    """
+    Per channel fall off model with cached lookup tables and gain maps.
+
+    EXAMPLE:
+      model = Flatfield_model()
+      model.apply_radial(rgb)             # rgb: demosaiced float32 image
+    """
+    def __init__(self, coefs=None, model='fourier2', centre=None, max_radius=None):
+        '''
+        :param coefs: dict channel -> coefficients, default FOURIER_COEFS
+        :param model: 'fourier2' or 'poly' (coefficients for np.polyval)
+        :param centre: default sky circle centre (y, x) for radial gain maps
+        :param max_radius: largest radius of the fit, further out the gain of
+               max_radius is used instead of extrapolating the model
+        '''
+        self.coefs = coefs if coefs is not None else FOURIER_COEFS
+        self.model = model
+        self.centre = centre
+        self.max_radius = max_radius
+        self.luts = {}
+        self.gains = {}
+
+    def evaluate(self, channel, x):
+        if self.model == 'poly':
+            return np.polyval(self.coefs[channel], np.asarray(x, dtype=np.float64))
+        return fourier2(x, self.coefs[channel])
+
+    def lut(self, channel, size):
+        '''
+        f tabulated for x = 0 .. size-1 (float32, cached).
+        '''
+        key = (channel, size)
+        if key not in self.luts:
+            self.luts[key] = self.evaluate(channel, np.arange(size)).astype(np.float32)
+        return self.luts[key]
+
+    def gain(self, channel, size):
+        '''
+        Correction f(0) / f(x) for x = 0 .. size-1 (float32, cached).
+        '''
+        key = (channel, size, 'gain')
+        if key not in self.luts:
+            lut = self.lut(channel, size)
+            self.luts[key] = lut[0] / np.maximum(lut, 1e-6)
+        return self.luts[key]
+
+    def gain_map(self, shape, centre=None):
+        '''
+        Radial gain map f(0) / f(r), shape (h, w, 3), float32, cached per
+        shape and centre. r is clamped to max_radius.
+        '''
+        centre = centre if centre is not None else self.centre
+        key = (tuple(shape[:2]), None if centre is None else tuple(centre))
+        if key not in self.gains:
+            r = radius_map(shape, centre)
+            if self.max_radius is not None:
+                np.minimum(r, int(self.max_radius), out=r)
+            gain = np.empty(tuple(shape[:2]) + (len(CHANNELS),), dtype=np.float32)
+            for i, ch in enumerate(CHANNELS):
+                np.take(self.gain(ch, int(r.max()) + 1), r, out=gain[..., i])
+            self.gains[key] = gain
+        return self.gains[key]
+
+    def apply_radial(self, image, centre=None, out=None):
+        '''
+        Vignetting correction of a demosaiced image, one multiplication.
+        :param image: (h, w, 3) image, float32 is corrected in place
+        :return: corrected image (float32)
+        '''
+        gain = self.gain_map(image.shape, centre)
+        if out is None:
+            out = image if image.dtype == np.float32 else image.astype(np.float32)
+        np.multiply(out, gain, out=out)
+        return out
+
+    def apply_value(self, image, bits=10, input_bits=16):
+        '''
+        Value dependent correction: every pixel is multiplied with f(0) / f(value),
+        the factor is found by table lookup.
+        :param image: (h, w, 3) image with `input_bits` significant bits, e.g. the
+               16 bit scaled output of Imgproc.demosaic1
+        :param bits: resolution of the tables (10 bit raw value), the input is
+               reduced to it for the lookup
+        :return: corrected float32 image in the range of the input
+        '''
+        size = 1 << bits
+        shift = max(input_bits - bits, 0)
+        out = np.empty(image.shape, dtype=np.float32)
+        for i, ch in enumerate(CHANNELS):
+            plane = image[..., i]
+            if plane.dtype.kind in 'ui':
+                index = np.right_shift(plane, shift)
+            else:
+                index = (plane * (1.0 / (1 << shift))).astype(np.int32)
+            np.take(self.gain(ch, size), index, out=out[..., i], mode='clip')
+            np.multiply(out[..., i], plane, out=out[..., i])
+        return out
+
+
+def demosaic_planes(mosaic):
+    '''
+    Half resolution r, g, b planes of a raw mosaic (float32), green is the
+    mean of both green sites. Same bayer layout as Imgproc.demosaic1.
+    '''
+    mosaic = mosaic.reshape(RAW_SHAPE)
+    green = np.add(mosaic[0::2, 0::2], mosaic[1::2, 1::2], dtype=np.float32)
+    green *= 0.5
+    return {'r': mosaic[1::2, 0::2].astype(np.float32), 'g': green, 'b': mosaic[0::2, 1::2].astype(np.float32)}
+
+
+def radial_profile(plane, centre=None, max_radius=None):
+    '''
+    Mean value per integer radius from centre.
+    :param max_radius: ignore pixels further out (e.g. outside the sky circle)
+    :return: tuple (radii, mean, count) of all non empty bins
+    '''
+    r = radius_map(plane.shape, centre).ravel()
+    values = plane.ravel()
+    if max_radius is not None:
+        inside = r <= max_radius
+        r = r[inside]
+        values = values[inside]
+
+    count = np.bincount(r)
+    total = np.bincount(r, weights=values)
+    radii = np.nonzero(count)[0]
+
+    return radii, total[radii] / count[radii], count[radii]
+
+
+def fit_fourier2(x, y, weights=None, w_range=(1e-4, 3e-3), steps=300):
+    '''
+    Least squares fit of a 2nd order Fourier series. For a fixed w the
+    model is linear in a0..b2, so w is searched on a grid and a0..b2 solved
+    with lstsq for every candidate (a negative w only flips the sign of b1, b2).
+    :return: tuple (a0, a1, b1, a2, b2, w), residual
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    sw = np.ones_like(x) if weights is None else np.sqrt(np.asarray(weights, dtype=np.float64))
+
+    best = None
+    grid = np.linspace(w_range[0], w_range[1], steps)
+    for w in grid:
+        design = np.column_stack([np.ones_like(x), np.cos(w * x), np.sin(w * x),
+                                  np.cos(2 * w * x), np.sin(2 * w * x)])
+        coefs = np.linalg.lstsq(design * sw[:, None], y * sw, rcond=None)[0]
+        residual = np.sum((sw * (design.dot(coefs) - y)) ** 2)
+        if best is None or residual < best[1]:
+            best = (tuple(coefs) + (w,), residual)
+
+    return best
+
+
+def fit_model(white, dark=None, centre=None, max_radius=None, model='fourier2', degree=4):
+    '''
+    Fits the radial fall off per channel to a master white frame.
+    :param white: raw master white frame (mosaic)
+    :param dark: raw master dark of the same exposure, optional
+    :param centre: sky circle centre (y, x) in demosaiced pixels, default image centre
+    :param model: 'fourier2' or 'poly' (polynomial of `degree` in r)
+    :return: dict ready for save_model
+    '''
+    mosaic = np.asarray(white, dtype=np.float32).reshape(RAW_SHAPE)
+    if dark is not None:
+        mosaic = mosaic - np.asarray(dark, dtype=np.float32).reshape(RAW_SHAPE)
+    planes = demosaic_planes(mosaic)
+
+    channels = {}
+    residuals = {}
+    for ch in CHANNELS:
+        radii, profile, count = radial_profile(planes[ch], centre, max_radius)
+        centre_bins = radii <= 10
+        profile = profile / np.average(profile[centre_bins], weights=count[centre_bins])   # 1 in the centre
+        if model == 'poly':
+            coefs = np.polyfit(radii, profile, degree, w=np.sqrt(count))
+            residual = np.sum(count * (np.polyval(coefs, radii) - profile) ** 2)
+        else:
+            coefs, residual = fit_fourier2(radii, profile, count)
+        channels[ch] = [float(c) for c in coefs]
+        residuals[ch] = float(residual)
+
+    shape = planes['g'].shape
+    return dict(
+        version=FLATFIELD_VERSION,
+        model=model,
+        created=time.strftime('%Y%m%d_%H%M%S'),
+        shape=list(shape),
+        centre=list(centre) if centre is not None else [shape[0] / 2.0, shape[1] / 2.0],
+        max_radius=max_radius,
+        coefs=channels,
+        residuals=residuals,
+    )
+
+
+def save_model(calib, path=FLATFIELD_FILE):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(calib, f, indent=1)
+    os.rename(path + '.tmp', path)
+
+
+def load_model(path=FLATFIELD_FILE):
+    '''
+    Flatfield_model from a calibration file, the built in FOURIER_COEFS
+    if there is none.
+    '''
+    if not os.path.isfile(path):
+        return Flatfield_model()
+
+    with open(path, 'r') as f:
+        calib = json.load(f)
+    if calib.get('version', 0) > FLATFIELD_VERSION:
+        raise ValueError('flatfield calibration version {} not supported'.format(calib['version']))
+
+    coefs = dict((ch, tuple(c)) for ch, c in calib['coefs'].items())
+    return Flatfield_model(coefs, calib.get('model', 'fourier2'), calib.get('centre'), calib.get('max_radius'))
+
+
+MODELS = {}
+
+
+def get_model(path=FLATFIELD_FILE):
+    '''
+    One cached Flatfield_model per calibration file.
+    '''
+    if path not in MODELS:
+        MODELS[path] = load_model(path)
+    return MODELS[path]
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Fit the flat field model to a master white frame.')
+        parser.add_argument('white', help='master white frame, e.g. wf_avg50ms.data')
+        parser.add_argument('-d', '--dark', default=None, help='master dark of the same exposure')
+        parser.add_argument('-o', '--out', default=FLATFIELD_FILE, help='calibration file to write')
+        parser.add_argument('-c', '--centre', type=float, nargs=2, default=None, metavar=('Y', 'X'),
+                            help='sky circle centre in demosaiced pixels')
+        parser.add_argument('-r', '--radius', type=int, default=None, help='sky circle radius')
+        parser.add_argument('-m', '--model', default='fourier2', choices=['fourier2', 'poly'])
+        args = parser.parse_args()
+
+        t_start = time.time()
+        white = np.fromfile(args.white, dtype=np.uint16)
+        dark = np.fromfile(args.dark, dtype=np.uint16) if args.dark else None
+        calib = fit_model(white, dark, args.centre, args.radius, args.model)
+        save_model(calib, args.out)
+
+        for ch in CHANNELS:
+            print('{}: {} (residual {:.3g})'.format(ch, calib['coefs'][ch], calib['residuals'][ch]))
+        print('Flat field written to {} in {:.1f} s'.format(args.out, time.time() - t_start))
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+import os
+import re
+import time
+import argparse
+from glob import glob
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import cv2
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : fusion.py
+######################################################################
+# Exposure fusion previews of the jpg brackets (raw_img0.jpg,
+# raw_img-2.jpg, raw_img-4.jpg) after Mertens et al.: every image is
+# weighted per pixel by contrast, saturation and well-exposedness and
+# the images are blended in a Laplacian pyramid.
+#
+# - inputs are decoded at reduced size (default 1/2, jpg DCT scaling)
+# - sessions are fused in a process pool, sessions with an up to date
+#   preview are skipped, so the same call works incrementally
+#
+# One fused jpg per bracket is written to the 'hdr' folder next to the
+# session folders (<day>/hdr/<session>.jpg), where analyze.py reads it.
+#
+# Use: python fusion.py /path/to/day -j 4 -s 0.5
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : pyramid cache removed (no hits across sessions), weights passed to the workers
+#
+######################################################################
+
+global HDR_DIR
+global SCALE
+
+HDR_DIR = 'hdr'
+SCALE = 0.5
+JPG_NAME = re.compile(r'^raw_img(-?\d+)\.jpg$')
+# cv2 decodes jpgs directly at 1/2, 1/4, 1/8 size
+REDUCED = {0.5: cv2.IMREAD_REDUCED_COLOR_2, 0.25: cv2.IMREAD_REDUCED_COLOR_4, 0.125: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def bracket_jpgs(session_dir):
+    '''
+    Jpgs of one bracket, sorted by F stop / run number.
+    '''
+    found = []
+    for path in glob(os.path.join(session_dir, 'raw_img*.jpg')):
+        match = JPG_NAME.match(os.path.basename(path))
+        if match is not None:
+            found.append((int(match.group(1)), path))
+    return [path for key, path in sorted(found)]
+
+
+def load_scaled(path, scale=SCALE):
+    '''
+    Reads a jpg at reduced size as float32 BGR in [0, 1].
+    '''
+    if scale in REDUCED:
+        img = cv2.imread(path, REDUCED[scale])
+    else:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None and scale != 1:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if img is None:
+        raise IOError('Could not read {}'.format(path))
+
+    return img.astype(np.float32) * (1.0 / 255)
+
+
+def exposure_weight(img, wc=1.0, ws=1.0, we=1.0, sigma=0.2):
+    '''
+    Mertens weight: contrast^wc * saturation^ws * well-exposedness^we.
+    '''
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    contrast = np.abs(cv2.Laplacian(gray, cv2.CV_32F))
+    saturation = img.std(axis=2)
+
+    exposedness = img - 0.5
+    exposedness *= exposedness
+    exposedness *= -1.0 / (2 * sigma * sigma)
+    np.exp(exposedness, out=exposedness)
+    well = exposedness[..., 0] * exposedness[..., 1] * exposedness[..., 2]
+
+    weight = np.power(contrast, wc) * np.power(saturation, ws) * np.power(well, we)
+    return weight + 1e-12
+
+
+def laplacian_pyramid(img, levels):
+    gauss = [img]
+    for i in range(levels - 1):
+        gauss.append(cv2.pyrDown(gauss[-1]))
+    pyramid = []
+    for i in range(levels - 1):
+        size = (gauss[i].shape[1], gauss[i].shape[0])
+        pyramid.append(gauss[i] - cv2.pyrUp(gauss[i + 1], dstsize=size))
+    pyramid.append(gauss[-1])
+    return pyramid
+
+
+def gaussian_pyramid(img, levels):
+    pyramid = [img]
+    for i in range(levels - 1):
+        pyramid.append(cv2.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+def pyramid_levels(shape, smallest=8):
+    '''
+    Number of levels until the shorter side is about `smallest` pixels.
+    '''
+    return max(1, int(np.log2(min(shape[:2]) / float(smallest))))
+
+
+def image_pyramid(path, scale=SCALE, weights=(1.0, 1.0, 1.0)):
+    '''
+    Laplacian pyramid and weight map of one jpg.
+    :param weights: exponents of contrast, saturation and well-exposedness
+    :return: tuple (list of pyramid levels, weight map)
+    '''
+    img = load_scaled(path, scale)
+    return laplacian_pyramid(img, pyramid_levels(img.shape)), exposure_weight(img, *weights)
+
+
+def fuse(entries):
+    '''
+    Blends the pyramids of a bracket.
+    :param entries: list of (laplacian pyramid, weight map) of the same size
+    :return: fused BGR image, uint8
+    '''
+    total = np.zeros_like(entries[0][1])
+    for pyramid, weight in entries:
+        total += weight
+
+    levels = len(entries[0][0])
+    blended = None
+    for pyramid, weight in entries:
+        gauss = gaussian_pyramid(weight / total, levels)
+        if blended is None:
+            blended = [lap * g[..., None] for lap, g in zip(pyramid, gauss)]
+        else:
+            for i in range(levels):
+                blended[i] += pyramid[i] * gauss[i][..., None]
+
+    img = blended[-1]
+    for level in reversed(blended[:-1]):
+        img = cv2.pyrUp(img, dstsize=(level.shape[1], level.shape[0]))
+        img += level
+
+    img *= 255
+    np.clip(img, 0, 255, out=img)
+    return np.rint(img).astype(np.uint8)
+
+
+def output_path(session_dir, out_dir=None):
+    session_dir = os.path.normpath(session_dir)
+    if out_dir is None:
+        out_dir = os.path.join(os.path.dirname(session_dir), HDR_DIR)
+    return os.path.join(out_dir, os.path.basename(session_dir) + '.jpg')
+
+
+def fuse_session(session_dir, out_dir=None, scale=SCALE, quality=90, weights=(1.0, 1.0, 1.0)):
+    '''
+    Writes the fused preview of one bracket to <day>/hdr/<session>.jpg.
+    :return: output path, None if the session has less than two jpgs
+    '''
+    jpgs = bracket_jpgs(session_dir)
+    if len(jpgs) < 2:
+        return None
+
+    img = fuse([image_pyramid(path, scale, weights) for path in jpgs])
+
+    out_file = output_path(session_dir, out_dir)
+    if not os.path.isdir(os.path.dirname(out_file)):
+        os.makedirs(os.path.dirname(out_file))
+    tmp_file = out_file + '.part.jpg'
+    if not cv2.imwrite(tmp_file, img, [cv2.IMWRITE_JPEG_QUALITY, quality]):
+        raise IOError('cv2.imwrite failed for {}'.format(out_file))
+    os.rename(tmp_file, out_file)
+
+    return out_file
+
+
+def fuse_one(job):
+    '''
+    Worker: fuses one session. Runs in a pool process.
+    :return: tuple (session_dir, error or None)
+    '''
+    session_dir, out_dir, scale, quality, weights = job
+    try:
+        fuse_session(session_dir, out_dir, scale, quality, weights)
+        return session_dir, None
+    except Exception as e:
+        return session_dir, str(e)
+
+
+def find_brackets(root, out_dir=None, force=False):
+    '''
+    Session directories below root with a jpg bracket and without an up to
+    date preview.
+    '''
+    sessions = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != HDR_DIR)
+        jpgs = [f for f in filenames if JPG_NAME.match(f)]
+        if len(jpgs) < 2:
+            continue
+        out = output_path(dirpath, out_dir)
+        newest = max(os.path.getmtime(os.path.join(dirpath, f)) for f in jpgs)
+        if force or not os.path.isfile(out) or os.path.getmtime(out) < newest:
+            sessions.append(dirpath)
+    return sessions
+
+
+def fuse_all(root, out_dir=None, workers=None, scale=SCALE, quality=90, force=False, weights=(1.0, 1.0, 1.0)):
+    '''
+    Fuses every bracket below root (a session, a day or an archive).
+    :param weights: exponents of contrast, saturation and well-exposedness
+    :return: tuple (fused, failed)
+    '''
+    sessions = find_brackets(root, out_dir, force)
+    workers = workers or cpu_count()
+    print('Fusing {} brackets with {} processes.'.format(len(sessions), workers))
+
+    fused = 0
+    failed = 0
+    t_start = time.time()
+    jobs = [(s, out_dir, scale, quality, tuple(weights)) for s in sessions]
+    if workers > 1 and len(jobs) > 1:
+        pool = Pool(workers)
+        try:
+            results = list(pool.imap_unordered(fuse_one, jobs))
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        results = [fuse_one(job) for job in jobs]
+
+    for session_dir, error in results:
+        if error is not None:
+            failed += 1
+            print('Could not fuse {}: {}'.format(session_dir, error))
+        else:
+            fused += 1
+
+    print('Done: {} fused, {} failed in {:.1f} s'.format(fused, failed, time.time() - t_start))
+    return fused, failed
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Exposure fusion previews of the jpg brackets.')
+        parser.add_argument('root', help='session, day or archive directory')
+        parser.add_argument('-o', '--out', default=None, help='output directory (default: <day>/hdr)')
+        parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes')
+        parser.add_argument('-s', '--scale', type=float, default=SCALE, help='size of the previews')
+        parser.add_argument('-q', '--quality', type=int, default=90, help='jpg quality')
+        parser.add_argument('--force', action='store_true', help='fuse brackets already fused')
+        parser.add_argument('-w', '--weights', type=float, nargs=3, default=[1.0, 1.0, 1.0],
+                            metavar=('WC', 'WS', 'WE'), help='contrast, saturation, well-exposedness exponents')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        fuse_all(args.root, args.out, args.jobs, args.scale, args.quality, args.force, args.weights)
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+import os
+import re
+import sys
+import time
+import argparse
+from glob import glob
+from multiprocessing import Pool, cpu_count
+import numpy as np
+from calibration import get_store
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'helpers'))
+from camstats import read_exposures
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : hdrmerge.py
+######################################################################
+# Merges the bracketed raw frames of one capture (picam.py: data0.data,
+# data-2.data, data-4.data, raw_2.py: data0_.data, ...) into a linear
+# radiance map [DN / s] (float32, raw mosaic, radiance.npy).
+#
+# Per pixel:  E = sum(w(v_i) * (v_i - dark_i) / t_i) / sum(w(v_i))
+# with t_i the exposure of frame i from camstats and w a hat shaped
+# weight over the raw value, 0 at black level and near saturation.
+# Pixels saturated in every frame take the value of the shortest exposure.
+#
+# The frames are memory-mapped and merged in bands of TILE_ROWS rows
+# into a memory-mapped output, peak memory is a few float32 bands
+# instead of several full frames in float64.
+#
+# Master darks (and the defect pixel map) come from the calibration
+# store if available, else a constant black level is subtracted.
+#
+# Use: python hdrmerge.py /path/to/picam_data -j 4
+#      or hdrmerge.merge_session(session_dir) right after a capture
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : exposures from the structured capture records (helpers/camstats.py)
+#
+######################################################################
+
+global RAW_SHAPE
+global RADIOMETRICALIB
+
+RAW_SHAPE = (2464, 3296)
+RADIOMETRICALIB = os.path.join('/home', 'pi', 'python_scripts', 'picam', 'radiometric')
+OUTPUT_NAME = 'radiance.npy'
+TILE_ROWS = 256         # rows per band, even to keep the bayer pattern
+BLACK_LEVEL = 64        # [DN] 10 bit black level of the v2 camera
+SATURATION = 1023
+SATURATION_MARGIN = 0.92    # values above this fraction of saturation get weight 0
+
+# data0.data, data-2.data (picam.py) and data0_.data (raw_2.py)
+DATA_NAME = re.compile(r'^data(-?\d+)_?\.data$')
+
+
+def weight_lut(black=BLACK_LEVEL, saturation=SATURATION, margin=SATURATION_MARGIN):
+    '''
+    Hat weight per raw value: 0 at black, 1 in the middle, 0 from
+    margin * saturation on.
+    :return: float32 array with saturation + 1 entries
+    '''
+    v = np.arange(saturation + 1, dtype=np.float32)
+    high = margin * saturation
+    mid = 0.5 * (black + high)
+    w = np.where(v < mid, (v - black) / (mid - black), (high - v) / (high - mid))
+    return np.clip(w, 0, 1).astype(np.float32)
+
+
+def bracket_files(session_dir):
+    '''
+    Raw files of a capture.
+    :return: dict key (F stop or run number) -> file path
+    '''
+    files = {}
+    for path in glob(os.path.join(session_dir, 'data*.data')):
+        match = DATA_NAME.match(os.path.basename(path))
+        if match is not None:
+            files[int(match.group(1))] = path
+    return files
+
+
+def merge_frames(files, exposures, out, darks=None, black=BLACK_LEVEL, tile_rows=TILE_ROWS):
+    '''
+    Merges raw frames band by band.
+    :param files: list of raw *.data paths
+    :param exposures: exposure per file [us]
+    :param out: float32 array (RAW_SHAPE) receiving the radiance [DN / s], e.g. a memmap
+    :param darks: master dark per file (RAW_SHAPE, any dtype) or None for `black`
+    :return: out
+    '''
+    lut = weight_lut(black)
+    frames = [np.memmap(f, dtype=np.uint16, mode='r', shape=RAW_SHAPE) for f in files]
+    seconds = [e / 1e6 for e in exposures]
+    shortest = int(np.argmin(seconds))
+
+    for row in range(0, RAW_SHAPE[0], tile_rows):
+        band = slice(row, row + tile_rows)
+        num = np.zeros((min(tile_rows, RAW_SHAPE[0] - row), RAW_SHAPE[1]), dtype=np.float32)
+        den = np.zeros_like(num)
+        fallback = None
+
+        for i, frame in enumerate(frames):
+            raw = np.asarray(frame[band])
+            w = np.take(lut, np.minimum(raw, SATURATION))
+            value = raw.astype(np.float32)
+            if darks is not None:
+                value -= darks[i][band]
+            else:
+                value -= black
+            np.maximum(value, 0, out=value)
+            value *= 1.0 / seconds[i]
+            if i == shortest:
+                fallback = value.copy()
+            value *= w
+            num += value
+            den += w
+
+        saturated = den == 0
+        np.maximum(den, 1e-6, out=den)
+        num /= den
+        num[saturated] = fallback[saturated]
+        out[band] = num
+
+    return out
+
+
+def merge_session(session_dir, exposures=None, store=None, out_name=OUTPUT_NAME, iso=100, temperature=None):
+    '''
+    Merges the bracket of one session directory to <session_dir>/radiance.npy.
+    :param exposures: dict key (F stop / run number) -> exposure [us], default from camstats
+    :param store: calibration.Calibration_store for darks and defects, default RADIOMETRICALIB if it exists
+    :return: path of the radiance map, None if nothing to merge
+    '''
+    files = bracket_files(session_dir)
+    if exposures is None:
+        exposures = read_exposures(session_dir)
+    keys = sorted(k for k in files if k in exposures)
+    if not keys:
+        if not files:
+            return None
+        # no camstats: relative exposures from the F stops of the file names
+        keys = sorted(files)
+        exposures = dict((k, 1e6 * 2.0 ** k) for k in keys)
+        print('No exposures in camstats of {}, using relative F stops.'.format(session_dir))
+
+    if store is None and os.path.isdir(RADIOMETRICALIB):
+        store = get_store(RADIOMETRICALIB)
+
+    darks = None
+    if store is not None:
+        try:
+            darks = [store.dark(exposures[k], iso, temperature) for k in keys]
+        except KeyError as e:
+            print('No master darks, using black level {}: {}'.format(BLACK_LEVEL, e))
+
+    out_path = os.path.join(session_dir, out_name)
+    tmp_path = out_path + '.part.npy'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=RAW_SHAPE)
+    merge_frames([files[k] for k in keys], [exposures[k] for k in keys], out, darks)
+    if store is not None:
+        store.correct_defects(out)
+    out.flush()
+    del out
+    os.rename(tmp_path, out_path)
+
+    return out_path
+
+
+def merge_one(job):
+    '''
+    Worker: merges one session. Runs in a pool process.
+    :return: tuple (session_dir, error or None)
+    '''
+    session_dir, calib = job
+    try:
+        store = get_store(calib) if calib and os.path.isdir(calib) else None
+        merge_session(session_dir, store=store)
+        return session_dir, None
+    except Exception as e:
+        return session_dir, str(e)
+
+
+def find_sessions(root, force=False):
+    '''
+    Session directories below root with raw frames and without an up to
+    date radiance map.
+    '''
+    sessions = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        raw = [f for f in filenames if DATA_NAME.match(f)]
+        if len(raw) < 2:
+            continue
+        out = os.path.join(dirpath, OUTPUT_NAME)
+        newest = max(os.path.getmtime(os.path.join(dirpath, f)) for f in raw)
+        if force or not os.path.isfile(out) or os.path.getmtime(out) < newest:
+            sessions.append(dirpath)
+    return sessions
+
+
+def merge_archive(root, workers=None, calib=RADIOMETRICALIB, force=False):
+    '''
+    Merges every session below root that has no radiance map yet.
+    :return: tuple (merged, failed)
+    '''
+    sessions = find_sessions(root, force)
+    workers = workers or cpu_count()
+    print('Merging {} sessions with {} processes.'.format(len(sessions), workers))
+
+    merged = 0
+    failed = 0
+    t_start = time.time()
+    pool = Pool(workers)
+    try:
+        for session_dir, error in pool.imap_unordered(merge_one, [(s, calib) for s in sessions]):
+            if error is not None:
+                failed += 1
+                print('Could not merge {}: {}'.format(session_dir, error))
+            else:
+                merged += 1
+    finally:
+        pool.terminate()
+        pool.join()
+
+    print('Done: {} merged, {} failed in {:.1f} s'.format(merged, failed, time.time() - t_start))
+    return merged, failed
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Merge bracketed raw frames to radiance maps.')
+        parser.add_argument('root', help='session, day or archive directory')
+        parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes')
+        parser.add_argument('-c', '--calib', default=RADIOMETRICALIB, help='calibration directory')
+        parser.add_argument('--force', action='store_true', help='merge sessions already merged')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        merge_archive(args.root, args.jobs, args.calib, args.force)
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
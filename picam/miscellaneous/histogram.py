@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+import os
+from glob import glob
+import numpy as np
+import cv2
+from stacking import frame_histogram
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : histogram.py
+######################################################################
+# Histograms of raw frames and images for radiometric.py and analyze.py.
+#
+# - raw *.data : one histogram per bayer colour (red, green of both
+#                green sites, blue) over the native 10 bit range
+# - images     : one histogram per channel over 8 / 16 bit
+#
+# Histograms are exact integer counts from np.bincount, optionally only
+# inside the circular sky mask (cached per image size). Histograms of
+# files are cached per file (path, mtime, size), a whole session is a
+# few kB. Histogram_plot draws the axes once and afterwards only
+# replaces the bar heights.
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : Histogram_plot with fixed scale for blitting
+#
+######################################################################
+
+global RAW_SHAPE
+global RAW_BITS
+
+RAW_SHAPE = (2464, 3296)
+RAW_BITS = 10
+
+# bayer site (row, col) of each colour as in radiometric.demosaic1
+BAYER_SITES = ((0, (1, 0)), (1, (0, 0)), (1, (1, 1)), (2, (0, 1)))
+COLORS = ('red', 'green', 'blue')
+
+MASKS = {}          # (shape, centre, radius) -> boolean sky mask
+HISTOGRAMS = {}     # (path, mtime, size, sky) -> histograms
+
+
+def sky_mask(shape, centre=None, radius=None):
+    '''
+    Circular sky mask (True inside), cached per shape, centre and radius.
+    :param shape: (rows, cols) of the image
+    :param centre: (row, col), default: image centre
+    :param radius: [pixel], default: half the shorter side
+    :return: read only boolean array
+    '''
+    shape = tuple(shape[:2])
+    if centre is None:
+        centre = (shape[0] // 2, shape[1] // 2)
+    if radius is None:
+        radius = min(shape) // 2
+    key = (shape, tuple(centre), radius)
+
+    if key not in MASKS:
+        y, x = np.ogrid[-centre[0]:shape[0] - centre[0], -centre[1]:shape[1] - centre[1]]
+        mask = x * x + y * y <= radius * radius
+        mask.flags.writeable = False
+        MASKS[key] = mask
+
+    return MASKS[key]
+
+
+def channel_histogram(plane, nbins, mask=None):
+    '''
+    Histogram of one unsigned integer plane, values >= nbins are counted
+    in the last bin.
+    :param mask: boolean array of the plane shape, only True pixels count
+    :return: int64 array with nbins entries
+    '''
+    if mask is None:
+        hist = frame_histogram(plane)
+    else:
+        hist = np.bincount(plane[mask], minlength=nbins)
+
+    if hist.size > nbins:
+        hist[nbins - 1] += hist[nbins:].sum()
+
+    return hist[:nbins]
+
+
+def bayer_histograms(mosaic, mask=None, bits=RAW_BITS):
+    '''
+    Histograms of the red, green and blue sites of a raw mosaic.
+    :param mosaic: raw frame, uint16 (2464 x 3296 or flat)
+    :param mask: boolean array of the mosaic shape, e.g. sky_mask(RAW_SHAPE)
+    :param bits: bit depth of the raw values
+    :return: int64 array (3, 2**bits), rows red, green, blue
+    '''
+    if mosaic.ndim == 1:
+        mosaic = mosaic.reshape(RAW_SHAPE)
+    nbins = 1 << bits
+
+    hists = np.zeros((3, nbins), dtype=np.int64)
+    for channel, (y, x) in BAYER_SITES:
+        site_mask = None if mask is None else mask[y::2, x::2]
+        hists[channel] += channel_histogram(mosaic[y::2, x::2], nbins, site_mask)
+
+    return hists
+
+
+def image_histograms(image, mask=None):
+    '''
+    Histograms of every channel of an 8 or 16 bit image.
+    :param image: uint8 / uint16 array (h x w x c), channel order is kept
+    :param mask: boolean array (h x w)
+    :return: int64 array (c, 2**bits)
+    '''
+    nbins = 1 << (8 * image.dtype.itemsize)
+    return np.array([channel_histogram(image[..., c], nbins, mask) for c in range(image.shape[2])])
+
+
+def file_histograms(path, sky=None):
+    '''
+    Histograms of a raw *.data file (bayer, see bayer_histograms) or of an
+    image file (red, green, blue), cached per file.
+    :param sky: None for the whole frame, or (centre, radius) of the sky
+           mask in pixels of the file, or True for the default mask
+    '''
+    st = os.stat(path)
+    key = (path, int(st.st_mtime), st.st_size, sky if sky is not True else 'default')
+
+    if key not in HISTOGRAMS:
+        if path.endswith('.data'):
+            frame = np.fromfile(path, dtype=np.uint16).reshape(RAW_SHAPE)
+        else:
+            frame = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if frame.ndim == 2:
+                frame = frame[..., None]
+            else:
+                frame = frame[..., 2::-1]       # BGR -> RGB
+
+        mask = None
+        if sky is True:
+            mask = sky_mask(frame.shape)
+        elif sky is not None:
+            mask = sky_mask(frame.shape, sky[0], sky[1])
+
+        if path.endswith('.data'):
+            HISTOGRAMS[key] = bayer_histograms(frame, mask)
+        else:
+            HISTOGRAMS[key] = image_histograms(frame, mask)
+
+    return HISTOGRAMS[key]
+
+
+def session_histograms(session_dir, pattern='*.data', sky=None):
+    '''
+    Histograms of all files of a session directory matching pattern.
+    :return: dict file name -> histograms
+    '''
+    hists = {}
+    for path in sorted(glob(os.path.join(session_dir, pattern))):
+        try:
+            hists[os.path.basename(path)] = file_histograms(path, sky)
+        except Exception as e:
+            print('Error in session_histograms: {}: {}'.format(path, e))
+
+    return hists
+
+
+class Histogram_plot:
+    """
+    Histogram axes whose bars are created once. Showing the histograms of
+    the next frame only replaces the bar heights.
+
+    EXAMPLE:
+      plot = Histogram_plot(ax, 1024, xlim=[0, 100])
+      for path in files:
+          plot.update(file_histograms(path))
+          plt.pause(0.1)
+    """
+    def __init__(self, ax, nbins, colors=COLORS, first=0, last=None, xlim=None, normalize=False, animated=False):
+        '''
+        :param ax: matplotlib axes
+        :param nbins: number of bins of the histograms
+        :param first, last: range of bins shown, e.g. 1, 255 hides black and saturated pixels
+        :param xlim: x range of the axes, default: all shown bins
+        :param normalize: scale the shown bins to a maximum of 1, the y axis stays fixed
+        :param animated: lines are drawn by the caller (blitting)
+        '''
+        self.ax = ax
+        self.first = first
+        self.last = nbins if last is None else last
+        self.normalize = normalize
+        bins = np.arange(self.first, self.last)
+        self.lines = [ax.plot(bins, np.zeros(bins.size), color=color, drawstyle='steps-mid', animated=animated)[0]
+                      for color in colors]
+        ax.set_xlim(xlim if xlim is not None else [self.first, self.last])
+        if normalize:
+            ax.set_ylim(0, 1.05)
+
+    def update(self, hists):
+        '''
+        :param hists: array (channels, nbins) as returned by *_histograms
+        '''
+        top = 1
+        for hist in hists:
+            top = max(top, hist[self.first:self.last].max())
+        for line, hist in zip(self.lines, hists):
+            shown = hist[self.first:self.last]
+            line.set_ydata(shown / float(top) if self.normalize else shown)
+        if not self.normalize:
+            self.ax.set_ylim(0, top * 1.05)
+
+        return self.lines
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+from thumbnails import Images, SCALE
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'helpers'))
+from catalog import Catalog, CATALOG_PATH, CATALOG_NAME
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : keogram.py
+######################################################################
+# Whole day overview products, built frame by frame:
+#
+# - keogram : the meridian (vertical line through the sky centre) of
+#             every frame, one column per INTERVAL seconds of the day
+# - mosaic  : a small thumbnail of the first frame of every MOSAIC_EVERY
+#             seconds, in a grid
+#
+# Both are preallocated memory-mapped arrays in <out>/<day>/, a frame
+# only writes its column and its tile, so the day is built at capture
+# time (picam.py) or by a scan of a day folder without holding more than
+# one frame in memory. Interrupted days are continued. finish() writes
+# keogram.jpg and mosaic.jpg.
+#
+# Use: python keogram.py /path/to/picam_data --day 20181007 -o /path/to/products
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : day_sessions() also used by timelapse.py
+# 19.10.2026 : archive always scanned for new session folders
+# 19.10.2026 : keogram.jpg / mosaic.jpg of the previous day written when the day changes
+# 19.10.2026 : archive imported into the catalog only on the first run
+#
+######################################################################
+
+global PRODUCTS_DIR
+global INTERVAL
+
+PRODUCTS_DIR = os.path.join('/home', 'pi', 'python_scripts', 'picam', 'products')
+INTERVAL = 30           # [s] per keogram column
+MOSAIC_EVERY = 600      # [s] per mosaic tile
+KEOGRAM_HEIGHT = 486    # [pixel] meridian strip, 1944 / 4
+TILE = (160, 120)       # (width, height) of the mosaic tiles
+SESSION_NAME = re.compile(r'^(\d{8})_(\d{2})(\d{2})(\d{2})$')
+
+
+def seconds_of_day(session_name):
+    '''
+    Capture time of a session name (YYYYMMDD_HHMMSS) in seconds after midnight.
+    '''
+    match = SESSION_NAME.match(os.path.basename(os.path.normpath(session_name)))
+    if match is None:
+        raise ValueError('Not a session name: {}'.format(session_name))
+    day, h, m, s = match.groups()
+    return day, int(h) * 3600 + int(m) * 60 + int(s)
+
+
+class Day_summary:
+    """
+    Keogram and thumbnail mosaic of one day in memory-mapped files.
+
+    EXAMPLE:
+      summary = Day_summary('/path/products', '20181007')
+      summary.add(img, seconds)          # BGR frame, capture time of day
+      summary.finish()
+    """
+    def __init__(self, out_dir, day, interval=INTERVAL, mosaic_every=MOSAIC_EVERY, height=KEOGRAM_HEIGHT,
+                 tile=TILE, start=0, end=86400, sky=None):
+        '''
+        :param start, end: [s] time of day covered
+        :param sky: None, or (centre, radius) of the sky circle as fraction of the
+               image (y, x), radius of the height: meridian only inside the circle
+        '''
+        self.dir = os.path.join(out_dir, day)
+        self.day = day
+        self.interval = interval
+        self.mosaic_every = mosaic_every
+        self.tile = tile
+        self.start = start
+        self.end = end
+        self.sky = sky
+        columns = int(np.ceil((end - start) / float(interval)))
+        tiles = int(np.ceil((end - start) / float(mosaic_every)))
+        self.grid = int(np.ceil(np.sqrt(tiles * tile[1] / float(tile[0]))))     # about square mosaic
+        rows = int(np.ceil(tiles / float(self.grid)))
+
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+        self.keogram = self.open('keogram.npy', (height, columns, 3), np.uint8)
+        self.mosaic = self.open('mosaic.npy', (rows * tile[1], self.grid * tile[0], 3), np.uint8)
+        self.filled = self.open('filled.npy', (columns + tiles,), np.bool_)
+
+    def open(self, name, shape, dtype):
+        path = os.path.join(self.dir, name)
+        if os.path.isfile(path):
+            array = np.load(path, mmap_mode='r+')
+            if array.shape == tuple(shape):
+                return array
+            print('Day_summary: {} has another layout, starting again'.format(path))
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+    def meridian(self, img):
+        '''
+        Vertical line through the sky centre, scaled to the keogram height.
+        '''
+        h, w = img.shape[:2]
+        if self.sky is None:
+            top, bottom, x = 0, h, w // 2
+        else:
+            (cy, cx), r = self.sky
+            x = int(cx * w)
+            top, bottom = max(0, int((cy - r) * h)), min(h, int((cy + r) * h))
+        strip = img[top:bottom, x:x + 1]
+        return cv2.resize(strip, (1, self.keogram.shape[0]), interpolation=cv2.INTER_AREA)[:, 0]
+
+    def add(self, img, seconds):
+        '''
+        Adds a frame.
+        :param img: BGR uint8
+        :param seconds: capture time, seconds after midnight
+        :return: False if outside of the covered time
+        '''
+        if not self.start <= seconds < self.end:
+            return False
+
+        column = int((seconds - self.start) // self.interval)
+        self.keogram[:, column] = self.meridian(img)
+        self.filled[column] = True
+
+        index = int((seconds - self.start) // self.mosaic_every)
+        if not self.filled[self.keogram.shape[1] + index]:
+            row, col = divmod(index, self.grid)
+            w, h = self.tile
+            self.mosaic[row * h:(row + 1) * h, col * w:(col + 1) * w] = cv2.resize(img, (w, h),
+                                                                                  interpolation=cv2.INTER_AREA)
+            self.filled[self.keogram.shape[1] + index] = True
+        return True
+
+    def add_session(self, session_dir, name='raw_img0.jpg', scale=SCALE):
+        '''
+        Adds the jpg of a session folder, decoded at reduced size.
+        '''
+        day, seconds = seconds_of_day(session_dir)
+        img = Images([os.path.join(session_dir, name)], cache_dir=False, scale=scale, rgb=False)[0]
+        return self.add(img, seconds)
+
+    def finish(self, quality=92, crop=True):
+        '''
+        Writes keogram.jpg and mosaic.jpg.
+        :param crop: only from the first to the last filled column / mosaic row
+        :return: tuple of the written paths
+        '''
+        self.keogram.flush()
+        self.mosaic.flush()
+        self.filled.flush()
+
+        keogram, mosaic = self.keogram, self.mosaic
+        columns = np.flatnonzero(self.filled[:self.keogram.shape[1]])
+        tiles = np.flatnonzero(self.filled[self.keogram.shape[1]:])
+        if crop and columns.size:
+            keogram = keogram[:, columns[0]:columns[-1] + 1]
+            h = self.tile[1]
+            mosaic = mosaic[tiles[0] // self.grid * h:(tiles[-1] // self.grid + 1) * h]
+
+        written = []
+        for name, img in (('keogram.jpg', keogram), ('mosaic.jpg', mosaic)):
+            path = os.path.join(self.dir, name)
+            if not cv2.imwrite(path + '.part.jpg', np.ascontiguousarray(img), [cv2.IMWRITE_JPEG_QUALITY, quality]):
+                raise IOError('cv2.imwrite failed for {}'.format(path))
+            os.rename(path + '.part.jpg', path)
+            written.append(path)
+        return tuple(written)
+
+
+SUMMARIES = {}
+
+
+def add_session(session_dir, out_dir=PRODUCTS_DIR, **kwargs):
+    '''
+    Adds a session to the summary of its day, used by picam.py after every
+    bracket. The day summary stays open between calls, when the day changes
+    the images of the previous day are written.
+    '''
+    day, seconds = seconds_of_day(session_dir)
+    key = (out_dir, day)
+    if key not in SUMMARIES:
+        try:
+            finish_day()        # only the current day is kept open
+        except Exception as e:
+            print('Error in keogram: ' + str(e))
+        SUMMARIES.clear()
+        SUMMARIES[key] = Day_summary(out_dir, day, **kwargs)
+    return SUMMARIES[key].add_session(session_dir)
+
+
+def finish_day():
+    '''
+    Writes the images of the open day summary (picam.py, end of the time lapse).
+    '''
+    written = ()
+    for summary in SUMMARIES.values():
+        written += summary.finish()
+    SUMMARIES.clear()
+    return written
+
+
+def day_sessions(root, day=None):
+    '''
+    Session directories of a day below root from the session catalog, the
+    camera's catalog or one next to a copied archive. A root without any
+    session in the catalog is imported first (catalog.scan_once).
+    '''
+    catalog = Catalog(CATALOG_PATH if os.path.isfile(CATALOG_PATH) else os.path.join(root, CATALOG_NAME))
+    try:
+        catalog.scan_once(root)    # archive from before the catalog
+        sessions = catalog.sessions(root=root, day=day)
+    finally:
+        catalog.close()
+    return sessions
+
+
+def build_day(root, day, out_dir=PRODUCTS_DIR, name='raw_img0.jpg', scale=SCALE, **kwargs):
+    '''
+    Keogram and mosaic of all sessions of a day below root.
+    :return: tuple of the written paths
+    '''
+    sessions = day_sessions(root, day)
+    summary = Day_summary(out_dir, day, **kwargs)
+    paths = [os.path.join(s, name) for s in sessions if os.path.isfile(os.path.join(s, name))]
+    images = Images(paths, cache_dir=False, scale=scale, rgb=False)
+
+    t_start = time.time()
+    added = 0
+    for index, img, result in images.prefetch():
+        if summary.add(img, seconds_of_day(os.path.dirname(paths[index]))[1]):
+            added += 1
+    print('Day {}: {} of {} frames added in {:.1f} s'.format(day, added, len(paths), time.time() - t_start))
+
+    return summary.finish()
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Keogram and thumbnail mosaic of a day.')
+        parser.add_argument('root', help='data directory with the session folders')
+        parser.add_argument('--day', required=True, help='YYYYMMDD')
+        parser.add_argument('-o', '--out', default=PRODUCTS_DIR, help='products directory')
+        parser.add_argument('-n', '--name', default='raw_img0.jpg', help='image of each session')
+        parser.add_argument('--interval', type=int, default=INTERVAL, help='seconds per keogram column')
+        parser.add_argument('--hours', nargs=2, type=float, default=[0, 24], help='time of day covered')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        for path in build_day(args.root, args.day, args.out, args.name, interval=args.interval,
+                              start=int(args.hours[0] * 3600), end=int(args.hours[1] * 3600)):
+            print(path)
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+import hashlib
+import time
+import sqlite3
+import argparse
+import numpy as np
+from scanner import scan, find_images
+from thumbnails import THUMB_DIR, SCALE
+from hdrmerge import read_exposures
+from fusion import HDR_DIR
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : metrics.py
+######################################################################
+# Metrics index of an archive: one SQLite file (metrics.db) in the
+# archive root with one row per image:
+#   brightness, mean / median / std, dark and clipped fraction per
+#   channel, a histogram digest and the capture metadata (session,
+#   capture time, exposure from camstats).
+#
+# Every decode scale / sky mask has its own table (images_<hash>), so
+# tools with different settings share the file without invalidating
+# each other. Rows are keyed by path (relative to the root), mtime and size. An
+# update only meters images that are new or changed since the last run
+# (scanner.py, thread pool), a repeated analysis of a month is a query.
+#
+# The histograms are stored as raw counts, 256 bins per channel, uint32.
+#
+# Use: python metrics.py /path/to/archive -n raw_img0.jpg -j 4
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : one table per scale / sky mask instead of rebuilding on every change
+# 19.10.2026 : histograms stored as raw counts (relative channel heights kept)
+# 19.10.2026 : version 4, brightness of masked images metered again
+# 19.10.2026 : tables of former index versions dropped
+#
+######################################################################
+
+global INDEX_NAME
+INDEX_NAME = 'metrics.db'
+INDEX_VERSION = 4
+COMMIT_EVERY = 200      # rows per transaction
+
+SESSION_NAME = re.compile(r'^(\d{8})_(\d{6})$')
+JPG_KEY = re.compile(r'^raw_img(-?\d+)\.jpg$')
+CHANNELS = ('r', 'g', 'b')
+STATS = ('mean', 'median', 'std', 'dark', 'clipped')
+COLUMNS = ['brightness', 'linear'] + ['{}_{}'.format(s, c) for s in STATS for c in CHANNELS]
+
+
+def histogram_digest(hists):
+    '''
+    Histograms (3, 256) as uint32 bytes, the raw counts: channels and bins
+    keep their relative heights.
+    '''
+    return np.asarray(hists).astype('<u4').tobytes()
+
+
+def digest_histograms(blob):
+    '''
+    Inverse of histogram_digest: float32 array (3, 256).
+    '''
+    return np.frombuffer(blob, dtype='<u4').reshape(3, -1).astype(np.float32)
+
+
+def capture_info(path):
+    '''
+    Session, capture time and exposure of an image of the archive:
+    <session>/raw_img0.jpg or <day>/hdr/<session>.jpg (fused previews).
+    :return: tuple (session name, 'YYYY-MM-DDTHH:MM:SS' or None, exposure [us] or None)
+    '''
+    folder, name = os.path.split(os.path.abspath(path))
+    if os.path.basename(folder) == HDR_DIR:
+        session_dir = os.path.join(os.path.dirname(folder), os.path.splitext(name)[0])
+    else:
+        session_dir = folder
+    session = os.path.basename(session_dir)
+
+    taken = None
+    match = SESSION_NAME.match(session)
+    if match is not None:
+        d, t = match.groups()
+        taken = '{}-{}-{}T{}:{}:{}'.format(d[0:4], d[4:6], d[6:8], t[0:2], t[2:4], t[4:6])
+
+    exposure = None
+    key = JPG_KEY.match(name)
+    if key is not None and os.path.isdir(session_dir):
+        exposure = read_exposures(session_dir).get(int(key.group(1)))
+
+    return session, taken, exposure
+
+
+class Metrics_index:
+    """
+    Per image metrics of an archive, updated incrementally.
+
+    EXAMPLE:
+      index = Metrics_index('/path/to/archive')
+      index.update(name='raw_img0.jpg')
+      data = index.table(['taken', 'brightness'], session_like='20181007%')
+    """
+    def __init__(self, root, path=None, scale=SCALE, sky=None):
+        '''
+        :param path: index file, default <root>/metrics.db
+        :param scale, sky: decode size and sky mask (see scanner.meter), every
+               combination has its own table in the index
+        '''
+        self.root = os.path.abspath(root)
+        self.path = path or os.path.join(self.root, INDEX_NAME)
+        self.scale = scale
+        self.sky = sky
+        self.con = sqlite3.connect(self.path)
+        self.create_tables()
+
+    def create_tables(self):
+        # one table per decode scale and sky mask: indexes of other settings stay valid
+        settings = json.dumps(dict(version=INDEX_VERSION, scale=self.scale, sky=self.sky), sort_keys=True)
+        self.images = 'images_' + hashlib.sha1(settings.encode('utf-8')).hexdigest()[:12]
+
+        self.con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.con.execute("""CREATE TABLE IF NOT EXISTS {}
+             (
+                path TEXT PRIMARY KEY,
+                mtime INTEGER,
+                size INTEGER,
+                session TEXT,
+                taken TEXT,
+                exposure INTEGER,
+                {},
+                hist BLOB
+             )""".format(self.images, ',\n                '.join('{} REAL'.format(c) for c in COLUMNS)))
+        self.con.execute("CREATE INDEX IF NOT EXISTS {0}_taken ON {0} (taken)".format(self.images))
+        self.con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (self.images, settings))
+
+        # tables of former index versions are never read again
+        for name, value in self.con.execute("SELECT key, value FROM meta WHERE key LIKE 'images%'").fetchall():
+            if json.loads(value).get('version', 0) < INDEX_VERSION:
+                self.con.execute("DROP TABLE IF EXISTS {}".format(name))
+                self.con.execute("DELETE FROM meta WHERE key = ?", (name,))
+
+        # single table of version 1, rebuilt on every change of the settings
+        self.con.execute("DROP TABLE IF EXISTS images")
+        self.con.execute("DELETE FROM meta WHERE key = 'settings'")
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+    def relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def stale(self, paths):
+        '''
+        Images of `paths` without an up to date row.
+        '''
+        known = dict((p, (m, s)) for p, m, s in self.con.execute("SELECT path, mtime, size FROM {}".format(self.images)))
+        result = []
+        for path in paths:
+            st = os.stat(path)
+            if known.get(self.relative(path)) != (int(st.st_mtime), st.st_size):
+                result.append(path)
+        return result
+
+    def update(self, paths=None, name='*.jpg', workers=None, response=None, prune=False, cache_dir=None):
+        '''
+        Meters new and changed images.
+        :param paths: image files, default all images below root matching `name`
+        :param response: response.Response for the linear brightness, optional
+        :param prune: remove rows of files that no longer exist
+        :param cache_dir: thumbnail folder, default <root>/thumbs
+        :return: number of images metered
+        '''
+        if paths is None:
+            paths = find_images(self.root, name)
+        todo = self.stale(paths)
+
+        cache_dir = cache_dir or os.path.join(self.root, THUMB_DIR)
+        columns = ['path', 'mtime', 'size', 'session', 'taken', 'exposure'] + COLUMNS + ['hist']
+        insert = "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(self.images, ', '.join(columns),
+                                                                        ', '.join('?' * len(columns)))
+        rows = []
+        done = 0
+        for result in scan(todo, workers, cache_dir, self.scale, self.sky, response):
+            if result is None:
+                continue
+            st = os.stat(result['path'])
+            row = [self.relative(result['path']), int(st.st_mtime), st.st_size]
+            row += list(capture_info(result['path']))
+            row += [result['brightness'], result.get('linear')]
+            row += [result[s][i] for s in STATS for i in range(len(CHANNELS))]
+            row.append(sqlite3.Binary(histogram_digest(result['hist'])))
+            rows.append(row)
+            if len(rows) >= COMMIT_EVERY:
+                done += self.insert(insert, rows)
+                rows = []
+        done += self.insert(insert, rows)
+
+        if prune:
+            existing = set(self.relative(p) for p in paths)
+            gone = [(p,) for (p,) in self.con.execute("SELECT path FROM {}".format(self.images)) if p not in existing]
+            self.con.executemany("DELETE FROM {} WHERE path = ?".format(self.images), gone)
+            self.con.commit()
+
+        return done
+
+    def insert(self, statement, rows):
+        if rows:
+            self.con.executemany(statement, rows)
+            self.con.commit()
+        return len(rows)
+
+    def table(self, columns=('path', 'taken', 'brightness'), session_like=None, paths=None):
+        '''
+        Columns of the index as numpy arrays, ordered by path.
+        :param session_like: SQL LIKE pattern of the session, e.g. '201810%'
+        :param paths: image files, the result has the same order, missing images give nan / None
+        :return: dict column -> array
+        '''
+        query = "SELECT path, {} FROM {}".format(', '.join(c for c in columns if c != 'path'), self.images)
+        args = []
+        if session_like is not None:
+            query += " WHERE session LIKE ?"
+            args.append(session_like)
+        rows = self.con.execute(query + " ORDER BY path", args).fetchall()
+
+        if paths is not None:
+            found = dict((row[0], row) for row in rows)
+            empty = (None,) * (len(columns) + 1)
+            rows = [found.get(self.relative(p), empty) for p in paths]
+
+        result = {}
+        values = list(zip(*rows)) if rows else [()] * (len(columns) + 1)
+        names = ['path'] + [c for c in columns if c != 'path']
+        for name, column in zip(names, values):
+            if name in COLUMNS or name == 'exposure':
+                result[name] = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+            else:
+                result[name] = np.array(column, dtype=object)
+        return result
+
+    def histograms(self, paths):
+        '''
+        Histogram digests of images, float32 array (n, 3, 256) in the order
+        of paths, zeros for images not in the index.
+        '''
+        query = "SELECT path, hist FROM {} WHERE path = ?".format(self.images)
+        result = np.zeros((len(paths), 3, 256), dtype=np.float32)
+        for i, path in enumerate(paths):
+            row = self.con.execute(query, (self.relative(path),)).fetchone()
+            if row is not None:
+                result[i] = digest_histograms(row[1])
+        return result
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Update the metrics index of an archive.')
+        parser.add_argument('root', help='day or archive directory')
+        parser.add_argument('-n', '--name', default='*.jpg', help='file name pattern, e.g. raw_img0.jpg')
+        parser.add_argument('-j', '--jobs', type=int, default=None, help='number of threads')
+        parser.add_argument('--prune', action='store_true', help='remove rows of deleted files')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        t_start = time.time()
+        index = Metrics_index(args.root)
+        try:
+            done = index.update(name=args.name, workers=args.jobs, prune=args.prune)
+            total = index.con.execute("SELECT COUNT(*) FROM {}".format(index.images)).fetchone()[0]
+        finally:
+            index.close()
+
+        print('{} images metered, {} in the index, {:.1f} s'.format(done, total, time.time() - t_start))
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import cv2
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : projection.py
+######################################################################
+# Reprojection of the fisheye sky circle for the cloud analysis:
+#
+# - grid     : rows zenith angle, columns azimuth (north, clockwise),
+#              both in steps of `step` degrees
+# - equirect : width x height map, azimuth -180..180 deg (north in the
+#              middle), elevation 90 deg (top) down to the horizon
+#
+# The lens is described by a versioned lens.json: sky circle centre
+# and radius in pixels of a reference image shape, projection model
+# (equidistant, equisolid, stereographic, orthographic), field of view,
+# azimuth of the image top and whether the image is mirrored. It is
+# scaled to the resolution of the projected frames.
+#
+# The pixel to angle geometry is computed only once per lens, frame
+# shape and target: the cv2.remap tables are converted to int16 fixed
+# point (cv2.convertMaps, 1/32 pixel) and kept in memory and in a .npz
+# file in CACHE_DIR, keyed by a hash of all parameters. Projecting a
+# frame is a single cv2.remap call.
+#
+# Use: python projection.py raw_img0.jpg -t equirect --size 1440 360 -o sky.jpg
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+#
+######################################################################
+
+global LENS_FILE
+global CACHE_DIR
+
+LENS_FILE = os.path.join('/home', 'pi', 'python_scripts', 'picam', 'radiometric', 'lens.json')
+CACHE_DIR = os.path.join('/home', 'pi', 'python_scripts', 'picam', 'radiometric', 'projection')
+LENS_VERSION = 1
+
+# default lens: jpg of the sky camera, 180 deg equidistant fisheye
+LENS = dict(
+    version=LENS_VERSION,
+    shape=[1944, 2592],
+    centre=[972.0, 1296.0],
+    radius=960.0,
+    model='equidistant',
+    fov=180.0,
+    north=0.0,
+    mirror=True,
+)
+
+# normalized image radius (0..1 at fov / 2) of a zenith angle theta, both in radians
+MODELS = {
+    'equidistant': lambda theta, half: theta / half,
+    'equisolid': lambda theta, half: np.sin(theta / 2) / np.sin(half / 2),
+    'stereographic': lambda theta, half: np.tan(theta / 2) / np.tan(half / 2),
+    'orthographic': lambda theta, half: np.sin(theta) / np.sin(half),
+}
+
+PROJECTIONS = {}
+
+
+def load_lens(path=LENS_FILE):
+    '''
+    Lens calibration from a lens.json, the default LENS if there is none.
+    '''
+    lens = dict(LENS)
+    if path is None or not os.path.isfile(path):
+        return lens
+
+    with open(path, 'r') as f:
+        calib = json.load(f)
+    if calib.get('version', 0) > LENS_VERSION:
+        raise ValueError('lens calibration version {} not supported'.format(calib['version']))
+    if calib.get('model', lens['model']) not in MODELS:
+        raise ValueError('unknown lens model {}'.format(calib['model']))
+    lens.update(calib)
+    return lens
+
+
+def save_lens(lens, path=LENS_FILE):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(lens, f, indent=1)
+    os.rename(path + '.tmp', path)
+
+
+def target_angles(target='grid', step=0.5, size=(1440, 360), horizon=90.0):
+    '''
+    Zenith and azimuth [rad] of every output pixel.
+    :param target: 'grid' or 'equirect'
+    :param step: [deg] per pixel of the grid
+    :param size: (width, height) of the equirect map
+    :param horizon: [deg] largest zenith angle of the output
+    :return: zenith, azimuth as float64 arrays of the output shape
+    '''
+    if target == 'grid':
+        zenith = np.arange(0, horizon + step / 2.0, step)
+        azimuth = np.arange(0, 360, step)
+        azimuth, zenith = np.meshgrid(azimuth, zenith)
+    elif target == 'equirect':
+        width, height = size
+        azimuth = (np.arange(width) + 0.5) * (360.0 / width) - 180
+        zenith = (np.arange(height) + 0.5) * (horizon / height)
+        azimuth, zenith = np.meshgrid(azimuth, zenith)
+    else:
+        raise ValueError('unknown target {}'.format(target))
+    return np.radians(zenith), np.radians(azimuth)
+
+
+def remap_tables(lens, shape, target='grid', **params):
+    '''
+    Fisheye pixel coordinates of every output pixel, the float32 map_x /
+    map_y of cv2.remap. Directions outside the field of view are -1.
+    :param shape: (rows, cols) of the frames to project
+    '''
+    zenith, azimuth = target_angles(target, **params)
+
+    scale = shape[0] / float(lens['shape'][0])
+    cy, cx = [c * scale for c in lens['centre']]
+    half = np.radians(lens['fov']) / 2
+    r = MODELS[lens['model']](zenith, half) * (lens['radius'] * scale)
+
+    angle = azimuth - np.radians(lens['north'])
+    sign = -1 if lens['mirror'] else 1      # looking up, east is left of north
+    map_x = (cx + sign * r * np.sin(angle)).astype(np.float32)
+    map_y = (cy - r * np.cos(angle)).astype(np.float32)
+
+    outside = zenith > half
+    map_x[outside] = -1
+    map_y[outside] = -1
+    return map_x, map_y
+
+
+def projection_key(lens, shape, target, fixed, params):
+    text = json.dumps(dict(lens=lens, shape=list(shape[:2]), target=target, fixed=fixed, params=params),
+                      sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]
+
+
+class Sky_projection:
+    """
+    Precomputed remap tables of one lens, frame shape and target.
+
+    EXAMPLE:
+      projection = get_projection((1944, 2592), 'equirect', size=(1440, 360))
+      sky = projection.project(img)
+    """
+    def __init__(self, shape, target='grid', lens=None, cache_dir=CACHE_DIR, fixed=True, **params):
+        '''
+        :param shape: (rows, cols) of the frames
+        :param lens: lens calibration dict, default load_lens()
+        :param cache_dir: folder of the table files, None for memory only
+        :param fixed: int16 fixed point tables (CV_16SC2), else float32
+        :param params: step / size / horizon of target_angles
+        '''
+        self.lens = load_lens() if lens is None else lens
+        self.shape = tuple(shape[:2])
+        self.target = target
+        self.key = projection_key(self.lens, self.shape, target, fixed, params)
+        self.path = os.path.join(cache_dir, 'proj_{}.npz'.format(self.key)) if cache_dir else None
+
+        if self.path is not None and os.path.isfile(self.path):
+            with np.load(self.path) as tables:
+                self.map1, self.map2 = tables['map1'], tables['map2']
+            if self.map2.size == 0:
+                self.map2 = None
+            return
+
+        map_x, map_y = remap_tables(self.lens, self.shape, target, **params)
+        if fixed:
+            self.map1, self.map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        else:
+            self.map1, self.map2 = map_x, map_y
+
+        if self.path is not None:
+            try:
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                tmp = self.path + '.part.npz'
+                np.savez(tmp, map1=self.map1, map2=self.map2 if self.map2 is not None else np.zeros(0))
+                os.rename(tmp, self.path)
+            except (IOError, OSError) as e:
+                print('Error in Sky_projection: ' + str(e))
+
+    def project(self, img, interpolation=cv2.INTER_LINEAR, border=0):
+        '''
+        Reprojected frame, directions outside of the sky circle are `border`.
+        '''
+        if img.shape[:2] != self.shape:
+            raise ValueError('frame shape {} does not match the tables {}'.format(img.shape[:2], self.shape))
+        return cv2.remap(img, self.map1, self.map2, interpolation, borderMode=cv2.BORDER_CONSTANT,
+                         borderValue=border)
+
+
+def get_projection(shape, target='grid', lens_file=LENS_FILE, cache_dir=CACHE_DIR, fixed=True, **params):
+    '''
+    One cached Sky_projection per lens file, frame shape, target and parameters.
+    '''
+    lens = load_lens(lens_file)
+    key = projection_key(lens, tuple(shape[:2]), target, fixed, params)
+    if key not in PROJECTIONS:
+        PROJECTIONS[key] = Sky_projection(shape, target, lens, cache_dir, fixed, **params)
+    return PROJECTIONS[key]
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Project fisheye sky images to zenith / azimuth maps.')
+        parser.add_argument('images', nargs='+', help='jpgs, all of the same size')
+        parser.add_argument('-t', '--target', default='grid', choices=['grid', 'equirect'])
+        parser.add_argument('--step', type=float, default=0.5, help='grid: degrees per pixel')
+        parser.add_argument('--size', type=int, nargs=2, default=[1440, 360], metavar=('W', 'H'),
+                            help='equirect: output size')
+        parser.add_argument('--horizon', type=float, default=90.0, help='largest zenith angle [deg]')
+        parser.add_argument('-l', '--lens', default=LENS_FILE, help='lens calibration')
+        parser.add_argument('-c', '--cache', default=CACHE_DIR, help='folder of the remap tables')
+        parser.add_argument('--float', action='store_true', help='float32 instead of fixed point tables')
+        parser.add_argument('-o', '--out', default=None, help='output folder, default next to the images')
+        args = parser.parse_args()
+
+        if args.target == 'grid':
+            params = dict(step=args.step, horizon=args.horizon)
+        else:
+            params = dict(size=tuple(args.size), horizon=args.horizon)
+
+        t_start = time.time()
+        for path in args.images:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is None:
+                print('Error: could not read {}'.format(path))
+                continue
+            projection = get_projection(img.shape, args.target, args.lens, args.cache, not args.float, **params)
+            out_dir = args.out or os.path.dirname(os.path.abspath(path))
+            name = os.path.splitext(os.path.basename(path))[0] + '_' + args.target + '.jpg'
+            cv2.imwrite(os.path.join(out_dir, name), projection.project(img))
+        print('{} images projected in {:.1f} s'.format(len(args.images), time.time() - t_start))
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+
+import os
+import time
+import argparse
+from glob import glob
+import numpy as np
+from stacking import Prefetch_reader, RAW_SHAPE
+from calibration import get_store
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : ptc.py
+######################################################################
+# Photon transfer characterization of the camera:
+# gain [e-/DN], read noise and full well per bayer colour.
+#
+# Input are white (flat) frames at several exposures, e.g. the wf5 / wf50
+# stacks of radiometric.py, and optionally dark frames. Consecutive
+# frames of a stack form pairs. The difference of a pair has no fixed
+# pattern (flat field, hot pixels), its variance / 2 is the temporal
+# noise at the pair's mean signal.
+#
+# The pair statistics are either computed from single frames on disk or
+# collected while capturing (Pair_stats, radiometric.capture_stack writes
+# <master>_pairs.npz), which is the default as streaming calibration runs
+# keep no single frames.
+#
+# Every bayer site is cut into tiles (default 32 x 32 site pixels) and
+# mean and difference variance are reduced per tile, so only the two
+# frames of the current pair are in memory. Because of the vignetting
+# the tiles of one exposure cover a range of signal levels, which fills
+# the photon transfer curve between the exposures.
+#
+# Per colour the shot noise part of the curve is fitted as
+#     var [DN^2] = mean [DN] / gain + read_noise^2
+# full well is taken at the maximum of the curve (or at saturation).
+# The parameters are stored in the calibration store (parameters 'ptc').
+#
+# Use: python ptc.py --flat 5 wf5 --flat 50 wf50 --dark df5 -c /path/to/radiometric
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : Pair_stats collected at capture time, characterize takes *_pairs.npz
+# 19.10.2026 : characterize subtracts the master darks of a given temperature
+#
+######################################################################
+
+global PTC_VERSION
+PTC_VERSION = 1
+
+# bayer site (row, col) -> colour, as in radiometric.demosaic1
+SITES = (('r', (1, 0)), ('g', (0, 0)), ('g', (1, 1)), ('b', (0, 1)))
+CHANNELS = ('r', 'g', 'b')
+SATURATION = 1023           # 10 bit raw
+
+
+def tile_sums(plane, tile):
+    '''
+    Sum of every tile x tile block of a plane (edges not filling a whole
+    tile are dropped).
+    :return: float64 array (rows // tile, cols // tile)
+    '''
+    ny, nx = plane.shape[0] // tile, plane.shape[1] // tile
+    blocks = plane[:ny * tile, :nx * tile].reshape(ny, tile, nx, tile)
+    return blocks.sum(axis=(1, 3), dtype=np.float64)
+
+
+def pair_tiles(a, b, tile):
+    '''
+    Mean signal and temporal variance per tile and bayer site of a frame pair.
+    :param a, b: raw frames (2464 x 3296, uint16)
+    :return: list of (colour, mean, var) with one value per tile
+    '''
+    n = float(tile * tile)
+    result = []
+    for colour, (y, x) in SITES:
+        sa = a[y::2, x::2].astype(np.float32)
+        sb = b[y::2, x::2].astype(np.float32)
+        mean = tile_sums(sa + sb, tile) / (2 * n)
+        sa -= sb                            # pair difference
+        d_mean = tile_sums(sa, tile) / n
+        sa *= sa
+        var = (tile_sums(sa, tile) / n - d_mean * d_mean) * n / (n - 1) / 2
+        result.append((colour, mean, var))
+
+    return result
+
+
+class Pair_stats:
+    """
+    Tile statistics of consecutive frame pairs, fed one frame at a time.
+    Used by stack_pairs and at capture time (radiometric.capture_stack),
+    where the frames are never written to disk.
+
+    EXAMPLE:
+      pairs = Pair_stats(tile=32)
+      for frame in frames:
+          pairs.add(frame)
+      pairs.save('wf_avg5ms_pairs.npz')
+    """
+    def __init__(self, tile=32):
+        self.tile = tile
+        self.sums = None
+        self.pairs = 0
+        self.previous = None
+
+    def add(self, frame):
+        '''
+        Adds a frame, every second frame completes a pair.
+        :return: True if a pair was completed
+        '''
+        frame = np.asarray(frame).reshape(RAW_SHAPE)
+        if self.previous is None:
+            self.previous = frame
+            return False
+
+        tiles = pair_tiles(self.previous, frame, self.tile)
+        if self.sums is None:
+            self.sums = tiles
+        else:
+            self.sums = [(c, m + tm, v + tv) for (c, m, v), (_, tm, tv) in zip(self.sums, tiles)]
+        self.pairs += 1
+        self.previous = None
+        return True
+
+    def result(self):
+        '''
+        :return: tuple (list of (colour, mean, var) per site, number of pairs)
+        '''
+        if self.pairs == 0:
+            raise ValueError('Need at least two frames')
+        return [(c, m / self.pairs, v / self.pairs) for c, m, v in self.sums], self.pairs
+
+    def save(self, path):
+        tiles, pairs = self.result()
+        arrays = dict(tile=self.tile, pairs=pairs)
+        for i, (c, m, v) in enumerate(tiles):
+            arrays['mean{}'.format(i)] = m
+            arrays['var{}'.format(i)] = v
+        np.savez(path + '.part.npz', **arrays)
+        os.rename(path + '.part.npz', path)
+
+
+def load_pairs(path, tile=32):
+    '''
+    Pair statistics written by Pair_stats.save.
+    :return: tuple (list of (colour, mean, var) per site, number of pairs)
+    '''
+    with np.load(path) as data:
+        if int(data['tile']) != tile:
+            raise ValueError('{} has tile size {}, not {}'.format(path, int(data['tile']), tile))
+        tiles = [(c, data['mean{}'.format(i)], data['var{}'.format(i)]) for i, (c, site) in enumerate(SITES)]
+        return tiles, int(data['pairs'])
+
+
+def stack_pairs(files, tile=32, callback=None):
+    '''
+    Averages the tile statistics over all pairs of a stack, reading two
+    frames at a time.
+    :param files: raw *.data files of one exposure, consecutive files form pairs
+    :return: tuple (list of (colour, mean, var) per site, number of pairs)
+    '''
+    pairs = Pair_stats(tile)
+    for file, frame in Prefetch_reader(files):
+        if pairs.add(frame) and callback is not None:
+            callback(file, pairs.pairs)
+
+    if pairs.pairs == 0:
+        raise ValueError('Need at least two frames, got {}'.format(len(files)))
+    return pairs.result()
+
+
+def pair_statistics(source, tile=32, callback=None):
+    '''
+    Pair statistics of a stack: a list of raw *.data files, or the *_pairs.npz
+    collected while capturing.
+    '''
+    if isinstance(source, str):
+        return load_pairs(source, tile)
+    return stack_pairs(source, tile, callback)
+
+
+def dark_tiles(dark, tile):
+    '''
+    Mean of the master dark per tile and bayer site.
+    '''
+    dark = np.asarray(dark).reshape(RAW_SHAPE)
+    return [tile_sums(dark[y::2, x::2], tile) / (tile * tile) for _, (y, x) in SITES]
+
+
+def fit_channel(mean, var, read_noise=None, saturation=SATURATION, linear_fraction=0.7):
+    '''
+    Fits the photon transfer curve of one colour.
+    :param mean: dark subtracted mean signal per point [DN]
+    :param var: temporal variance per point [DN^2]
+    :param read_noise: read noise [DN] from dark pairs, None: fitted intercept
+    :param saturation: dark subtracted saturation level [DN]
+    :param linear_fraction: only points below this fraction of full well are fitted
+    :return: dict gain, read_noise_dn, read_noise_e, full_well_dn, full_well_e, points
+    '''
+    order = np.argsort(mean)
+    mean, var = mean[order], var[order]
+
+    # full well: maximum of the curve (smoothed over neighbouring points)
+    # if the variance drops again towards saturation, otherwise saturation
+    smooth = np.convolve(var, np.ones(9) / 9.0, mode='valid')
+    peak = int(np.argmax(smooth))
+    if smooth[-1] < 0.9 * smooth[peak]:
+        full_well = float(mean[peak + 4])
+    else:
+        full_well = float(saturation)
+
+    use = (mean > 0) & (mean < linear_fraction * full_well) & (var > 0)
+    if use.sum() < 2:
+        raise ValueError('Not enough points below {:.0f} DN to fit'.format(linear_fraction * full_well))
+
+    # variance estimates scatter proportional to the variance itself
+    slope, intercept = np.polyfit(mean[use], var[use], 1, w=1.0 / var[use])
+    gain = 1.0 / slope
+    if read_noise is None:
+        read_noise = np.sqrt(max(intercept, 0.0))
+
+    return dict(gain=float(gain), read_noise_dn=float(read_noise), read_noise_e=float(read_noise * gain),
+                full_well_dn=float(full_well), full_well_e=float(full_well * gain), points=int(use.sum()))
+
+
+def characterize(flats, darks=None, store=None, iso=100, tile=32, callback=None, temperature=None):
+    '''
+    Photon transfer characterization from flat frame stacks.
+    :param flats: dict exposure [us] -> list of raw *.data files or pair statistics file
+    :param darks: list of dark frame files or pair statistics file for the read noise, optional
+    :param store: calibration.Calibration_store for the master darks (signal
+           offset per tile). Without a store or master the dark mean of the
+           dark frames or, missing these, 0 is used.
+    :param temperature: dome temperature of the master darks, see Calibration_store.dark
+    :return: dict version, created, tile, pairs, channels (colour -> fit_channel)
+    '''
+    points = dict((c, ([], [])) for c in CHANNELS)
+    pairs = {}
+
+    read_noise = None
+    dark_offset = None
+    offset = None
+    if darks:
+        tiles, n = pair_statistics(darks, tile, callback)
+        read_noise = {}
+        for c in CHANNELS:
+            read_noise[c] = float(np.sqrt(np.median(np.concatenate([v.ravel() for cc, m, v in tiles if cc == c]))))
+        dark_offset = [m for c, m, v in tiles]
+        pairs['dark'] = n
+
+    for exposure in sorted(flats):
+        tiles, n = pair_statistics(flats[exposure], tile, callback)
+        pairs[str(exposure)] = n
+
+        offset = dark_offset
+        if store is not None:
+            try:
+                offset = dark_tiles(store.dark(exposure, iso, temperature), tile)
+            except KeyError as e:
+                print('No master dark for {} us, using dark frames: {}'.format(exposure, e))
+
+        for i, (c, m, v) in enumerate(tiles):
+            if offset is not None:
+                m = m - offset[i]
+            points[c][0].append(m.ravel())
+            points[c][1].append(v.ravel())
+
+    saturation = SATURATION
+    if offset is not None:
+        saturation -= float(np.median(np.concatenate([o.ravel() for o in offset])))
+
+    channels = {}
+    for c in CHANNELS:
+        mean = np.concatenate(points[c][0])
+        var = np.concatenate(points[c][1])
+        channels[c] = fit_channel(mean, var, None if read_noise is None else read_noise[c], saturation)
+
+    return dict(version=PTC_VERSION, created=time.strftime('%Y-%m-%d %H:%M:%S'), iso=iso, tile=tile,
+                pairs=pairs, channels=channels)
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Photon transfer characterization from flat frame pairs.')
+        parser.add_argument('--flat', nargs=2, action='append', required=True, metavar=('EXPOSURE_MS', 'DIR'),
+                            help='exposure [ms] and directory of a white frame stack or its *_pairs.npz, repeatable')
+        parser.add_argument('--dark', default=None, help='directory of dark frames or *_pairs.npz for the read noise')
+        parser.add_argument('-c', '--calib', default=None, help='calibration directory (master darks, result)')
+        parser.add_argument('--iso', type=int, default=100)
+        parser.add_argument('--tile', type=int, default=32, help='tile size in bayer site pixels')
+        args = parser.parse_args()
+
+        def stack(path):
+            return path if path.endswith('.npz') else sorted(glob(os.path.join(path, '*.data')))
+
+        flats = {}
+        for exposure, path in args.flat:
+            flats[int(float(exposure) * 1000)] = stack(path)
+        darks = stack(args.dark) if args.dark else None
+        store = get_store(args.calib) if args.calib else None
+
+        t_start = time.time()
+        result = characterize(flats, darks, store, args.iso, args.tile)
+
+        for c in CHANNELS:
+            p = result['channels'][c]
+            print('{}: gain {:.3f} e-/DN | read noise {:.2f} DN = {:.2f} e- | full well {:.0f} DN = {:.0f} e-'.format(
+                c, p['gain'], p['read_noise_dn'], p['read_noise_e'], p['full_well_dn'], p['full_well_e']))
+
+        if store is not None:
+            store.set_parameters('ptc', result)
+            print('Stored in {}'.format(store.path))
+        print('Done in {:.1f} s'.format(time.time() - t_start))
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
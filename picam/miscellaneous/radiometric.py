@@ -12,6 +12,13 @@ import logging.handlers
 from matplotlib import pyplot as plt
 import numpy as np
 import math
+from calibration import get_store, parse_master_name, master_name, DEFECTS_NAME
+from dometemp import get_dome_temperature, temperature_bin, SENSOR_DB
+from defects import find_defects, save_defects
+from ptc import characterize, Pair_stats
+from histogram import file_histograms, Histogram_plot
+from flatfield import get_model, fit_model, save_model, MODELS
+from stacking import stack_groups, frame_stats, frame_histogram, Frame_stacker, Background_stacker, RAW_SHAPE
 
 if sys.platform == "linux":
     import picamera
@@ -36,7 +43,25 @@ print('Version opencv: ' + cv2.__version__)
 # ----------------------------------------------------------------------
 #
 # 11.10.2018 : First implementation
-#
+# 19.10.2026 : Precision policy for Imgproc, float32 / native uint16
+# 19.10.2026 : Single pass dark/white frame stacking with variance maps
+# 19.10.2026 : Generic multi exposure stacking, prefetch and worker processes
+# 19.10.2026 : Streaming calibration capture, only master frames are written
+# 19.10.2026 : Cached calibration store for dark subtraction
+# 19.10.2026 : Flat fielding with tabulated fall off functions (LUT / gain map)
+# 19.10.2026 : Flat field model fitted from the master white frames
+# 19.10.2026 : Hot / dead pixel map and correction
+# 19.10.2026 : Color balance from histogram percentiles and lookup tables
+# 19.10.2026 : Raw histograms per bayer colour (histogram.py)
+# 19.10.2026 : Photon transfer characterization (ptc.py)
+# 19.10.2026 : Darks per dome temperature bin, selected by capture time
+# 19.10.2026 : Photon transfer pair statistics collected while streaming (no single frames needed)
+# 19.10.2026 : Unused accumulator dtype removed from Precision_config (stacks use Frame_stacker)
+# 19.10.2026 : Value mode flat fielding of the 16 bit demosaiced image no longer saturates
+# 19.10.2026 : Value mode flat fielding corrects the pixel values instead of returning f(value)
+# 19.10.2026 : Photon transfer pairs and darks of one temperature bin (selected like the masters)
+# 19.10.2026 : main averages the dark frames on disk only with average_frames or streaming off
+#              (before it always did, streamed captures already write the masters)
 #
 ######################################################################
 
@@ -50,6 +75,8 @@ global WHITEFRAMES_5MS
 global WHITEFRAMES_50MS
 global WF_AVG5MS
 global WF_AVG50MS
+global FLATFIELD
+global SENSORDB
 
 SCRIPTPATH = join('/home', 'pi', 'python_scripts', 'picam')
 #SCRIPTPATH = r'C:\Users\tahorvat\Desktop'
@@ -64,6 +91,9 @@ WHITEFRAMES_5MS = join(RADIOMETRICALIB, 'wf5')
 WHITEFRAMES_50MS = join(RADIOMETRICALIB, 'wf50')
 WF_AVG5MS  = join(RADIOMETRICALIB, 'wf_avg5ms.data')
 WF_AVG50MS = join(RADIOMETRICALIB, 'wf_avg50ms.data')
+PAIRS_SUFFIX = '_pairs.npz'     # ptc pair statistics of a streamed stack, e.g. wf_avg5ms_pairs.npz
+FLATFIELD  = join(RADIOMETRICALIB, 'flatfield.json')
+SENSORDB   = SENSOR_DB
 DATAPATH = join(RADIOMETRICALIB, 'wf5','1_wf.data')
 print(DATAPATH)
 
@@ -144,92 +174,127 @@ class Helpers:
             print('PERM : Could not set permissions for file: ' + str(e))
 
 class Color_Balance:
+    """
+    Simplest color balance: per channel the `percent`/2 darkest and
+    brightest pixels are saturated and the rest stretched to full range.
 
-    def apply_mask(self, matrix, mask, fill_value):
-        masked = np.ma.array(matrix, mask=mask, fill_value=fill_value)
-        return masked.filled()
-
-    def apply_threshold(self, matrix, low_value, high_value):
-        low_mask = matrix < low_value
-        matrix = self.apply_mask(matrix, low_mask, low_value)
-
-        high_mask = matrix > high_value
-        matrix = self.apply_mask(matrix, high_mask, high_value)
+    Percentiles come from a cumulative histogram of the integer channel
+    (linear time, no sort), stretching and the 8 bit conversion are folded
+    into one lookup table per channel.
+    """
 
-        return matrix
-
-    def simplest_cb(self, path_to_image, percent):
+    def channel_percentiles(self, channel, half_percent):
+        '''
+        Low and high percentile of an integer channel, same values as
+        indexing the sorted channel at floor(n * hp) and ceil(n * (1 - hp)).
+        '''
+        cumulative = np.cumsum(frame_histogram(channel))
+        n = int(cumulative[-1])
+        low_index = int(math.floor(n * half_percent))
+        high_index = min(int(math.ceil(n * (1.0 - half_percent))), n - 1)
+        # sorted[k] is the first value whose cumulative count exceeds k
+        low_val, high_val = np.searchsorted(cumulative, [low_index, high_index], side='right')
+        return int(low_val), int(high_val)
+
+    def stretch_lut(self, low_val, high_val, size):
+        '''
+        Lookup table: saturates below low_val / above high_val, scales the
+        range in between to 16 bit and reduces it to 8 bit like toRGB_1.
+        '''
+        lut = np.arange(size, dtype=np.float32)
+        lut -= low_val
+        lut *= (2 ** 16 - 1) / float(max(high_val - low_val, 1))
+        np.clip(lut, 0, 2 ** 16 - 1, out=lut)
+        # round, not floor: the former cv2.normalize(NORM_MINMAX) to uint16 rounds
+        # to nearest before toRGB_1 floors with // 256, rint reproduces it exactly
+        np.rint(lut, out=lut)
+        lut //= 256
+        return lut.astype(np.uint8)
+
+    def simplest_cb(self, image, percent):
+        '''
+        :param image: path to a raw *.data file, raw mosaic (2464 x 3296) or
+               demosaiced uint8 / uint16 image (h x w x 3)
+        :param percent: percentage of pixels saturated per channel (0..100)
+        :return: color balanced 8 bit image
+        '''
+        assert percent > 0 and percent < 100
 
-        imprc = Imgproc()
-        data = np.fromfile(path_to_image, dtype='uint16')
-        data = data.reshape([2464, 3296])
-        img = imprc.demosaic1(data)
+        if isinstance(image, str):
+            image = np.fromfile(image, dtype='uint16')
+        if image.ndim < 3:
+            # demosaic1 works in place, keep the caller's mosaic
+            image = Imgproc().demosaic1(image.astype(np.uint16, copy=True).reshape(RAW_SHAPE))
 
-        assert img.shape[2] == 3
-        assert percent > 0 and percent < 100
+        assert image.shape[2] == 3 and image.dtype.kind == 'u'
 
         half_percent = percent / 200.0
+        size = 1 << (8 * image.dtype.itemsize)
+        out = np.empty(image.shape, dtype=np.uint8)
 
-        channels = cv2.split(img)
-
-        out_channels = []
-        for channel in channels:
-            assert len(channel.shape) == 2
-            # find the low and high precentile values (based on the input percentile)
-            height, width = channel.shape
-            vec_size = width * height
-            flat = channel.reshape(vec_size)
+        for c in range(3):
+            channel = image[..., c]
+            low_val, high_val = self.channel_percentiles(channel, half_percent)
 
-            assert len(flat.shape) == 1
+            print("Lowval: ", low_val)
+            print("Highval: ", high_val)
 
-            flat = np.sort(flat)
+            np.take(self.stretch_lut(low_val, high_val, size), channel, out=out[..., c])
 
-            n_cols = flat.shape[0]
+        return out
 
-            low_val = flat[math.floor(n_cols * half_percent)]
-            high_val = flat[math.ceil(n_cols * (1.0 - half_percent))]
+class Precision_config(object):
+  """Config Options:
+    `work` : dtype of floating point intermediate images. float32 halves the
+      memory of the former float64 temporaries and doubles the SIMD width.
+    `store` : dtype of raw frames and of master frames written to disk.
+  """
+  def __init__(self, config_map={}):
+      self.work = np.dtype(config_map.get('work', np.float32))
+      self.store = np.dtype(config_map.get('store', np.uint16))
 
-            print("Lowval: ", low_val)
-            print("Highval: ", high_val)
+  def to_dict(self):
+    return {
+      'work': self.work.name,
+      'store': self.store.name,
+    }
 
-            # saturate below the low percentile and above the high percentile
-            thresholded = self.apply_threshold(channel, low_val, high_val)
-            # scale the channel
-            img_16bit = (2**16) -1
-            img_8bit = 255
-            normalized = cv2.normalize(thresholded, thresholded.copy(), 0, img_16bit, cv2.NORM_MINMAX)
-            out_channels.append(normalized)
-            img = cv2.merge(out_channels)
-            img = imprc.toRGB_1(img)
-        return img
 
 class Imgproc:
 
+    def __init__(self, precision=None):
+        if precision is None:
+            precision = Precision_config({})
+        self.precision = precision
+
     def demosaic1(self, mosaic, awb_gains = None):
+        '''
+        Half resolution demosaicing. Without awb gains the whole computation
+        stays in native uint16, with gains the mosaic is converted once to
+        the working float type (float32 by default).
+        '''
         try:
+            work = self.precision.work
             black = mosaic.min()
             saturation = mosaic.max()
 
             uint14_max = 2 ** 14 - 1
             mosaic -= black  # black subtraction
             mosaic *= int(uint14_max / (saturation - black))
-            mosaic = np.clip(mosaic, 0, uint14_max)  # clip to range
+            np.clip(mosaic, 0, uint14_max, out=mosaic)  # clip to range
 
+            mosaic = mosaic.reshape([2464, 3296])
 
-            if awb_gains is None:
-                vb_gain = 1.0
-                vg_gain = 1.0  # raspi raw has already gain = 1 of green channel
-                vr_gain = 1.0
-            else:
+            if awb_gains is not None:
                 vb_gain = awb_gains[1]
                 vg_gain = 1.0  # raspi raw has already gain = 1 of green channel
                 vr_gain = awb_gains[0]
 
-            mosaic = mosaic.reshape([2464, 3296])
-            mosaic = mosaic.astype('float')
-            mosaic[0::2, 1::2] *= vb_gain  # Blue
-            mosaic[1::2, 0::2] *= vr_gain  # Red
-            mosaic = np.clip(mosaic, 0, uint14_max)  # clip to range
+                mosaic = mosaic.astype(work)
+                mosaic[0::2, 1::2] *= vb_gain  # Blue
+                mosaic[1::2, 0::2] *= vr_gain  # Red
+                np.clip(mosaic, 0, uint14_max, out=mosaic)  # clip to range
+
             mosaic *= 2 ** 2
 
             # demosaic
@@ -239,7 +304,9 @@ class Imgproc:
             p4 = mosaic[1::2, 0::2]  # Red
 
             blue = p1
-            green = np.clip((p2 // 2 + p3 // 2), 0, 2 ** 16 - 1)
+            green = p2 // 2
+            green += p3 // 2
+            np.clip(green, 0, 2 ** 16 - 1, out=green)
             red = p4
 
             image = np.dstack([red, green, blue])  # 16 - bit 'image'
@@ -253,13 +320,15 @@ class Imgproc:
 
     def demosiac2(self, data, awb_gains = None):
         try:
+            work = self.precision.work
             p1 = data[0::2, 1::2]  # Blue
             p2 = data[0::2, 0::2]  # Green
             p3 = data[1::2, 1::2]  # Green
             p4 = data[1::2, 0::2]  # Red
 
             blue = p1
-            green = ((p2 + p3)) / 2
+            green = np.add(p2, p3, dtype=work)
+            green *= 0.5
             red = p4
 
             if awb_gains is None:
@@ -282,15 +351,21 @@ class Imgproc:
                  [0.20, 0.20, 0.7]])
 
             s = (1232, 1648, 3)
-            rgb = np.zeros(s)
+            rgb = np.empty(s, dtype=work)
 
-            rgb[:, :, 0] = vr * 1023 * (red / 1023.)   ** gamma
-            rgb[:, :, 1] = vg * 1023 * (green / 1023.) ** gamma
-            rgb[:, :, 2] = vb * 1023 * (blue / 1023.)  ** gamma
+            for ch, plane, gain in ((0, red, vr), (1, green, vg), (2, blue, vb)):
+                rgb[:, :, ch] = plane
+                if gamma != 1:
+                    rgb[:, :, ch] *= 1 / 1023.
+                    rgb[:, :, ch] **= gamma
+                    rgb[:, :, ch] *= 1023
+                rgb[:, :, ch] *= gain
 
             # rgb = rgb.dot(cvm)
 
-            rgb = (rgb - np.min(rgb)) / (np.max(rgb) - np.min(rgb))
+            rgb_min = rgb.min()
+            rgb -= rgb_min
+            rgb *= 1. / (rgb.max())
 
             height, width = rgb.shape[:2]
 
@@ -320,9 +395,8 @@ class Imgproc:
         :param data:
         :return:
         '''
-        image = np.zeros(data.shape, dtype=np.float)
-        min = data.min()
-        image = data - min
+        image = data.astype(self.precision.work)
+        image -= image.min()
 
         # get the max from out after normalizing to 0
         max = image.max()
@@ -331,295 +405,266 @@ class Imgproc:
 
         return image
 
-    def average_darkframes(self):
-        print('Running df averaging.')
-        helper = Helpers()
-        s = Logger()
-        logger = s.getLogger()
-        imprc = Imgproc()
-
-        files_5ms = []
-        files_50ms = []
-
-        for file in sorted(glob(os.path.join(DARKFRAMES_5MS, "*.data"))):
-            if os.path.isfile(file):
-                files_5ms.append(file)
-
-        for file in sorted(glob(os.path.join(DARKFRAMES_50MS, "*.data"))):
-            if os.path.isfile(file):
-                files_50ms.append(file)
-
-        average_5ms = np.fromfile(files_5ms[0], dtype='uint16') # load first image
-        average_5ms = average_5ms.reshape([2464, 3296])
-        average_5ms = average_5ms.astype('float')
-        legend = 'DF 5ms: {df_name}: mean: {df_mean}, median: {df_medi}, std: {df_stdv}, var: {df_var}'
-
-        for file in files_5ms[1:]:
-            data = np.fromfile(file, dtype='uint16')
-            df = data.reshape([2464, 3296])
-            df = df.astype('float')                     # sonst Überlauf
-            average_5ms += df
+    def average_frames(self, groups, legend, logger=None, sigma_clip=None, workers=1):
+        '''
+        Stacks any number of exposure groups in a single pass per frame and
+        writes one master frame per group (see write_master).
+        Frames are read ahead on a background thread; with workers > 1 large
+        stacks are split over worker processes and the partial results merged.
+        :param groups: dict master name -> directory with *.data frames
+        :param legend: dict master name -> format string for frame statistics
+        :param sigma_clip: optional sigma clipping, see stacking.Frame_stacker
+        :param workers: number of worker processes
+        :return: dict master name -> stacking.Frame_stacker
+        '''
+        prec = self.precision
+        files = {}
+        for name, path in groups.items():
+            files[name] = [file for file in sorted(glob(os.path.join(path, "*.data"))) if os.path.isfile(file)]
 
+        def log_stats(name, file, frame_stats):
             stats = dict(
-                df_name = '{}'.format(file.strip('.data').split('/')[-1]),
-                df_mean = '{0:.2f}'.format(np.mean(df)),
-                df_medi = '{0:.2f}'.format(np.median(df)),
-                df_stdv = '{0:.2f}'.format(np.std(df)),
-                df_var  = '{0:.2f}'.format(np.var(df)),
+                name = '{}'.format(os.path.basename(file)[:-len('.data')]),
+                mean = '{0:.2f}'.format(frame_stats['mean']),
+                medi = '{0:.2f}'.format(frame_stats['median']),
+                stdv = '{0:.2f}'.format(frame_stats['std']),
+                var  = '{0:.2f}'.format(frame_stats['var']),
             )
-            print(legend.format(**stats))
-            logger.info(legend.format(**stats))
-
-        average_5ms /=len(files_5ms)
-
-        img = imprc.demosaic1(average_5ms.astype('uint16'))
-        avrg_5ms = imprc.toRGB_1(img)
-        cv2.imwrite(join(RADIOMETRICALIB ,"df_avg5ms.jpg"),avrg_5ms)
-
-        with open(RADIOMETRICALIB + "/" + 'df_avg5ms.data', 'wb') as g:
-            data = average_5ms.astype('uint16')
-            data.tofile(g)
-        #-------------------------------------------
-        # do the same with 50ms exposure dark frames
-        average_50ms = np.fromfile(files_50ms[0], dtype='uint16') # load first image
-        average_50ms = average_50ms.reshape([2464, 3296])
-        average_50ms = average_50ms.astype('float')
-        legend = 'DF 50ms: {df_name}: mean: {df_mean}, median: {df_medi}, std: {df_stdv}, var: {df_var}'
-
-        for file in files_50ms[1:]:
-            data = np.fromfile(file, dtype='uint16')
-            df = data.reshape([2464, 3296])
-            df = df.astype('float')                     # sonst Überlauf
-            average_50ms += df
+            print(legend[name].format(**stats))
+            if logger is not None:
+                logger.info(legend[name].format(**stats))
 
-            stats = dict(
-                df_name = '{}'.format(file.strip('.data').split('/')[-1]),
-                df_mean = '{0:.2f}'.format(np.mean(df)),
-                df_medi = '{0:.2f}'.format(np.median(df)),
-                df_stdv = '{0:.2f}'.format(np.std(df)),
-                df_var  = '{0:.2f}'.format(np.var(df)),
-            )
-            print(legend.format(**stats))
+        stackers = stack_groups(files, workers, shape=RAW_SHAPE, sigma_clip=sigma_clip,
+                                dtype=prec.store, work=prec.work, callback=log_stats)
 
-        average_50ms /= len(files_5ms)
+        for name, stacker in stackers.items():
+            self.write_master(stacker, name)
 
-        img = imprc.demosaic1(average_50ms.astype('uint16'))
-        avrg_50ms = imprc.toRGB_1(img)
-        cv2.imwrite(join(RADIOMETRICALIB,"df_avg50ms.jpg"),avrg_50ms)
+        return stackers
 
-        with open(RADIOMETRICALIB + "/" + 'df_avg50ms.data', 'wb') as g:
-            data = average_50ms.astype('uint16')
-            data.tofile(g)
+    def write_master(self, stacker, name, iso=100, temperature=None):
+        '''
+        Writes a stacked master frame to RADIOMETRICALIB:
+        <name>.data (mean, uint16), <name>.jpg (preview) and the variance
+        and count maps as npy (df_avg5ms -> df_var5ms.npy, df_cnt5ms.npy).
+        The master is registered in the calibration index.
+        '''
+        prec = self.precision
+        path_to_var = join(RADIOMETRICALIB, name.replace('avg', 'var') + '.npy')
+        path_to_cnt = join(RADIOMETRICALIB, name.replace('avg', 'cnt') + '.npy')
+        stacker.save(join(RADIOMETRICALIB, name + '.data'), path_to_var, path_to_cnt)
+
+        master = parse_master_name(name)
+        if master is not None:
+            kind, exposure, name_temperature = master
+            if temperature is None:
+                temperature = name_temperature
+            get_store(RADIOMETRICALIB).register(kind, name + '.data', exposure, iso, temperature,
+                                                stacker.shape, prec.store)
+
+        mean = np.fromfile(join(RADIOMETRICALIB, name + '.data'), dtype=prec.store)
+        img = self.demosaic1(mean)
+        cv2.imwrite(join(RADIOMETRICALIB, name + '.jpg'), self.toRGB_1(img))
+
+    def average_darkframes(self, sigma_clip=None, workers=1):
+        print('Running df averaging.')
+        s = Logger()
+        logger = s.getLogger()
+
+        groups = {'df_avg5ms': DARKFRAMES_5MS, 'df_avg50ms': DARKFRAMES_50MS}
+        legend = {
+            'df_avg5ms':  'DF 5ms: {name}: mean: {mean}, median: {medi}, std: {stdv}, var: {var}',
+            'df_avg50ms': 'DF 50ms: {name}: mean: {mean}, median: {medi}, std: {stdv}, var: {var}',
+        }
+        self.average_frames(groups, legend, logger, sigma_clip, workers)
 
         logger.info('Created avreged darkframes for 5ms and 50 ms exposure.')
         print('Done avreaging darkframes.')
 
-    def average_whiteframes(self):
+    def average_whiteframes(self, sigma_clip=None, workers=1):
         print('Running wf averaging.')
-        helper = Helpers()
         s = Logger()
         logger = s.getLogger()
-        imprc = Imgproc()
-
-        files_5ms = []
-        files_50ms = []
-
-        for file in sorted(glob(os.path.join(WHITEFRAMES_5MS, "*.data"))):
-            if os.path.isfile(file):
-                files_5ms.append(file)
-
-        for file in sorted(glob(os.path.join(WHITEFRAMES_50MS, "*.data"))):
-            if os.path.isfile(file):
-                files_50ms.append(file)
-
-        average_5ms = np.fromfile(files_5ms[0], dtype='uint16') # load first image
-        average_5ms = average_5ms.reshape([2464, 3296])
-        average_5ms = average_5ms.astype('float')
-        legend = 'DF 5ms: {wf_name}: mean: {wf_mean}, median: {wf_medi}, std: {wf_stdv}, var: {wf_var}'
-
-        for file in files_5ms[1:]:
-            data = np.fromfile(file, dtype='uint16')
-            wf = data.reshape([2464, 3296])
-            ff = wf.astype('float')                     # sonst Überlauf
-            average_5ms += wf
-
-            stats = dict(
-                wf_name = '{}'.format(file.strip('.data').split('/')[-1]),
-                wf_mean = '{0:.2f}'.format(np.mean(wf)),
-                wf_medi = '{0:.2f}'.format(np.median(wf)),
-                wf_stdv = '{0:.2f}'.format(np.std(wf)),
-                wf_var  = '{0:.2f}'.format(np.var(wf)),
-            )
-            print(legend.format(**stats))
-            logger.info(legend.format(**stats))
-
-        average_5ms /=len(files_5ms)
-
-        img = imprc.demosaic1(average_5ms.astype('uint16'))
-        avrg_5ms = imprc.toRGB_1(img)
-        cv2.imwrite(join(RADIOMETRICALIB ,"wf_avg5ms.jpg"),avrg_5ms)
-
-        with open(RADIOMETRICALIB + "/" + 'wf_avg5ms.data', 'wb') as g:
-            data = average_5ms.astype('uint16')
-            data.tofile(g)
-        #-------------------------------------------
-        # do the same with 50ms exposure dark frames
-        average_50ms = np.fromfile(files_50ms[0], dtype='uint16') # load first image
-        average_50ms = average_50ms.reshape([2464, 3296])
-        average_50ms = average_50ms.astype('float')
-        legend = 'WF 50ms: {wf_name}: mean: {wf_mean}, median: {wf_medi}, std: {wf_stdv}, var: {wf_var}'
-
-        for file in files_50ms[1:]:
-            data = np.fromfile(file, dtype='uint16')
-            wf = data.reshape([2464, 3296])
-            wf = wf.astype('float')                     # sonst Überlauf
-            average_50ms += wf
-
-            stats = dict(
-                wf_name = '{}'.format(file.strip('.data').split('/')[-1]),
-                wf_mean = '{0:.2f}'.format(np.mean(wf)),
-                wf_medi = '{0:.2f}'.format(np.median(wf)),
-                wf_stdv = '{0:.2f}'.format(np.std(wf)),
-                wf_var  = '{0:.2f}'.format(np.var(wf)),
-            )
-            print(legend.format(**stats))
-
-        average_50ms /= len(files_5ms)
-
-        img = imprc.demosaic1(average_50ms.astype('uint16'))
-        avrg_50ms = imprc.toRGB_1(img)
-        cv2.imwrite(join(RADIOMETRICALIB,"wf_avg50ms.jpg"),avrg_50ms)
 
-        with open(RADIOMETRICALIB + "/" + 'wf_avg50ms.data', 'wb') as g:
-            data = average_50ms.astype('uint16')
-            data.tofile(g)
+        groups = {'wf_avg5ms': WHITEFRAMES_5MS, 'wf_avg50ms': WHITEFRAMES_50MS}
+        legend = {
+            'wf_avg5ms':  'WF 5ms: {name}: mean: {mean}, median: {medi}, std: {stdv}, var: {var}',
+            'wf_avg50ms': 'WF 50ms: {name}: mean: {mean}, median: {medi}, std: {stdv}, var: {var}',
+        }
+        self.average_frames(groups, legend, logger, sigma_clip, workers)
 
         logger.info('Created avreged whiteframes for 5ms and 50 ms exposure.')
         print('Done avreaging white frames.')
 
-    def substract_darkframes(self, data):
-        df_avg5ms  = np.fromfile(join(RADIOMETRICALIB,'df_avg5ms.data'),  dtype='uint16')
-        df_avg50ms = np.fromfile(join(RADIOMETRICALIB,'df_avg50ms.data'), dtype='uint16')
-        df_avg = (np.array(df_avg5ms) + np.array(df_avg50ms)) / 2
-        df_substracted = data - df_avg
-        return df_substracted.clip(0)
-
-    def create_flatfield(self):
-        # Normalize prob:
-        # https://stackoverflow.com/questions/40645985/opencv-python-normalize-image
-
-        s = (1232, 1648, 3)
-        # white_frame =  np.zeros(s,np.float)  # empty (white) frame
-        white_frame = np.ones(s, np.float)
-        # coefs for the red channel:
-        a0_r = -1.234; a1_r = 1.962;  b1_r = -1.751; a2_r = 0.2604;  b2_r = 0.07941;  w_r = -0.0007905
-        # coefs for the green channel:
-        a0_g = 0.4900; a1_g = 0.4123; b1_g = 0.1851; a2_g = 0.09083; b2_g = -0.05701; w_g = 0.001312
-        # coefs for the green channel:
-        a0_b = 0.4935; a1_b = 0.4216; b1_b = 0.1736; a2_b = 0.08101; b2_b = -0.06155; w_b = 0.001284
-
-        #f_r = lambda x: a0_r + a1_r*np.cos(w_r*x) + b1_r*np.sin(w_r*x) + a2_r*np.cos(2*w_r*x) + b2_r*np.sin(2*w_r*x)
-        #f_g = lambda x: a0_g + a1_g*np.cos(w_g*x) + b1_g*np.sin(w_g*x) + a2_g*np.cos(2*w_g*x) + b2_g*np.sin(2*w_g*x)
-        #f_b = lambda x: a0_b + a1_b*np.cos(w_b*x) + b1_b*np.sin(w_b*x) + a2_b*np.cos(2*w_b*x) + b2_b*np.sin(2*w_b*x)
-
-        red   = white_frame[:, :, 0]
-        green = white_frame[:, :, 1]
-        blue  = white_frame[:, :, 2]
-
-        # normalize pixel values to [0,1]
-        #norm_red   = cv2.normalize(red,   None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        #norm_green = cv2.normalize(green, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        #norm_blue  = cv2.normalize(blue,  None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-
-        #r_f = f_r(red)
-        #g_f = f_g(green)
-        #b_f = f_b(blue)
-
-        f_r = a0_r + a1_r*np.cos(w_r*red)   + b1_r*np.sin(w_r*red)  + a2_r*np.cos(2*w_r*red)  + b2_r*np.sin(2*w_r*red)
-        f_g = a0_g + a1_g*np.cos(w_g*green) + b1_g*np.sin(w_g*green)+ a2_g*np.cos(2*w_g*green)+ b2_g*np.sin(2*w_g*green)
-        f_b = a0_b + a1_b*np.cos(w_b*blue)  + b1_b*np.sin(w_b*blue) + a2_b*np.cos(2*w_b*blue) + b2_b*np.sin(2*w_b*blue)
-
-        print('min: {} | max: {} | max-min={}'.format(f_r.min(), f_r.max(),f_r.max()-f_r.min()))
-        print('min: {} | max: {} | max-min={}'.format(f_g.min(), f_g.max(),f_g.max()-f_g.min()))
-        print('min: {} | max: {} | max-min={}'.format(f_b.min(), f_b.max(),f_b.max()-f_b.min()))
-
-        print('f_r test: {}'.format(f_r.dtype))
-        np.set_printoptions(formatter={'float': '{: 0.10f}'.format})
-        print(f_r)
+    def substract_darkframes(self, data, exposure=None, iso=100, temperature=None, timestamp=None):
+        '''
+        Subtracts the master dark in place (uint16 or float32 data).
+        The masters are loaded once per process (calibration.Calibration_store),
+        darks for exposures and temperatures between the calibrated ones are
+        interpolated.
+        :param exposure: exposure of data in us, None: average of all darks
+        :param temperature: sensor (dome) temperature in degree C
+        :param timestamp: capture time (numpy datetime64, local time), used to
+               look up the dome temperature if temperature is None
+        :return: data, clipped at 0
+        '''
+        if temperature is None and timestamp is not None:
+            temperature = self.dome_temperature(timestamp)
 
-        # remap to (2^16) - 1 pixel values
-        upper_limit = (2**16) - 1        # 16 bit
-        red   = cv2.normalize(f_r, f_r, alpha=0, beta=65535, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        green = cv2.normalize(f_g, f_g, alpha=0, beta=65535, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        blue  = cv2.normalize(f_b, f_b, alpha=0, beta=65535, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+        store = get_store(RADIOMETRICALIB)
+        return store.subtract_dark(data, exposure, iso, temperature)
 
-        #a = numpy.array([1.0, 2.0, 3.0], dtype=numpy.float32)
+    def dome_temperature(self, timestamps):
+        '''
+        Dome temperature at capture time(s) from the sensor database
+        (nearest reading, see dometemp.py). None / nan where no reading is close.
+        '''
+        temps = get_dome_temperature(SENSORDB).at(timestamps)
+        if np.ndim(temps) == 0:
+            return None if np.isnan(temps) else float(temps)
+        return temps
 
+    def create_flatfield(self, shape=(1232, 1648, 3), centre=None):
+        '''
+        Renders the flat field gain map of the current model (see flatfield.py)
+        as 16 bit image, e.g. to check it visually.
+        :param shape: shape of a demosaiced image
+        :param centre: sky circle centre (y, x), default image centre
+        '''
+        gain = get_model(FLATFIELD).gain_map(shape, centre)
 
-        test = np.array([0.81638017, 0.81638017,0.81638017, 0.81638017, 0.81638017, 0.81638017])
-        print('Type test: {}'.format(test.dtype))
-        norm_image = cv2.normalize(test, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+        for i, ch in enumerate('rgb'):
+            g = gain[..., i]
+            print('{}: min: {} | max: {} | max-min={}'.format(ch, g.min(), g.max(), g.max() - g.min()))
 
-        image = np.dstack([red, green, blue])
+        # remap to (2^16) - 1 pixel values
+        image = cv2.normalize(gain, None, alpha=0, beta=65535, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
 
         return image          # 16 bit image
 
-    def flatfielding(self, data):
-        #Flat fielding for each demosaiced rgb channel
+    def build_defect_map(self, exposure=50000, iso=100):
+        '''
+        Flags hot, noisy and dead pixels from the master dark (mean and
+        variance) and the master white of `exposure` and writes the sorted
+        index array to the calibration directory (see defects.py).
+        :return: flat indices of the defects
+        '''
+        store = get_store(RADIOMETRICALIB)
+        dark = store.interpolate('dark', exposure, iso)
+        name = 'df_var{}ms.npy'.format(exposure // 1000)
+        dark_var = np.load(join(RADIOMETRICALIB, name)) if os.path.isfile(join(RADIOMETRICALIB, name)) else None
 
-        #data = data.astype('float')
-        # numpy functions on arrays:
-        # https://jakevdp.github.io/PythonDataScienceHandbook/02.03-computation-on-arrays-ufuncs.html
-        # https://stackoverflow.com/questions/24580993/calling-functions-with-parameters-using-a-dictionary-in-python
+        try:
+            white = np.subtract(store.interpolate('white', exposure, iso), dark, dtype=self.precision.work)
+        except KeyError:
+            white = None
 
-        # coefs for the red channel:
-        a0_r = -1.234; a1_r = 1.962;  b1_r = -1.751; a2_r = 0.2604;  b2_r = 0.07941; w_r = -0.0007905
-        # coefs for the green channel:
-        a0_g = 0.4900; a1_g = 0.4123; b1_g = 0.1851; a2_g = 0.09083; b2_g = -0.05701; w_g = 0.001312
-        # coefs for the green channel:
-        a0_b = 0.4935; a1_b = 0.4216; b1_b = 0.1736; a2_b = 0.08101; b2_b = -0.06155; w_b = 0.001284
+        indices = find_defects(dark, dark_var, white)
+        save_defects(indices, join(RADIOMETRICALIB, DEFECTS_NAME))
+        store.cache.pop('defects', None)
+        print('Found {} defect pixels.'.format(len(indices)))
+        return indices
 
-        f_r = lambda x: a0_r + a1_r*np.cos(w_r*x) + b1_r*np.sin(w_r*x) + a2_r*np.cos(2*w_r*x) + b2_r*np.sin(2*w_r*x)
-        f_g = lambda x: a0_g + a1_g*np.cos(w_g*x) + b1_g*np.sin(w_g*x) + a2_g*np.cos(2*w_g*x) + b2_g*np.sin(2*w_g*x)
-        f_b = lambda x: a0_b + a1_b*np.cos(w_b*x) + b1_b*np.sin(w_b*x) + a2_b*np.cos(2*w_b*x) + b2_b*np.sin(2*w_b*x)
+    def correct_defects(self, data):
+        '''
+        Repairs the defect pixels of a raw frame in place, cost proportional
+        to the number of defects.
+        '''
+        return get_store(RADIOMETRICALIB).correct_defects(data)
+
+    def pair_source(self, kind, exposure, path, iso=100, temperature=None):
+        '''
+        Frame pairs of a stack for the photon transfer: the pair statistics
+        collected by a streaming capture, else the single frames in `path`.
+        The temperature bin is selected like the masters (Calibration_store.candidates),
+        so all stacks of one curve come from the same bin.
+        '''
+        temp_bin = None
+        try:
+            temp_bin = get_store(RADIOMETRICALIB).candidates(kind, iso, temperature)[0].get('temperature')
+        except KeyError:
+            pass
+        pairs = join(RADIOMETRICALIB, master_name(kind, exposure, temp_bin) + PAIRS_SUFFIX)
+        if os.path.isfile(pairs):
+            return pairs
+        return sorted(glob(os.path.join(path, '*.data')))
+
+    def photon_transfer(self, tile=32, iso=100, temperature=None):
+        '''
+        Gain, read noise and full well per colour from the white frame
+        stacks (frame pairs) and the 5 ms dark frames, stored in the
+        calibration store as parameters 'ptc' (see ptc.py). Uses the pair
+        statistics of a streaming capture, or single frames kept on disk
+        (streaming=False).
+        :param temperature: dome temperature, selects the temperature bin of the
+               darks and flats like Calibration_store.candidates
+        '''
+        flats = {}
+        for exposure, path in ((5000, WHITEFRAMES_5MS), (50000, WHITEFRAMES_50MS)):
+            flats[exposure] = self.pair_source('white', exposure, path, iso, temperature)
+        darks = self.pair_source('dark', 5000, DARKFRAMES_5MS, iso, temperature)
 
-        red   = data[:, :, 0]
-        green = data[:, :, 1]
-        blue  = data[:, :, 2]
+        store = get_store(RADIOMETRICALIB)
+        result = characterize(flats, darks, store, iso, tile, temperature=temperature)
+        store.set_parameters('ptc', result)
 
-        # normalize pixel values to [0,1]
-        norm_red   = cv2.normalize(red,   None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        norm_green = cv2.normalize(green, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        norm_blue  = cv2.normalize(blue,  None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+        for ch in 'rgb':
+            p = result['channels'][ch]
+            print('{}: gain: {:.3f} e-/DN | read noise: {:.2f} e- | full well: {:.0f} e-'.format(
+                ch, p['gain'], p['read_noise_e'], p['full_well_e']))
 
-        r_f = f_r(norm_red)
-        r_g = f_g(norm_green)
-        r_b = f_b(norm_blue)
+        return result
 
-        # remap to (2^16) - 1 pixel values
+    def fit_flatfield(self, exposure=50000, iso=100, centre=None, max_radius=None, model='fourier2'):
+        '''
+        Fits the flat field model to the master white frame of `exposure`
+        (dark subtracted) and writes it to FLATFIELD, see flatfield.fit_model.
+        '''
+        store = get_store(RADIOMETRICALIB)
+        white = store.interpolate('white', exposure, iso)
+        dark = store.interpolate('dark', exposure, iso)
+        calib = fit_model(white, dark, centre, max_radius, model)
+        save_model(calib, FLATFIELD)
+        MODELS.pop(FLATFIELD, None)
+        print('Flat field model written to {}'.format(FLATFIELD))
+        return calib
+
+    def flatfielding(self, data, centre=None, mode='radial'):
+        '''
+        Flat fielding for each demosaiced rgb channel. The fall off functions are
+        tabulated once per calibration (flatfield.Flatfield_model), applying them
+        is one multiplication with a cached gain map (radial) or one table
+        lookup and multiplication per channel (value, correction f(0) / f(v) of
+        the 10 bit raw value v, the 16 bit input is reduced to it for the lookup).
+        :param data: demosaiced image (h, w, 3), float32 is corrected in place
+        :param centre: sky circle centre (y, x), default image centre
+        :return: corrected 16 bit image
+        '''
+        model = get_model(FLATFIELD)
         upper_limit = (2**16) - 1        # 16 bit
-        red   = cv2.normalize(red,   None, alpha=0, beta=upper_limit, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_16U)
-        green = cv2.normalize(green, None, alpha=0, beta=upper_limit, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_16U)
-        blue  = cv2.normalize(blue,  None, alpha=0, beta=upper_limit, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_16U)
 
-        image = np.dstack([red, green, blue])
+        if mode == 'value':
+            image = model.apply_value(data, input_bits=16)     # demosaic1 output is 16 bit scaled
+        else:
+            image = model.apply_radial(data, centre)
 
-        return image          # 16 bit image
+        np.clip(image, 0, upper_limit, out=image)
+        return image.astype(np.uint16)          # 16 bit image
 
-    def plot_data_histogram(self,path_to_image):
+    def plot_data_histogram(self,path_to_image, xlim=[0, 100]):
 
         '''
-        Plots histogram of one *.data 'image'.
+        Plots the red, green and blue histograms of one *.data 'image'.
 
         :param path_to_image: the path to a single *.data image.
+        :param xlim: shown range of raw values
         :return: nil
         '''
 
-        print('Plotting data histogram, may take a while !')
         if path_to_image:
-            data = np.fromfile(path_to_image, dtype='uint16')
-            plt.hist(data, bins= (65536 - 1)) # 65536 -1
-            plt.xlim([0, 100])
+            hists = file_histograms(path_to_image)
+            fig, ax = plt.subplots()
+            Histogram_plot(ax, hists.shape[1], xlim=xlim).update(hists)
             plt.title('Histogram for data')
             plt.show()
 
@@ -732,7 +777,84 @@ class Camera:
         print('Warm up done!')
         logger.info('Warm up done.')
 
-    def take_darkframe_pictures(self):
+    def capture_stack(self, name, path, count, iso, shutter_speed, legend, streaming=True,
+                      keep_every=0, with_jpg=False, temperature=None, pairs=True):
+        '''
+        Captures a stack of calibration frames.
+        In streaming mode the frames are stacked in memory while the next one is
+        captured and only the master frame (see Imgproc.write_master) is written.
+        Otherwise every frame goes to `path` to be averaged later.
+        :param name: name of the master frame, e.g. 'df_avg5ms'
+        :param path: directory for single frames
+        :param count: number of frames
+        :param legend: format string for the per frame statistics, None for no output
+        :param keep_every: streaming mode: still write every n-th frame to `path`
+        :param with_jpg: write a jpg next to every frame written to `path`
+        :param temperature: temperature bin of the master, see Imgproc.write_master
+        :param pairs: streaming mode: collect the frame pair statistics of the
+               photon transfer curve (ptc.py) as <name>_pairs.npz next to the
+               master, single frames are not needed for Imgproc.photon_transfer
+        :return: stacking.Frame_stacker in streaming mode, else None
+        '''
+        imprc = Imgproc()
+        prec = imprc.precision
+        suffix = name.split('_')[0]           # df / wf
+
+        def print_stats(frame_name, frame_stats):
+            if legend is None:
+                return
+            stats = dict(
+                name = frame_name,
+                mean = '{0:.2f}'.format(frame_stats['mean']),
+                medi = '{0:.2f}'.format(frame_stats['median']),
+                stdv = '{0:.2f}'.format(frame_stats['std']),
+                var  = '{0:.2f}'.format(frame_stats['var']),
+            )
+            print(legend.format(**stats))
+
+        stacker = None
+        pair_stats = None
+        if streaming:
+            pair_stats = Pair_stats() if pairs else None
+            stacker = Background_stacker(Frame_stacker(RAW_SHAPE, dtype=prec.work), print_stats,
+                                         also=[pair_stats] if pair_stats is not None else [])
+
+        for i0 in range(count):
+            dat = self.single_shoot_data(iso, shutter_speed)
+            frame_name = '%s_%s' % (str(i0 + 1), suffix)
+
+            if stacker is not None:
+                stacker.add(frame_name, dat)
+                if keep_every <= 0 or (i0 % keep_every) != 0:
+                    continue
+            else:
+                print_stats(frame_name, frame_stats(dat))
+
+            if with_jpg:
+                img = imprc.demosaic1(dat.astype('uint16'))
+                jpg_name = '{}_{}.jpg'.format(i0 + 1, name.replace('_avg', ''))    # 1_wf5ms.jpg
+                cv2.imwrite(join(path, jpg_name), imprc.toRGB_1(img))
+
+            with open(join(path, frame_name + '.data'), 'wb') as g:
+                dat.tofile(g)
+
+        if stacker is None:
+            return None
+
+        stacker = stacker.close()
+        imprc.write_master(stacker, name, iso, temperature)
+        if pair_stats is not None and pair_stats.pairs > 0:
+            pair_stats.save(join(RADIOMETRICALIB, name + PAIRS_SUFFIX))
+        return stacker
+
+    def take_darkframe_pictures(self, streaming=True, keep_every=0, by_temperature=True):
+        '''
+        :param streaming: stack in memory and write only the master frames
+        :param keep_every: streaming mode: still write every n-th single frame
+        :param by_temperature: streaming mode: file the masters under the
+               current dome temperature bin (df_avg5ms_t20), darks of other
+               temperatures are kept
+        '''
         helper = Helpers()
         s = Logger()
         logger = s.getLogger()
@@ -744,28 +866,32 @@ class Camera:
         helper.createNewFolder(DARKFRAMES_5MS)
         helper.createNewFolder(DARKFRAMES_50MS)
 
-        for i0 in range(200):  # 250 -1
-            dat = self.single_shoot_data(iso, five_ms)
-            #data = improc.data2rgb(dat)
-            datafileName = '%s_df.data' % str(i0 + 1)
-            with open(DARKFRAMES_5MS + "/" + datafileName, 'wb') as g:
-                dat.tofile(g)
+        temp_bin = None
+        if streaming and by_temperature:
+            dome = get_dome_temperature(SENSORDB).now()
+            if np.isnan(dome):
+                print('No current dome temperature, darks are stored without temperature.')
+            else:
+                temp_bin = temperature_bin(dome)
+                print('Dome temperature: {:.1f} C -> temperature bin {} C'.format(dome, temp_bin))
+                logger.info('Dark frames at dome temperature {:.1f} C'.format(dome))
 
-        for i0 in range(200): # 250 -1
-            dat = self.single_shoot_data(iso,fity_ms)
-            #data = improc.data2rgb(dat)
-            datafileName = '%s_df.data' % str(i0 + 1)
-            with open(DARKFRAMES_50MS + "/" + datafileName, 'wb') as g:
-                dat.tofile(g)
+        for exposure, path in ((five_ms, DARKFRAMES_5MS), (fity_ms, DARKFRAMES_50MS)):
+            name = master_name('dark', exposure, temp_bin)
+            self.capture_stack(name, path, 200, iso, exposure, None, streaming, keep_every, temperature=temp_bin)
 
         logger.info('All dark frames taken.')
         print('All dark frame pictures taken')
 
-    def take_whiteframe_pictures(self, with_jpg):
+    def take_whiteframe_pictures(self, with_jpg, streaming=True, keep_every=0):
+        '''
+        :param with_jpg: write a jpg for every single frame written
+        :param streaming: stack in memory and write only the master frames
+        :param keep_every: streaming mode: still write every n-th single frame
+        '''
         helper = Helpers()
         s = Logger()
         logger = s.getLogger()
-        imprc = Imgproc()
 
         five_ms =  5 * 1000   # shutterspeed is in units of microseconds
         fity_ms = 50 * 1000
@@ -773,52 +899,12 @@ class Camera:
 
         helper.createNewFolder(WHITEFRAMES_5MS)
         helper.createNewFolder(WHITEFRAMES_50MS)
-        legend = 'WF 5ms: {df_name}: mean: {df_mean}, median: {df_medi}, std: {df_stdv}, var: {df_var}'
 
-        for i0 in range(200-1):  # 250 -1
-            dat = self.single_shoot_data(iso, five_ms)
-            datafileName = '%s_wf.data' % str(i0 + 1)
+        legend = 'WF 5ms: {name}: mean: {mean}, median: {medi}, std: {stdv}, var: {var}'
+        self.capture_stack('wf_avg5ms', WHITEFRAMES_5MS, 200-1, iso, five_ms, legend, streaming, keep_every, with_jpg)
 
-            stats = dict(
-                df_name = '{}'.format(datafileName.strip('.data').split('/')[-1]),
-                df_mean = '{0:.2f}'.format(np.mean(dat)),
-                df_medi = '{0:.2f}'.format(np.median(dat)),
-                df_stdv = '{0:.2f}'.format(np.std(dat)),
-                df_var  = '{0:.2f}'.format(np.var(dat)),
-            )
-            print(legend.format(**stats))
-
-            if with_jpg:
-                wf_name = '{}_wf5ms.jpg'.format(i0 + 1)
-                img = imprc.demosaic1(dat.astype('uint16'))
-                wf = imprc.toRGB_1(img)
-                cv2.imwrite(join(WHITEFRAMES_5MS, wf_name), wf)
-
-            with open(WHITEFRAMES_5MS + "/" + datafileName, 'wb') as g:
-                dat.tofile(g)
-
-        legend = 'WF 50ms: {df_name}: mean: {df_mean}, median: {df_medi}, std: {df_stdv}, var: {df_var}'
-        for i0 in range(200-1): # 250 -1
-            dat = self.single_shoot_data(iso,fity_ms)
-            datafileName = '%s_wf.data' % str(i0 + 1)
-
-            stats = dict(
-                df_name = '{}'.format(datafileName.strip('.data').split('/')[-1]),
-                df_mean = '{0:.2f}'.format(np.mean(dat)),
-                df_medi = '{0:.2f}'.format(np.median(dat)),
-                df_stdv = '{0:.2f}'.format(np.std(dat)),
-                df_var  = '{0:.2f}'.format(np.var(dat)),
-            )
-            print(legend.format(**stats))
-
-            if with_jpg:
-                wf_name = '{}_wf50ms.jpg'.format(i0 + 1)
-                img = imprc.demosaic1(dat.astype('uint16'))
-                wf = imprc.toRGB_1(img)
-                cv2.imwrite(join(WHITEFRAMES_50MS, wf_name), wf)
-
-            with open(WHITEFRAMES_50MS+ "/" + datafileName, 'wb') as g:
-                dat.tofile(g)
+        legend = 'WF 50ms: {name}: mean: {mean}, median: {medi}, std: {stdv}, var: {var}'
+        self.capture_stack('wf_avg50ms', WHITEFRAMES_50MS, 200-1, iso, fity_ms, legend, streaming, keep_every, with_jpg)
 
         logger.info('All white frames taken.')
         print('All white frames taken')
@@ -840,6 +926,9 @@ def main():
 
         take_whiteframes = False
         take_darkframes  = False
+        streaming = True    # stack while capturing, writes the master frames directly
+        average_frames = False  # average the single frames on disk (former default of main),
+                                # replaces the master frames of a streaming capture
 
         if sys.platform == "linux":
             picam = picamera.PiCamera()
@@ -847,16 +936,16 @@ def main():
             camera.warm_up()
 
             if take_darkframes:
-                camera.take_darkframe_pictures()
+                camera.take_darkframe_pictures(streaming)
 
             if take_whiteframes:
-                camera.take_whiteframe_pictures(True)
+                camera.take_whiteframe_pictures(True, streaming)
 
         # imprc.plot_data_histogram(DATAPATH)
 
-
-        imprc.average_darkframes()
-        # imprc.average_whiteframes()
+        if average_frames or not streaming:
+            imprc.average_darkframes()
+            # imprc.average_whiteframes()
 
 
         cb = Color_Balance()
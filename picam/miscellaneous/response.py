@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+from hdrmerge import read_exposures
+from camstats import session_camera
+from fusion import bracket_jpgs, JPG_NAME
+from thumbnails import decode_scaled
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : response.py
+######################################################################
+# Camera response curve of the jpgs (Debevec & Malik): for every jpg
+# value z the log exposure g(z) = ln(E * t) that produced it.
+#
+# The same pixel in two jpgs of a bracket gives one equation
+#     g(z_i) - g(z_j) = ln t_i - ln t_j
+# Only a few thousand random pixel positions per session are read (of
+# the jpgs decoded at reduced size, SAMPLE_SCALE) and
+# every equation is folded into the normal equations of the 256
+# unknowns per channel (bincount), so any number of sessions is used in
+# constant memory. A smoothness term on g'' fills values without
+# samples, g(128) = 0 fixes the scale.
+#
+# The result is cached per camera as table of 256 entries per channel
+# (response.json). Linearizing a jpg is one table lookup (cv2.LUT):
+#     Response.linearize(img) -> relative exposure, 1 at z = 128
+#
+# Use: python response.py /path/to/picam_data -n 200 --camera 2
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : camera ID from the structured capture records
+# 19.10.2026 : samples read from reduced size decodes instead of full jpgs
+#
+######################################################################
+
+global RESPONSE_FILE
+
+RESPONSE_FILE = os.path.join('/home', 'pi', 'python_scripts', 'picam', 'radiometric', 'response.json')
+RESPONSE_VERSION = 1
+SAMPLES = 4000          # pixel positions per session
+SAMPLE_SCALE = 0.25     # jpgs decoded at 1/4 size (jpg DCT scaling) to sample them
+SMOOTHNESS = 50.0
+ANCHOR = 128
+
+POSITIONS = {}          # (shape, count, seed) -> flat pixel indices
+
+
+def hat_weight():
+    '''
+    Weight per jpg value, 0 for clipped values.
+    '''
+    z = np.arange(256, dtype=np.float64)
+    w = np.minimum(z, 255 - z) / 127.5
+    w[:3] = 0
+    w[-3:] = 0
+    return w
+
+
+def sample_positions(shape, count=SAMPLES, seed=0):
+    '''
+    Random pixel positions, the same for every session of one size (cached).
+    '''
+    key = (tuple(shape[:2]), count, seed)
+    if key not in POSITIONS:
+        rng = np.random.RandomState(seed)
+        POSITIONS[key] = np.sort(rng.choice(shape[0] * shape[1], min(count, shape[0] * shape[1]), replace=False))
+    return POSITIONS[key]
+
+
+def session_samples(session_dir, count=SAMPLES, scale=SAMPLE_SCALE):
+    '''
+    Values of the sampled pixels in every jpg of a bracket.
+    :param scale: decode size, the positions are drawn in the reduced image
+    :return: tuple (uint8 array (images, count, 3), log exposures) or None
+    '''
+    jpgs = bracket_jpgs(session_dir)
+    exposures = read_exposures(session_dir)
+    if len(jpgs) < 2:
+        return None
+
+    values = []
+    log_t = []
+    for path in jpgs:
+        key = int(JPG_NAME.match(os.path.basename(path)).group(1))
+        try:
+            img = decode_scaled(path, scale)
+        except IOError:
+            return None
+        positions = sample_positions(img.shape, count)
+        values.append(img.reshape(-1, 3)[positions])
+        # without camstats the keys are F stops
+        log_t.append(np.log(exposures[key]) if key in exposures else key * np.log(2.0))
+
+    return np.array(values), np.array(log_t)
+
+
+class Response_solver:
+    """
+    Normal equations of the response curve, filled session by session.
+
+    EXAMPLE:
+      solver = Response_solver()
+      for session_dir in sessions:
+          solver.add(*session_samples(session_dir))
+      g = solver.solve()
+    """
+    def __init__(self):
+        self.normal = np.zeros((3, 256 * 256), dtype=np.float64)
+        self.rhs = np.zeros((3, 256), dtype=np.float64)
+        self.weight = hat_weight()
+        self.equations = 0
+        self.sessions = 0
+
+    def add(self, values, log_t):
+        '''
+        :param values: uint8 array (images, samples, 3)
+        :param log_t: log exposure per image
+        '''
+        order = np.argsort(log_t)
+        for a, b in zip(order[:-1], order[1:]):       # neighbouring exposures
+            d = log_t[a] - log_t[b]
+            for c in range(3):
+                za = values[a, :, c].astype(np.intp)
+                zb = values[b, :, c].astype(np.intp)
+                w = self.weight[za] * self.weight[zb]
+                use = w > 0
+                za, zb, w = za[use], zb[use], w[use]
+
+                # (g[za] - g[zb] - d)^2 * w  ->  A^T W A, A^T W d
+                self.normal[c] += np.bincount(za * 256 + za, w, 256 * 256)
+                self.normal[c] += np.bincount(zb * 256 + zb, w, 256 * 256)
+                self.normal[c] -= np.bincount(za * 256 + zb, w, 256 * 256)
+                self.normal[c] -= np.bincount(zb * 256 + za, w, 256 * 256)
+                self.rhs[c] += np.bincount(za, w * d, 256)
+                self.rhs[c] -= np.bincount(zb, w * d, 256)
+                self.equations += int(use.sum())
+        self.sessions += 1
+
+    def solve(self, smoothness=SMOOTHNESS):
+        '''
+        :return: g as float64 array (3, 256), g[:, ANCHOR] = 0, non decreasing
+        '''
+        # second differences, weighted like the data
+        d2 = np.zeros((254, 256))
+        idx = np.arange(254)
+        d2[idx, idx] = 1
+        d2[idx, idx + 1] = -2
+        d2[idx, idx + 2] = 1
+        d2 *= self.weight[1:-1, None] + 0.1
+        smooth = smoothness * np.dot(d2.T, d2)
+
+        g = np.zeros((3, 256))
+        scale = max(self.normal.max(), 1.0)
+        for c in range(3):
+            normal = self.normal[c].reshape(256, 256) + smooth * scale / 1000.0
+            normal[ANCHOR, ANCHOR] += 1e3 * scale
+            g[c] = np.linalg.solve(normal, self.rhs[c])
+            g[c] -= g[c, ANCHOR]
+            g[c] = np.maximum.accumulate(g[c])
+
+        return g
+
+
+class Response:
+    """
+    Response curve of one camera.
+
+    EXAMPLE:
+      linear = get_response(camera_id=2).linearize(cv2.imread('raw_img0.jpg'))
+    """
+    def __init__(self, g):
+        self.g = np.asarray(g, dtype=np.float64)
+        # relative exposure per jpg value and channel, 1 at ANCHOR
+        self.table = np.exp(self.g).astype(np.float32)
+        self.lut = self.table.T.reshape(1, 256, 3).copy()
+        self.gray = np.exp(self.g.mean(axis=0)).astype(np.float32)
+
+    def linearize(self, img):
+        '''
+        :param img: uint8 image, BGR (3 channels) or gray
+        :return: float32 relative exposure
+        '''
+        if img.ndim == 2:
+            return self.gray[img]
+        return cv2.LUT(img, self.lut)
+
+
+def solve_sessions(sessions, count=SAMPLES, smoothness=SMOOTHNESS):
+    '''
+    Response curve from the brackets of the given session directories.
+    :return: tuple (g, solver)
+    '''
+    solver = Response_solver()
+    for session_dir in sessions:
+        try:
+            samples = session_samples(session_dir, count)
+            if samples is not None:
+                solver.add(*samples)
+        except Exception as e:
+            print('Error in solve_sessions: {}: {}'.format(session_dir, e))
+
+    if solver.sessions == 0:
+        raise ValueError('No brackets found')
+
+    return solver.solve(smoothness), solver
+
+
+def save_response(g, camera_id, path=RESPONSE_FILE, sessions=0):
+    '''
+    Stores the curve of one camera in the response file (all cameras).
+    '''
+    content = {}
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            content = json.load(f)
+    content[str(camera_id)] = dict(version=RESPONSE_VERSION, created=time.strftime('%Y-%m-%d %H:%M:%S'),
+                                   sessions=sessions, anchor=ANCHOR, g=np.round(g, 6).tolist())
+    with open(path + '.tmp', 'w') as f:
+        json.dump(content, f)
+    os.rename(path + '.tmp', path)
+    RESPONSES.pop((path, str(camera_id)), None)
+
+
+RESPONSES = {}
+
+
+def get_response(camera_id, path=RESPONSE_FILE):
+    '''
+    Cached Response of a camera, None if it was never estimated.
+    '''
+    key = (path, str(camera_id))
+    if key not in RESPONSES:
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r') as f:
+            entry = json.load(f).get(str(camera_id))
+        if entry is None:
+            return None
+        RESPONSES[key] = Response(entry['g'])
+    return RESPONSES[key]
+
+
+def find_sessions(root, camera_id=None, limit=None, seed=0):
+    '''
+    Session directories with a jpg bracket, optionally of one camera only,
+    `limit` of them spread randomly over the archive.
+    '''
+    sessions = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if sum(1 for f in filenames if JPG_NAME.match(f)) < 2:
+            continue
+        if camera_id is not None and session_camera(dirpath) != camera_id:
+            continue
+        sessions.append(dirpath)
+
+    if limit is not None and len(sessions) > limit:
+        rng = np.random.RandomState(seed)
+        sessions = [sessions[i] for i in sorted(rng.choice(len(sessions), limit, replace=False))]
+    return sessions
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Estimate the jpg response curve from bracket history.')
+        parser.add_argument('root', help='session, day or archive directory')
+        parser.add_argument('--camera', type=int, default=None, help='camera ID (camstats), default: all')
+        parser.add_argument('-n', '--sessions', type=int, default=200, help='number of sessions sampled')
+        parser.add_argument('-s', '--samples', type=int, default=SAMPLES, help='pixels per session')
+        parser.add_argument('-o', '--out', default=RESPONSE_FILE, help='response file')
+        args = parser.parse_args()
+
+        t_start = time.time()
+        sessions = find_sessions(args.root, args.camera, args.sessions)
+        g, solver = solve_sessions(sessions, args.samples)
+        camera_id = args.camera if args.camera is not None else 'default'
+        save_response(g, camera_id, args.out, solver.sessions)
+
+        print('Response of camera {} from {} sessions, {} equations in {:.1f} s -> {}'.format(
+            camera_id, solver.sessions, solver.equations, time.time() - t_start, args.out))
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+import os
+import csv
+import time
+import fnmatch
+import argparse
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import cv2
+from histogram import sky_mask, image_histograms
+from stacking import histogram_stats
+from thumbnails import thumbnail, THUMB_DIR, SCALE
+from response import get_response
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : scanner.py
+######################################################################
+# Scans the jpgs of an archive: brightness, histogram summary and
+# thumbnail of every image from a single decode.
+#
+# cv2 releases the GIL while decoding, the images are therefore read
+# and metered in a thread pool. The image is decoded at reduced size
+# (thumbnails.py), the thumbnail written to the cache on the way, images
+# with a cached thumbnail are not decoded again.
+#
+# scan() is a generator, results come in the order of the files while
+# the pool works ahead. Throughput is reported in images/s.
+#
+# Use: python scanner.py /path/to/day --name raw_img0.jpg -j 4 -o scan.csv
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : brightness of masked images measured on the masked image
+#
+######################################################################
+
+global REPORT_EVERY
+REPORT_EVERY = 500      # images between throughput messages
+
+
+def brightness(img, mask=None):
+    '''
+    Average brightness like analyze.avgbrightness: mean gray value of the
+    image reduced to 128 x 96.
+    :param img: BGR uint8
+    :param mask: sky mask, outside is black as in the masked images of analyze.py
+    '''
+    if mask is not None:
+        img = np.where(mask[..., None], img, 0).astype(img.dtype)
+    small = cv2.resize(img, (128, 96), interpolation=cv2.INTER_AREA) if img.shape[1] > 128 else img
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return round(float(gray.mean()), 2)
+
+
+def histogram_summary(hists):
+    '''
+    Summary of per channel histograms.
+    :param hists: int64 array (3, 256), BGR
+    :return: dict with mean, median, std, dark (fraction at 0), clipped
+             (fraction at 255), each a list red, green, blue
+    '''
+    summary = dict(mean=[], median=[], std=[], dark=[], clipped=[])
+    for hist in hists[::-1]:
+        n = float(max(hist.sum(), 1))
+        stats = histogram_stats(hist) if hist.sum() > 0 else dict(mean=0.0, median=0.0, std=0.0)
+        for key in ('mean', 'median', 'std'):
+            summary[key].append(round(float(stats[key]), 3))
+        summary['dark'].append(round(float(hist[0]) / n, 5))
+        summary['clipped'].append(round(float(hist[-1]) / n, 5))
+    return summary
+
+
+def meter(path, cache_dir=None, scale=SCALE, sky=None, response=None, keep_thumbnail=False):
+    '''
+    Decodes one image once and meters it.
+    :param sky: None, or (centre, radius) of a circular mask in pixels of the original
+    :param response: response.Response for the linear brightness, optional
+    :return: dict path, brightness, hist (RGB, 3 x 256), histogram summary, optionally
+             linear and thumbnail (RGB)
+    '''
+    img = thumbnail(path, cache_dir, scale)
+    mask = None
+    if sky is not None:
+        centre, radius = sky
+        mask = sky_mask(img.shape, [int(c * scale) for c in centre], int(radius * scale))
+
+    hists = image_histograms(img, mask)
+    result = dict(path=path, brightness=brightness(img, mask), hist=hists[::-1])
+    result.update(histogram_summary(hists))
+    if response is not None:
+        linear = response.linearize(img)
+        result['linear'] = round(float(linear[mask].mean() if mask is not None else linear.mean()), 5)
+    if keep_thumbnail:
+        result['thumbnail'] = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    return result
+
+
+def scan(paths, workers=None, cache_dir=None, scale=SCALE, sky=None, response=None, keep_thumbnail=False,
+         report=REPORT_EVERY):
+    '''
+    Meters images in a thread pool.
+    :return: generator of meter() results in the order of paths, None for
+             files that could not be read
+    '''
+    paths = list(paths)
+    workers = workers or cpu_count()
+
+    def work(path):
+        try:
+            return meter(path, cache_dir, scale, sky, response, keep_thumbnail)
+        except Exception as e:
+            print('Error in scan: {}: {}'.format(path, e))
+            return None
+
+    t_start = time.time()
+    done = 0
+    pool = ThreadPool(workers)
+    try:
+        for result in pool.imap(work, paths):
+            done += 1
+            if report and done % report == 0:
+                print('{} / {} images, {:.1f} images/s'.format(done, len(paths), done / (time.time() - t_start)))
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+    elapsed = max(time.time() - t_start, 1e-6)
+    print('Scanned {} images in {:.1f} s, {:.1f} images/s ({} threads)'.format(done, elapsed, done / elapsed, workers))
+
+
+def find_images(root, name='*.jpg'):
+    '''
+    Image files below root matching `name`, without the thumbnail folders.
+    '''
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != THUMB_DIR)
+        found.extend(os.path.join(dirpath, f) for f in sorted(filenames) if fnmatch.fnmatch(f, name))
+    return found
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Meter the jpgs of an archive in parallel.')
+        parser.add_argument('root', help='day or archive directory')
+        parser.add_argument('-n', '--name', default='*.jpg', help='file name pattern, e.g. raw_img0.jpg')
+        parser.add_argument('-j', '--jobs', type=int, default=None, help='number of threads')
+        parser.add_argument('-s', '--scale', type=float, default=SCALE, help='decode size')
+        parser.add_argument('-o', '--out', default=None, help='csv file of the results')
+        parser.add_argument('--camera', default=None, help='camera ID for the linear brightness (response.py)')
+        parser.add_argument('--no-cache', action='store_true', help='do not write thumbnails')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        cache_dir = None if args.no_cache else os.path.join(args.root, THUMB_DIR)
+        response = get_response(args.camera) if args.camera is not None else None
+        columns = ['path', 'brightness', 'mean', 'median', 'std', 'dark', 'clipped'] + (['linear'] if response else [])
+
+        out = open(args.out, 'w') if args.out else None
+        try:
+            writer = csv.writer(out) if out else None
+            if writer:
+                writer.writerow(columns)
+            for result in scan(find_images(args.root, args.name), args.jobs, cache_dir, args.scale, response=response):
+                if result is not None and writer:
+                    writer.writerow([' '.join(str(v) for v in result[c]) if isinstance(result[c], list) else result[c]
+                                     for c in columns])
+        finally:
+            if out:
+                out.close()
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
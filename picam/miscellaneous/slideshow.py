@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+import time
+import numpy as np
+from matplotlib import pyplot as plt
+from histogram import image_histograms, Histogram_plot
+from scanner import brightness
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : slideshow.py
+######################################################################
+# Slide show of an image collection with histogram, for analyze.py.
+#
+# The figure is built once. Image, histogram lines and texts are
+# animated artists: per frame only their data is replaced and they are
+# drawn onto a saved copy of the static background (blitting) instead of
+# redrawing the whole figure. Histograms and brightness come precomputed
+# from the metrics index (metrics.py), the images from the prefetching
+# thumbnail loader (thumbnails.py). Images without a row in the index
+# are measured in the prefetch thread, the show starts at once.
+#
+# The frames are paced to the requested interval, the reached frame
+# rate is printed at the end.
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : images missing in the metrics index measured while loading
+#
+######################################################################
+
+HIST_AXES = [0.645, 0.6, 0.35, 0.35]    # left, bottom, width, height
+
+
+class Slide_show:
+    """
+    Blitting slide show.
+
+    EXAMPLE:
+      show = Slide_show(Images(paths), brightness, index.histograms(paths), interval=0.3)
+      show.run()
+    """
+    def __init__(self, images, brightness=None, histograms=None, interval=0.5, fig=None):
+        '''
+        :param images: thumbnails.Images
+        :param brightness: brightness per image, None or nan (not in the index) to
+               compute while loading
+        :param histograms: array (n, 3, 256) RGB per image, None to compute while loading
+        :param interval: [s] per frame
+        '''
+        self.images = images
+        self.brightness = None if brightness is None else np.asarray(brightness, dtype=np.float64)
+        self.histograms = histograms
+        self.complete = (self.brightness is not None and histograms is not None
+                         and not np.isnan(self.brightness).any())
+        self.interval = interval
+        self.fig = fig if fig is not None else plt.gcf()
+        self.ax = self.fig.gca()
+        self.ax.set_xlabel('[pixel]')
+        self.ax.set_ylabel('[pixel]')
+        self.ax_hist = self.fig.add_axes(HIST_AXES)
+        self.hist_plot = Histogram_plot(self.ax_hist, 256, first=1, last=255, xlim=[0, 256],
+                                        normalize=True, animated=True)
+        self.text = self.ax_hist.text(0.25, 0.9, '', fontsize=12, color='black',
+                                      transform=self.ax_hist.transAxes, animated=True)
+        self.title = self.ax.text(0.5, 1.01, '', ha='center', va='bottom', fontsize=12,
+                                  transform=self.ax.transAxes, animated=True)
+        self.image = None
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def artists(self):
+        return [self.image, self.title, self.text] + self.hist_plot.lines
+
+    def on_draw(self, event):
+        '''
+        Full redraws (first frame, window resized) renew the background.
+        '''
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists():
+            artist.axes.draw_artist(artist)
+
+    def show_frame(self, index, img, avgb, hist):
+        if self.image is None:
+            self.image = self.ax.imshow(img, animated=True)
+            self.title.set_text('Image: {}'.format(index))
+            self.text.set_text(r'avgbrg: ' + str(avgb))
+            self.hist_plot.update(hist)
+            self.fig.canvas.draw()          # background, calls on_draw
+            return
+
+        self.image.set_data(img)
+        self.title.set_text('Image: {}'.format(index))
+        self.text.set_text(r'avgbrg: ' + str(avgb))
+        self.hist_plot.update(hist)
+
+        self.fig.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.fig.canvas.blit(self.fig.bbox)
+
+    def process(self, img):
+        '''
+        Brightness and histograms of images without precomputed values,
+        runs in the prefetch thread.
+        '''
+        if self.complete:
+            return None
+        return brightness(img), image_histograms(img)
+
+    def run(self, start=0):
+        '''
+        Shows the images from `start` on.
+        :return: number of frames shown
+        '''
+        plt.show(block=False)
+        shown = 0
+        t_start = time.time()
+        t_next = t_start
+        for index, img, computed in self.images.prefetch(start, process=self.process):
+            avgb = self.brightness[index] if self.brightness is not None else np.nan
+            hist = self.histograms[index] if self.histograms is not None else None
+            if computed is not None and (np.isnan(avgb) or hist is None):
+                avgb, hist = computed
+
+            self.show_frame(index, img, avgb, hist)
+            shown += 1
+
+            # keep the pace, handle window events in the remaining time
+            t_next += self.interval
+            self.fig.canvas.flush_events()
+            remaining = t_next - time.time()
+            if remaining > 0:
+                self.fig.canvas.start_event_loop(remaining)
+            else:
+                t_next = time.time()        # too slow: no catching up in bursts
+            if not plt.fignum_exists(self.fig.number):
+                break
+
+        elapsed = max(time.time() - t_start, 1e-6)
+        print('Showed {} images in {:.1f} s, {:.1f} frames/s (target {:.1f})'.format(
+            shown, elapsed, shown / elapsed, 1.0 / self.interval))
+        return shown
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+
+import threading
+from multiprocessing import Pool
+import numpy as np
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : stacking.py
+######################################################################
+# Single pass stacking of dark- and white frames.
+# Used by radiometric.py to build the master calibration frames.
+#
+# Every frame is read once and folded into a running mean and variance
+# (Welford's algorithm), so neither the stack nor a per frame float64
+# copy is ever held in memory. Optionally pixels deviating more than
+# `sigma_clip` standard deviations from the running estimate are
+# rejected (cosmic rays, hot pixel flicker), the number of accepted
+# samples per pixel is kept in a count map.
+#
+# Per frame summary statistics (mean, median, std, var) come from one
+# histogram of the integer frame instead of separate mean/median/std/var
+# calls (median without sorting the frame).
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : Prefetching reader, parallel stacking of exposure groups
+# 19.10.2026 : Background stacker for stacking while capturing
+# 19.10.2026 : Background stacker also feeds other accumulators (ptc pair statistics)
+# 19.10.2026 : Frame statistics reported per frame when stacking in one process
+#
+######################################################################
+
+global RAW_SHAPE
+RAW_SHAPE = (2464, 3296)
+
+HIST_CHUNK_ROWS = 256   # rows per bincount call, bounds the intp temporary
+
+
+def frame_histogram(frame):
+    '''
+    Histogram of an integer frame over its full native range.
+    :param frame: uint8 / uint16 array
+    :return: int64 array with 2**bits entries
+    '''
+    nbins = 1 << (8 * frame.dtype.itemsize)
+    frame = frame.reshape(frame.shape[0], -1)
+    hist = np.zeros(nbins, dtype=np.int64)
+    for row in range(0, frame.shape[0], HIST_CHUNK_ROWS):
+        hist += np.bincount(frame[row:row + HIST_CHUNK_ROWS].ravel(), minlength=nbins)
+
+    return hist
+
+
+def histogram_stats(hist):
+    '''
+    Mean, median, std and variance from a histogram.
+    :param hist: counts per integer value
+    :return: dict with mean, median, std, var
+    '''
+    values = np.arange(hist.size, dtype=np.float64)
+    n = hist.sum()
+    mean = np.dot(hist, values) / n
+    var = np.dot(hist, values * values) / n - mean * mean
+    median = np.searchsorted(np.cumsum(hist), (n + 1) // 2)
+
+    return dict(mean=mean, median=float(median), std=np.sqrt(max(var, 0.0)), var=max(var, 0.0))
+
+
+def frame_stats(frame):
+    '''
+    Summary statistics of one raw frame from a single reduction.
+    '''
+    return histogram_stats(frame_histogram(frame))
+
+
+class Frame_stacker:
+    """
+    Running mean / variance over a stack of frames.
+
+    EXAMPLE:
+      stacker = Frame_stacker(sigma_clip=5)
+      for frame in frames:
+          stacker.add(frame)
+      mean, var, count = stacker.mean, stacker.variance(), stacker.count
+    """
+    def __init__(self, shape=RAW_SHAPE, sigma_clip=None, clip_after=10, min_std=1.0, dtype=np.float32):
+        '''
+        :param shape: frame shape
+        :param sigma_clip: reject samples further than sigma_clip * std from
+               the running mean. None disables clipping.
+        :param clip_after: number of frames before clipping starts, the
+               running estimate is too noisy before.
+        :param min_std: lower bound of std used for clipping, avoids rejecting
+               everything in pixels that had constant values so far.
+        :param dtype: dtype of the mean / variance maps
+        '''
+        self.shape = tuple(shape)
+        self.sigma_clip = sigma_clip
+        self.clip_after = clip_after
+        self.min_std = min_std
+        self.dtype = np.dtype(dtype)
+        self.n = 0
+        self.mean = np.zeros(self.shape, dtype=self.dtype)
+        self.m2 = np.zeros(self.shape, dtype=self.dtype)
+        self.count = np.zeros(self.shape, dtype=np.uint16)
+
+    def clipping(self):
+        return self.sigma_clip is not None and self.n >= self.clip_after
+
+    def add(self, frame):
+        '''
+        Folds one frame into the running statistics.
+        :param frame: raw frame, any shape with self.shape elements
+        :return: per frame summary statistics, see frame_stats
+        '''
+        frame = frame.reshape(self.shape)
+        stats = frame_stats(frame) if frame.dtype.kind == 'u' else None
+
+        x = frame.astype(self.dtype)
+        delta = x - self.mean
+
+        if self.clipping():
+            limit = self.variance()
+            np.sqrt(limit, out=limit)
+            np.maximum(limit, self.min_std, out=limit)
+            limit *= self.sigma_clip
+            accept = np.abs(delta) <= limit
+            self.count += accept
+            delta *= accept
+            # pixels without any accepted sample keep mean 0
+            limit[...] = self.count
+            np.maximum(limit, 1, out=limit)
+            self.mean += delta / limit
+        else:
+            # no sample rejected so far, all pixels share the same count
+            self.count += 1
+            self.mean += delta / (self.n + 1)
+
+        x -= self.mean
+        x *= delta
+        self.m2 += x
+        self.n += 1
+
+        return stats
+
+    def merge(self, other):
+        '''
+        Combines the statistics of another stacker (Chan et al. parallel
+        variance), e.g. of a worker that stacked a different part of the stack.
+        '''
+        n_a = self.count.astype(self.dtype)
+        n_b = other.count.astype(self.dtype)
+        n = n_a + n_b
+        np.maximum(n, 1, out=n)
+
+        delta = other.mean - self.mean
+        self.mean += delta * (n_b / n)
+        delta *= delta
+        delta *= n_a * n_b / n
+        self.m2 += other.m2
+        self.m2 += delta
+        self.count += other.count
+        self.n += other.n
+
+    def variance(self):
+        '''
+        Unbiased per pixel variance (float map, 0 where count < 2).
+        '''
+        denom = self.count.astype(self.dtype)
+        denom -= 1
+        np.maximum(denom, 1, out=denom)
+        return self.m2 / denom
+
+    def save(self, path_to_mean, path_to_var=None, path_to_count=None):
+        '''
+        Writes the mean as raw uint16 (*.data, like the former averaged
+        frames) and optionally variance (float32) and count (uint16) maps as npy.
+        '''
+        mean = np.rint(self.mean)
+        np.clip(mean, 0, 2 ** 16 - 1, out=mean)
+        with open(path_to_mean, 'wb') as g:
+            mean.astype(np.uint16).tofile(g)
+
+        if path_to_var is not None:
+            np.save(path_to_var, self.variance().astype(np.float32))
+
+        if path_to_count is not None:
+            np.save(path_to_count, self.count)
+
+
+class Prefetch_reader:
+    """
+    Iterates over (file, frame) while a background thread already reads
+    the next frames. np.fromfile releases the GIL, so reading the next
+    frame overlaps with reducing the current one.
+
+    EXAMPLE:
+      for file, frame in Prefetch_reader(files):
+          stacker.add(frame)
+    """
+    def __init__(self, files, dtype='uint16', depth=2):
+        self.files = list(files)
+        self.dtype = dtype
+        self.frames = queue.Queue(maxsize=depth)
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.read_all)
+        self.thread.daemon = True
+
+    def read_all(self):
+        try:
+            for file in self.files:
+                if self.stop.is_set():
+                    return
+                self.frames.put((file, np.fromfile(file, dtype=self.dtype), None))
+        except Exception as e:
+            self.frames.put((None, None, e))
+            return
+        self.frames.put((None, None, None))
+
+    def __iter__(self):
+        self.thread.start()
+        try:
+            while True:
+                file, frame, error = self.frames.get()
+                if error is not None:
+                    raise error
+                if file is None:
+                    return
+                yield file, frame
+        finally:
+            # consumer stopped early: let the reader thread run out
+            self.stop.set()
+            while self.thread.is_alive():
+                try:
+                    self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+class Background_stacker:
+    """
+    Feeds a Frame_stacker from a background thread. Used at capture time:
+    the camera takes the next frame while the previous one is folded into
+    the running statistics, no frame has to be written to disk.
+
+    EXAMPLE:
+      stacker = Background_stacker(Frame_stacker())
+      for i in range(200):
+          stacker.add('{}_df'.format(i), camera.single_shoot_data(iso, ss))
+      stacker = stacker.close()
+    """
+    def __init__(self, stacker, callback=None, depth=1, also=()):
+        '''
+        :param stacker: Frame_stacker
+        :param callback: called as callback(name, stats) after every frame,
+               from the background thread
+        :param depth: number of frames waiting to be stacked
+        :param also: more accumulators with add(frame) fed with every frame
+               in the same thread, e.g. ptc.Pair_stats
+        '''
+        self.stacker = stacker
+        self.also = list(also)
+        self.callback = callback
+        self.error = None
+        self.frames = queue.Queue(maxsize=depth)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            name, frame = item
+            try:
+                stats = self.stacker.add(frame)
+                for other in self.also:
+                    other.add(frame)
+                if self.callback is not None:
+                    self.callback(name, stats)
+            except Exception as e:
+                self.error = e
+
+    def add(self, name, frame):
+        '''
+        Queues a frame, blocks while `depth` frames are still waiting.
+        '''
+        if self.error is not None:
+            raise self.error
+        self.frames.put((name, frame))
+
+    def close(self):
+        '''
+        Waits until all queued frames are stacked.
+        :return: Frame_stacker
+        '''
+        self.frames.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+        return self.stacker
+
+
+def stack_files(files, shape=RAW_SHAPE, sigma_clip=None, dtype='uint16', callback=None, work='float32'):
+    '''
+    Stacks a list of raw *.data files, reading ahead on a background thread.
+    :param callback: called as callback(file, stats) after every frame
+    :return: Frame_stacker
+    '''
+    stacker = Frame_stacker(shape, sigma_clip, dtype=work)
+    for file, frame in Prefetch_reader(files, dtype):
+        stats = stacker.add(frame)
+        if callback is not None:
+            callback(file, stats)
+
+    return stacker
+
+
+def stack_chunk(job):
+    '''
+    Worker: stacks one part of an exposure group. Runs in a pool process.
+    :param job: tuple (group name, files, shape, sigma_clip, dtype, work)
+    :return: tuple (group name, Frame_stacker, list of (file, stats))
+    '''
+    name, files, shape, sigma_clip, dtype, work = job
+    frame_stats = []
+    stacker = stack_files(files, shape, sigma_clip, dtype,
+                          lambda file, stats: frame_stats.append((file, stats)), work)
+
+    return name, stacker, frame_stats
+
+
+def split_stack(files, parts):
+    '''
+    Splits a file list into `parts` contiguous chunks of nearly equal size.
+    '''
+    parts = max(1, min(parts, len(files)))
+    size, rest = divmod(len(files), parts)
+    chunks = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < rest else 0)
+        chunks.append(files[start:end])
+        start = end
+
+    return chunks
+
+
+def stack_groups(groups, workers=1, min_chunk=20, shape=RAW_SHAPE, sigma_clip=None,
+                 dtype='uint16', work='float32', callback=None):
+    '''
+    Stacks any number of exposure groups, e.g. {'df_avg5ms': files_5ms,
+    'df_avg50ms': files_50ms}. With workers > 1 every group is split into
+    chunks of at least `min_chunk` frames, the chunks are stacked in
+    worker processes and their partial results merged (Frame_stacker.merge).
+    Sigma clipping then works per chunk against each chunk's own estimate.
+    :param callback: called as callback(group name, file, stats) per frame:
+           with one worker as soon as the frame is stacked, with worker
+           processes in the parent process after the worker of that chunk finished
+    :return: dict group name -> Frame_stacker
+    '''
+    jobs = []
+    for name in sorted(groups):
+        files = list(groups[name])
+        if not files:
+            continue
+        parts = len(files) // min_chunk if workers > 1 else 1
+        for chunk in split_stack(files, min(max(parts, 1), workers)):
+            jobs.append((name, chunk, shape, sigma_clip, dtype, work))
+
+    def collect(results, merged):
+        for name, stacker, frame_stats in results:
+            if callback is not None:
+                for file, stats in frame_stats:
+                    callback(name, file, stats)
+            if name in merged:
+                merged[name].merge(stacker)
+            else:
+                merged[name] = stacker
+
+    merged = {}
+    if workers > 1 and len(jobs) > 1:
+        pool = Pool(min(workers, len(jobs)))
+        try:
+            # imap keeps job order, chunks of a group are merged in file order
+            collect(pool.imap(stack_chunk, jobs), merged)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        # single process: report every frame as it is stacked
+        for name, files, shape, sigma_clip, dtype, work in jobs:
+            per_frame = None
+            if callback is not None:
+                per_frame = lambda file, stats, name=name: callback(name, file, stats)
+            collect([(name, stack_files(files, shape, sigma_clip, dtype, per_frame, work), [])], merged)
+
+    return merged
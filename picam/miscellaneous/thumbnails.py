@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import os
+import hashlib
+import threading
+import cv2
+from histogram import sky_mask
+from fusion import REDUCED
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : thumbnails.py
+######################################################################
+# Lazy image collection for the slide show of analyze.py.
+#
+# Nothing is decoded when the collection is created, only the file
+# names are kept. An image is read on access, decoded at reduced size
+# (jpg DCT scaling, IMREAD_REDUCED_COLOR_2/4/8) and stored as small jpg
+# in a thumbnail folder, keyed by path, mtime and size of the original.
+# A second viewing of the same day only reads the thumbnails.
+#
+# Images.prefetch() iterates over the images while a background thread
+# decodes a few frames ahead of the viewer, memory use does not depend
+# on the number of images.
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+#
+######################################################################
+
+global THUMB_DIR
+global SCALE
+
+THUMB_DIR = 'thumbs'    # folder next to the images, see Images
+SCALE = 0.25
+QUALITY = 92
+
+
+def thumbnail_name(path, scale=SCALE):
+    '''
+    File name of the thumbnail of an image, changes with the image.
+    '''
+    st = os.stat(path)
+    key = '{}|{}|{}|{}'.format(os.path.abspath(path), int(st.st_mtime), st.st_size, scale)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '.jpg'
+
+
+def decode_scaled(path, scale=SCALE):
+    '''
+    Decodes an image at reduced size, BGR uint8.
+    '''
+    if scale in REDUCED:
+        img = cv2.imread(path, REDUCED[scale])
+    else:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None and scale != 1:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if img is None:
+        raise IOError('Could not read {}'.format(path))
+    return img
+
+
+def thumbnail(path, cache_dir=None, scale=SCALE, quality=QUALITY):
+    '''
+    Thumbnail of an image from the cache, created on first use.
+    :param cache_dir: thumbnail folder, None to decode without cache
+    :return: BGR uint8 image
+    '''
+    if cache_dir is None:
+        return decode_scaled(path, scale)
+
+    thumb = os.path.join(cache_dir, thumbnail_name(path, scale))
+    if os.path.isfile(thumb):
+        img = cv2.imread(thumb, cv2.IMREAD_COLOR)
+        if img is not None:
+            return img
+
+    img = decode_scaled(path, scale)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp = thumb + '.part.jpg'
+        if cv2.imwrite(tmp, img, [cv2.IMWRITE_JPEG_QUALITY, quality]):
+            os.rename(tmp, thumb)
+    except OSError as e:
+        # read only archive: the image is shown anyway
+        print('Error in thumbnail: ' + str(e))
+
+    return img
+
+
+class Images:
+    """
+    Sequence of images, decoded on access at reduced size.
+
+    EXAMPLE:
+      images = Images(sorted(glob('/path/hdr/*.jpg')))
+      for i, img, result in images.prefetch(process=image_histograms):
+          show(img)
+    """
+    def __init__(self, paths, cache_dir=None, scale=SCALE, rgb=True, sky=None):
+        '''
+        :param paths: image files
+        :param cache_dir: thumbnail folder, default THUMB_DIR next to the first image, False for none
+        :param rgb: convert to RGB for matplotlib
+        :param sky: None, or (centre, radius) of a circular mask in pixels of the original
+        '''
+        self.paths = list(paths)
+        if cache_dir is None and self.paths:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(self.paths[0])), THUMB_DIR)
+        self.cache_dir = cache_dir or None
+        self.scale = scale
+        self.rgb = rgb
+        self.sky = sky
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        img = thumbnail(self.paths[index], self.cache_dir, self.scale)
+        if self.rgb:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        if self.sky is not None:
+            centre, radius = self.sky
+            mask = sky_mask(img.shape, [int(c * self.scale) for c in centre], int(radius * self.scale))
+            img[~mask] = 0
+        return img
+
+    def prefetch(self, start=0, depth=4, process=None):
+        '''
+        Iterates over (index, image, process(image)) from `start` on, a
+        background thread stays `depth` images ahead.
+        :param process: function run on every image in the thread, e.g. histograms
+        '''
+        images = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+
+        def read_all():
+            for index in range(start, len(self.paths)):
+                if stop.is_set():
+                    return
+                try:
+                    img = self[index]
+                    item = (index, img, process(img) if process is not None else None, None)
+                except Exception as e:
+                    item = (index, None, None, e)
+                images.put(item)
+            images.put(None)
+
+        thread = threading.Thread(target=read_all)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = images.get()
+                if item is None:
+                    return
+                index, img, result, error = item
+                if error is not None:
+                    # skip broken files, keep the show running
+                    print('Error in prefetch: {}: {}'.format(self.paths[index], error))
+                    continue
+                yield index, img, result
+        finally:
+            # viewer stopped early: let the reader thread run out
+            stop.set()
+            while thread.is_alive():
+                try:
+                    images.get(timeout=0.1)
+                except queue.Empty:
+                    pass
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+import os
+import time
+import argparse
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import cv2
+from histogram import sky_mask
+from thumbnails import decode_scaled
+from scanner import brightness
+from fusion import bracket_jpgs, output_path, SCALE as FUSED_SCALE
+from keogram import day_sessions, PRODUCTS_DIR
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : timelapse.py
+######################################################################
+# Time lapse video of a day, one frame per session:
+#
+# - source 'fused': the exposure fusion preview (<day>/hdr, fusion.py),
+#   sessions without one use 'best'
+# - source 'best' : the jpg of the bracket closest to TARGET brightness
+#   (chosen on 1/8 size decodes)
+# - or the file name of a jpg in every session, e.g. raw_img0.jpg
+#
+# Frames are decoded at reduced size in a thread pool, at most DEPTH
+# frames per worker are in flight and they are written in session
+# order to cv2.VideoWriter, so memory does not depend on the length of
+# the day and the encoder sets the speed. Optionally everything outside
+# the sky circle is masked (cached sky mask) and the frame cropped to it.
+#
+# Use: python timelapse.py /path/to/picam_data --day 20181007 --sky 972 1296 960 --crop
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+# 19.10.2026 : fused previews decoded relative to their stored size, sky fits all sources
+#
+######################################################################
+
+global FPS
+global SCALE
+
+FPS = 25
+SCALE = 0.5
+TARGET = 118        # brightness of the 'best' frame
+DEPTH = 2           # frames in flight per worker
+FOURCC = 'mp4v'
+REPORT_EVERY = 250
+
+
+def session_frame(session_dir, source='fused'):
+    '''
+    Image file of a session used as video frame.
+    :param source: 'fused', 'best' or a file name
+    :return: path, size of the file relative to the captured jpgs
+    '''
+    if source == 'fused':
+        path = output_path(session_dir)
+        if os.path.isfile(path):
+            return path, FUSED_SCALE
+        source = 'best'
+
+    if source == 'best':
+        jpgs = bracket_jpgs(session_dir)
+        if not jpgs:
+            raise IOError('No jpgs in {}'.format(session_dir))
+        if len(jpgs) == 1:
+            return jpgs[0], 1.0
+        return min(jpgs, key=lambda path: abs(brightness(decode_scaled(path, 0.125)) - TARGET)), 1.0
+
+    return os.path.join(session_dir, source), 1.0
+
+
+def prepare(img, scale=SCALE, sky=None, crop=False, label=None):
+    '''
+    Masks / crops a decoded frame.
+    :param scale: size of the frame relative to the captured jpgs
+    :param sky: None, or (centre, radius) of the sky circle in pixels of the original
+    :param crop: cut the frame to the square around the sky circle
+    :param label: text written to the lower left corner
+    '''
+    if sky is not None:
+        centre, radius = sky
+        cy, cx = [int(c * scale) for c in centre]
+        r = int(radius * scale)
+        img[~sky_mask(img.shape, (cy, cx), r)] = 0
+        if crop:
+            img = img[max(0, cy - r):cy + r, max(0, cx - r):cx + r]
+
+    if label:
+        h = img.shape[0]
+        cv2.putText(img, label, (int(0.02 * h), int(0.97 * h)), cv2.FONT_HERSHEY_SIMPLEX, h / 600.0,
+                    (255, 255, 255), max(1, h // 300), cv2.LINE_AA)
+    return img
+
+
+def session_label(session_dir):
+    name = os.path.basename(os.path.normpath(session_dir))
+    return '{}.{}.{} {}:{}'.format(name[6:8], name[4:6], name[0:4], name[9:11], name[11:13])
+
+
+def load_frame(job):
+    session_dir, source, scale, sky, crop, label = job
+    # fused previews are stored at reduced size: every frame ends up at `scale` of the capture
+    path, stored = session_frame(session_dir, source)
+    img = decode_scaled(path, scale / stored)
+    return prepare(img, scale, sky, crop, session_label(session_dir) if label else None)
+
+
+def ordered_frames(sessions, workers=None, **kwargs):
+    '''
+    Frames of the sessions in order, decoded in a thread pool that stays at
+    most DEPTH frames per worker ahead. Broken sessions are skipped.
+    :return: generator of (session_dir, img)
+    '''
+    workers = workers or cpu_count()
+    jobs = ((s, kwargs.get('source', 'fused'), kwargs.get('scale', SCALE), kwargs.get('sky'),
+             kwargs.get('crop', False), kwargs.get('label', False)) for s in sessions)
+
+    pool = ThreadPool(workers)
+    pending = deque()
+    try:
+        for job in jobs:
+            pending.append((job[0], pool.apply_async(load_frame, (job,))))
+            if len(pending) < DEPTH * workers:
+                continue
+            session_dir, result = pending.popleft()
+            try:
+                yield session_dir, result.get()
+            except Exception as e:
+                print('Error in timelapse: {}: {}'.format(session_dir, e))
+
+        while pending:
+            session_dir, result = pending.popleft()
+            try:
+                yield session_dir, result.get()
+            except Exception as e:
+                print('Error in timelapse: {}: {}'.format(session_dir, e))
+    finally:
+        pool.terminate()
+
+
+def write_video(sessions, out_file, fps=FPS, fourcc=FOURCC, workers=None, **kwargs):
+    '''
+    Encodes one frame per session. The size of the first frame is used for
+    the whole video. The file is written as <name>.part<ext> and renamed
+    when complete.
+    :param kwargs: source, scale, sky, crop, label (see ordered_frames)
+    :return: number of frames written
+    '''
+    base, ext = os.path.splitext(out_file)
+    tmp_file = base + '.part' + ext
+    if os.path.dirname(out_file) and not os.path.isdir(os.path.dirname(out_file)):
+        os.makedirs(os.path.dirname(out_file))
+
+    writer = None
+    size = None
+    count = 0
+    t_start = time.time()
+    try:
+        for session_dir, img in ordered_frames(sessions, workers, **kwargs):
+            if writer is None:
+                # most codecs need an even frame size
+                size = (img.shape[1] // 2 * 2, img.shape[0] // 2 * 2)
+                writer = cv2.VideoWriter(tmp_file, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+                if not writer.isOpened():
+                    raise IOError('cv2.VideoWriter could not open {} ({})'.format(tmp_file, fourcc))
+            if (img.shape[1], img.shape[0]) != size:
+                img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            writer.write(np.ascontiguousarray(img))
+            count += 1
+            if count % REPORT_EVERY == 0:
+                print('{} frames, {:.1f} frames/s'.format(count, count / (time.time() - t_start)))
+    finally:
+        if writer is not None:
+            writer.release()
+
+    if count:
+        os.rename(tmp_file, out_file)
+    print('{} frames written to {} in {:.1f} s'.format(count, out_file, time.time() - t_start))
+    return count
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Time lapse video, one frame per session.')
+        parser.add_argument('root', help='data directory with the session folders')
+        parser.add_argument('--day', help='YYYYMMDD, default all sessions')
+        parser.add_argument('-o', '--out', help='video file, default <products>/<day>/timelapse.mp4')
+        parser.add_argument('--source', default='fused', help="'fused', 'best' or a jpg name")
+        parser.add_argument('-s', '--scale', type=float, default=SCALE, help='decode scale')
+        parser.add_argument('-j', '--workers', type=int, default=cpu_count())
+        parser.add_argument('--fps', type=float, default=FPS)
+        parser.add_argument('--fourcc', default=FOURCC)
+        parser.add_argument('--sky', nargs=3, type=int, metavar=('ROW', 'COL', 'RADIUS'),
+                            help='sky circle in pixels of the original, outside is masked')
+        parser.add_argument('--crop', action='store_true', help='crop to the sky circle')
+        parser.add_argument('--label', action='store_true', help='date and time in the frame')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        out_file = args.out or os.path.join(PRODUCTS_DIR, args.day or 'all', 'timelapse.mp4')
+        sky = ((args.sky[0], args.sky[1]), args.sky[2]) if args.sky else None
+        write_video(day_sessions(args.root, args.day), out_file, args.fps, args.fourcc, args.workers,
+                    source=args.source, scale=args.scale, sky=sky, crop=args.crop, label=args.label)
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,11 @@ import numpy as np
 from fractions import Fraction
 import math
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'miscellaneous'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'helpers'))
+from catalog import Catalog
+from camstats import Camstats
+
 if sys.platform == "linux":
     import pwd
     import grp
@@ -52,14 +57,29 @@ if sys.platform == "linux":
 # 30.09.2018 : Added image mask
 # 03.09.2018 : Using a mask for histogram
 # 06.10.2018 : Minor improvements
+# 19.10.2026 : Optional raw HDR merge right after each bracket
+# 19.10.2026 : Optional exposure fusion preview of each jpg bracket
+# 19.10.2026 : Every session registered in the session catalog (helpers/catalog.py)
+# 19.10.2026 : Capture stats written as records to camstats.jsonl (helpers/camstats.py)
+# 19.10.2026 : Optional keogram and thumbnail mosaic of the day, built after each bracket
+# 19.10.2026 : Session registered before the optional steps, which only log their errors
+# 19.10.2026 : hdrmerge imported only if MERGE_HDR is set
+# 19.10.2026 : fusion imported only if FUSE_PREVIEW is set
+# 19.10.2026 : keogram imported only if KEOGRAM is set
 ######################################################################
 
 global SCRIPTPATH
 global RAWDATAPATH
 global SUBDIRPATH
+global MERGE_HDR
+global FUSE_PREVIEW
+global KEOGRAM
 
 SCRIPTPATH = os.path.join('/home', 'pi', 'python_scripts', 'picam')
 RAWDATAPATH = os.path.join(SCRIPTPATH, 'picam_data')
+MERGE_HDR = False   # merge the raw bracket to radiance.npy after capture (see hdrmerge.py)
+FUSE_PREVIEW = False    # fused preview of the jpg bracket to picam_data/hdr (see fusion.py)
+KEOGRAM = False     # keogram and mosaic of the day to picam/products (see keogram.py)
 
 
 class Logger:
@@ -705,9 +725,13 @@ class Camera:
             cameralog = s.getLogger(camLogPath)
             cameralog.info('camera ID:{} Date and Time: {}'.format(camera_ID,dateAndTime))
             cameralog.info('Adjusting shutter time in: {} seconds.'.format(state.found_ss_dur))
+            records = Camstats(SUBDIRPATH)
+            records.session(camera_id=camera_ID, script='picam', found_ss_dur=state.found_ss_dur)
             self.current_state.timeAndDate = dateAndTime
             # one pos F-stop doubles and one neg F-stop halfs the brightnes resp darknes of the image
 
+            exposures = {}
+
             if found_ss:
                 ss = state.currentSS
                 f_stops = [0,-2,-4]
@@ -736,10 +760,11 @@ class Camera:
                     loopend_tot = time.time()
 
                     self.current_state.shots_taken += 1
+                    exposures[i0] = self.camera.exposure_speed or self.camera.shutter_speed
                     # camera settings
                     cam_stats = dict(
-                        ic= self.current_state.shots_taken,
-                        fS= i0,
+                        img= self.current_state.shots_taken,
+                        f_stop= i0,
                         ss= self.camera.shutter_speed,
                         iso=self.camera.ISO,
                         exp=self.camera.exposure_speed,
@@ -750,19 +775,53 @@ class Camera:
                         ct= self.camera.contrast,
                     )
                     t_stats = dict(
-                        t_jpg='{0:.2f}'.format(loopendjpg - loopstartjpg),
-                        t_raw='{0:.2f}'.format(loopendraw - loopstartraw),
-                        t_tot='{0:.2f}'.format(loopend_tot - loopstart_tot),
+                        t_jpg=round(loopendjpg - loopstartjpg, 3),
+                        t_raw=round(loopendraw - loopstartraw, 3),
+                        t_tot=round(loopend_tot - loopstart_tot, 3),
                     )
 
-                    # Write camera settings to log file
-                    values = '[img Nr:{ic}, F Stop:{fS}, ss:{ss}, iso:{iso} exp:{exp}, ag:{ag}, dg:{dg}, awb:[{awb}], br:{br}, ct:{ct}]'
-                    timing = ' || timing: [t_jpg:{t_jpg}, t_raw:{t_raw}, t_tot:{t_tot}]'
+                    # Write camera settings as record to camstats.jsonl
+                    cam_stats.update(t_stats)
+                    records.shot(**cam_stats)
 
-                    logdata = values.format(**cam_stats)
-                    logdata = logdata + timing.format(**t_stats)
-
-                    cameralog.info(logdata)
+            # register first: the exporters only see sessions in the catalog
+            t_catalog = time.time()
+            try:
+                catalog = Catalog()
+                try:
+                    catalog.add_session(SUBDIRPATH, camera_ID, exposures)
+                finally:
+                    catalog.close()
+                cameralog.info('Registered session in catalog in {0:.2f} seconds.'.format(time.time() - t_catalog))
+            except Exception as e:
+                cameralog.error('Error in catalog: ' + str(e))
+
+            if MERGE_HDR and exposures:
+                try:
+                    import hdrmerge
+                    t_merge = time.time()
+                    hdrmerge.merge_session(SUBDIRPATH, exposures)
+                    cameralog.info('Merged raw HDR in {0:.2f} seconds.'.format(time.time() - t_merge))
+                except Exception as e:
+                    cameralog.error('Error in merge HDR: ' + str(e))
+
+            if FUSE_PREVIEW and found_ss:
+                try:
+                    import fusion
+                    t_fuse = time.time()
+                    fusion.fuse_session(SUBDIRPATH)
+                    cameralog.info('Fused preview in {0:.2f} seconds.'.format(time.time() - t_fuse))
+                except Exception as e:
+                    cameralog.error('Error in fuse preview: ' + str(e))
+
+            if KEOGRAM and found_ss:
+                try:
+                    import keogram
+                    t_keogram = time.time()
+                    keogram.add_session(SUBDIRPATH)
+                    cameralog.info('Added to keogram in {0:.2f} seconds.'.format(time.time() - t_keogram))
+                except Exception as e:
+                    cameralog.error('Error in keogram: ' + str(e))
 
             s.closeLogHandler()
             #print('Taking picture: Exp: %d\t SS: %10d\t ISO: %f\t Duration Time: %f' % (self.camera.exposure_speed,self.camera.shutter_speed, self.camera.ISO, (loopend_tot - loopstart_tot)))
@@ -812,6 +871,12 @@ def main():
                 camera.takepictures()
 
             elif t_end > time_now or t_start < time_now:
+                if KEOGRAM:
+                    try:
+                        import keogram
+                        keogram.finish_day()
+                    except Exception as e:
+                        log.error(' MAIN: Error in keogram: ' + str(e))
                 sys.exit()
 
     except Exception as e:
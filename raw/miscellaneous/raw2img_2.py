@@ -152,9 +152,9 @@ def main():
         #plt.title('raw2img.py  RGB')
         plt.show()
 
-        output = (rgb/256).astype('uint8')
-        with open(output_path + '/raw2img.jpeg', 'wb') as f:
-            output.tofile(f)
+        # rgb is normalized to [0,1], cv2 expects 8 bit BGR
+        output = (rgb * 255).astype('uint8')
+        cv2.imwrite(output_path + '/raw2img.jpeg', output[..., ::-1])
 
     except Exception as e:
         print('Error in Main: ' + str(e))
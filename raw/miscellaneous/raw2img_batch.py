@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+from __future__ import division, print_function
+
+import os
+import json
+import time
+import argparse
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import cv2
+
+######################################################################
+## Hoa: 19.10.2026 Version 1 : raw2img_batch.py
+######################################################################
+# Batch version of raw2img_1.py / raw2img_2.py.
+# Walks a session directory, a day directory or a whole archive of
+# session directories, converts every raw bayer file (*.data) to an
+# image and writes it next to the source or into a mirrored output tree.
+#
+# Supported output formats:
+# - jpg  : 8 bit RGB
+# - png  : 8 bit RGB
+# - tiff : 16 bit RGB (10 bit raw values scaled to 16 bit)
+#
+# Conversions are spread over a process pool. Every finished frame is
+# recorded in a manifest (raw2img_manifest.json) in the output root,
+# so an interrupted run resumes where it stopped.
+#
+# Use: python raw2img_batch.py /path/to/archive -f tiff -o /path/to/out
+#
+# New /Changes:
+# ----------------------------------------------------------------------
+#
+# 19.10.2026 : first implemented
+#
+######################################################################
+
+global RAW_SHAPE
+global MANIFEST_NAME
+global FORMATS
+
+RAW_SHAPE = (2464, 3296)                  # rows x cols of a *.data file
+MANIFEST_NAME = 'raw2img_manifest.json'
+FORMATS = {'jpg': '.jpg', 'jpeg': '.jpg', 'png': '.png', 'tiff': '.tiff', 'tif': '.tiff'}
+MANIFEST_FLUSH = 25                       # write manifest every n frames
+
+
+def find_raw_files(root):
+    '''
+    Collects all *.data files below root, sorted by path.
+    :param root: session-, day- or archive directory
+    :return: list of absolute paths
+    '''
+    raw_files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith('.data'):
+                raw_files.append(os.path.join(dirpath, name))
+
+    return raw_files
+
+
+def demosaic(data, awb_gains=None):
+    '''
+    Half resolution de-bayering as in raw2img_2.py: every 2x2 bayer cell
+    becomes one RGB pixel, no interpolation.
+    :param data: raw frame (2464 x 3296, uint16, 10 bit values)
+    :param awb_gains: (red, blue) gains, default (1, 1)
+    :return: RGB image (1232 x 1648 x 3) as float32 in [0, 1023]
+    '''
+    rgb = np.empty((data.shape[0] // 2, data.shape[1] // 2, 3), dtype=np.float32)
+
+    rgb[..., 0] = data[1::2, 0::2]              # Red
+    np.add(data[0::2, 0::2], data[1::2, 1::2], out=rgb[..., 1], dtype=np.float32)
+    rgb[..., 1] *= 0.5                          # Green = 1/2(p2+p3)
+    rgb[..., 2] = data[0::2, 1::2]              # Blue
+
+    if awb_gains is not None:
+        rgb[..., 0] *= awb_gains[0]
+        rgb[..., 2] *= awb_gains[1]
+
+    return rgb
+
+
+def to_output_depth(rgb, ext, normalize=False):
+    '''
+    Scales a float RGB image in [0, 1023] to 8 or 16 bit and converts
+    it to BGR channel order as expected by cv2.imwrite.
+    '''
+    if normalize:
+        lo = rgb.min()
+        hi = rgb.max()
+        scale = 1023.0 / (hi - lo) if hi > lo else 1.0
+        rgb -= lo
+        rgb *= scale
+
+    if ext == '.tiff':
+        rgb *= 65535.0 / 1023.0
+        np.clip(rgb, 0, 65535, out=rgb)
+        img = rgb.astype(np.uint16)
+    else:
+        rgb *= 255.0 / 1023.0
+        np.clip(rgb, 0, 255, out=rgb)
+        img = rgb.astype(np.uint8)
+
+    return img[..., ::-1]
+
+
+def output_path_for(raw_file, root, out_root, ext):
+    rel = os.path.relpath(raw_file, root)
+    return os.path.join(out_root, os.path.splitext(rel)[0] + ext)
+
+
+def convert_one(job):
+    '''
+    Worker: converts one raw file. Runs in a pool process.
+    :param job: tuple (raw_file, out_file, ext, awb_gains, normalize, quality)
+    :return: tuple (raw_file, out_file, error or None)
+    '''
+    raw_file, out_file, ext, awb_gains, normalize, quality = job
+    try:
+        data = np.fromfile(raw_file, dtype=np.uint16)
+        data = data.reshape(RAW_SHAPE)
+        img = to_output_depth(demosaic(data, awb_gains), ext, normalize)
+
+        out_dir = os.path.dirname(out_file)
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+        params = []
+        if ext == '.jpg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+        # write to a temp name first, a killed run never leaves half a file
+        tmp_file = out_file + '.part' + ext
+        if not cv2.imwrite(tmp_file, img, params):
+            raise IOError('cv2.imwrite failed for {}'.format(out_file))
+        os.rename(tmp_file, out_file)
+
+        return raw_file, out_file, None
+
+    except Exception as e:
+        return raw_file, out_file, str(e)
+
+
+class Manifest:
+    '''
+    Records converted frames as {relative output path: [mtime, size, output]},
+    mtime and size being those of the raw source.
+    A frame is skipped when its entry matches the raw file on disk and
+    the output file still exists.
+    '''
+    def __init__(self, out_root):
+        self.path = os.path.join(out_root, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except ValueError as e:
+                print('Manifest unreadable, starting new one: ' + str(e))
+
+    def is_done(self, key, raw_file, out_file):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        st = os.stat(raw_file)
+        return entry[0] == int(st.st_mtime) and entry[1] == st.st_size and os.path.isfile(out_file)
+
+    def add(self, key, raw_file, out_file):
+        st = os.stat(raw_file)
+        self.entries[key] = [int(st.st_mtime), st.st_size, out_file]
+
+    def save(self):
+        out_dir = os.path.dirname(self.path)
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.rename(tmp, self.path)
+
+
+def convert_all(root, out_root=None, fmt='jpg', workers=None, awb_gains=None,
+                normalize=False, quality=95, force=False):
+    '''
+    Converts every raw file below root.
+    :param root: session-, day- or archive directory
+    :param out_root: output root, default: next to the raw files
+    :param fmt: jpg, png or tiff
+    :param workers: number of processes, default: number of cores
+    :return: tuple (converted, skipped, failed)
+    '''
+    ext = FORMATS[fmt.lower()]
+    root = os.path.abspath(root)
+    out_root = os.path.abspath(out_root) if out_root else root
+    workers = workers or cpu_count()
+
+    manifest = Manifest(out_root)
+    jobs = []
+    skipped = 0
+
+    for raw_file in find_raw_files(root):
+        out_file = output_path_for(raw_file, root, out_root, ext)
+        key = os.path.relpath(out_file, out_root)
+        if not force and manifest.is_done(key, raw_file, out_file):
+            skipped += 1
+            continue
+        jobs.append((raw_file, out_file, ext, awb_gains, normalize, quality))
+
+    print('Found {} raw files, {} already converted, {} to do with {} processes.'.format(
+        len(jobs) + skipped, skipped, len(jobs), workers))
+
+    converted = 0
+    failed = 0
+    t_start = time.time()
+    pool = Pool(workers)
+    try:
+        for raw_file, out_file, error in pool.imap_unordered(convert_one, jobs, chunksize=1):
+            if error is not None:
+                failed += 1
+                print('Could not convert {}: {}'.format(raw_file, error))
+                continue
+
+            manifest.add(os.path.relpath(out_file, out_root), raw_file, out_file)
+            converted += 1
+            if converted % MANIFEST_FLUSH == 0:
+                manifest.save()
+                rate = converted / (time.time() - t_start)
+                print('{}/{} frames converted ({:.1f} frames/s)'.format(converted, len(jobs), rate))
+    finally:
+        pool.terminate()
+        pool.join()
+        manifest.save()
+
+    print('Done: {} converted, {} skipped, {} failed in {:.1f} s'.format(
+        converted, skipped, failed, time.time() - t_start))
+
+    return converted, skipped, failed
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser(description='Convert raw *.data frames to images.')
+        parser.add_argument('root', help='session, day or archive directory')
+        parser.add_argument('-o', '--out', default=None, help='output root (default: next to raw files)')
+        parser.add_argument('-f', '--format', default='jpg', choices=sorted(FORMATS.keys()))
+        parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes')
+        parser.add_argument('-q', '--quality', type=int, default=95, help='jpg quality')
+        parser.add_argument('--awb', type=float, nargs=2, default=None, metavar=('RED', 'BLUE'),
+                            help='white balance gains')
+        parser.add_argument('--normalize', action='store_true', help='stretch each frame to full range')
+        parser.add_argument('--force', action='store_true', help='ignore manifest, convert everything')
+        args = parser.parse_args()
+
+        if not os.path.isdir(args.root):
+            print('\nError: Directory does not exist! -> Aborting.')
+            return
+
+        convert_all(args.root, args.out, args.format, args.jobs, args.awb,
+                    args.normalize, args.quality, args.force)
+
+    except Exception as e:
+        print('Error in Main: ' + str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,8 @@ import logging
 import logging.handlers
 from datetime import datetime
 import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'helpers'))
+from catalog import Catalog
 
 
 ######################################################################
@@ -37,6 +39,7 @@ import numpy as np
 # ----------------------------------------------------------------------
 #
 # 10.11.2017 : Added new logging
+# 19.10.2026 : zip files recorded in the session catalog (helpers/catalog.py)
 #
 #
 ######################################################################
@@ -232,6 +235,11 @@ class Helpers:
                         for filename in files:
                             zf.write(os.path.join(dirname, filename), filename, compress_type = zipfile.ZIP_DEFLATED)
                     zf.close()
+                    catalog = Catalog()
+                    try:
+                        catalog.set_zipped(dirtozip, zipfilepath + '.zip')
+                    finally:
+                        catalog.close()
 
                     #remove obsolete directory
                     shutil.rmtree(dirtozip, ignore_errors=True)
@@ -16,6 +16,9 @@ import logging
 import logging.handlers
 from datetime import datetime, timedelta
 import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'helpers'))
+from catalog import Catalog
+from camstats import Camstats
 
 if sys.platform == "linux":
     import pwd
@@ -45,6 +48,8 @@ if sys.platform == "linux":
 # 31.03.2018 : added single instance functionality by a lock file
 # 02.04.2018 : Logging to multiple files
 # 24.09.2018 : Changed description in header
+# 19.10.2026 : Every session registered in the session catalog (helpers/catalog.py)
+# 19.10.2026 : Capture stats written as records to camstats.jsonl (helpers/camstats.py)
 #
 ######################################################################
 
@@ -125,8 +130,11 @@ class Rawcamera:
             s = Logger()
             cameralog = s.getLogger(camLogPath)
             cameralog.info('{}: {}'.format(CAMERA, datetime.now().strftime('%Y%m%d_%H%M%S')))
+            records = Camstats(SUBDIRPATH)
+            records.session(camera=CAMERA, camera_id=int(CAMERA.rpartition('_')[-1]), script='raw_2')
 
             stream = io.BytesIO()
+            exposures = {}
             with picamera.PiCamera() as camera:
                 camera.resolution = (2592, 1944)
                 # shutter speed is limited by framerate!
@@ -163,8 +171,10 @@ class Rawcamera:
                     data = np.delete(data, np.s_[4::5], 1)
 
                     loopend_tot = time.time()
+                    exposures[i0] = camera.exposure_speed or camera.shutter_speed
                     # camera settings
                     cam_stats = dict(
+                        run=i0,
                         ss=camera.shutter_speed,
                         iso=camera.iso,
                         exp=camera.exposure_speed,
@@ -175,18 +185,14 @@ class Rawcamera:
                         ct=camera.contrast,
                     )
                     t_stats = dict(
-                        t_jpg='{0:.2f}'.format(loopendjpg - loopstartjpg),
-                        t_raw='{0:.2f}'.format(loopendraw - loopstartraw),
-                        t_tot='{0:.2f}'.format(loopend_tot - loopstart_tot),
+                        t_jpg=round(loopendjpg - loopstartjpg, 3),
+                        t_raw=round(loopendraw - loopstartraw, 3),
+                        t_tot=round(loopend_tot - loopstart_tot, 3),
                     )
 
-                    # Write camera settings to log file
-                    logdata = '{} Run :'.format(str(i0))
-                    logdata = logdata + ' [ss:{ss}, iso:{iso} exp:{exp}, ag:{ag}, dg:{dg}, awb:[{awb}], br:{br}, ct:{ct}]'.format(
-                        **cam_stats)
-                    logdata = logdata + ' || timing: [t_jpg:{t_jpg}, t_raw:{t_raw}, t_tot:{t_tot}]'.format(**t_stats)
-
-                    cameralog.info(logdata)
+                    # Write camera settings as record to camstats.jsonl
+                    cam_stats.update(t_stats)
+                    records.shot(**cam_stats)
 
                     # Finally save raw (16bit data) having a size 3296 x 2464
                     datafileName = 'data%d_%s.data' % (i0, str(''))
@@ -194,6 +200,12 @@ class Rawcamera:
                     with open(SUBDIRPATH + "/" + datafileName, 'wb') as g:
                         data.tofile(g)
 
+                catalog = Catalog()
+                try:
+                    catalog.add_session(SUBDIRPATH, exposures=exposures)
+                finally:
+                    catalog.close()
+
                 s.closeLogHandler()
 
         except Exception as e: